@@ -0,0 +1,35 @@
+from collections import defaultdict
+from .models import normalize_name
+
+
+def merge_duplicate_ingredients(Ingredient, RecipeIngredient, dry_run=False):
+    """
+    Merge ingredients whose names only differ in case or whitespace into the
+    oldest one, repointing their RecipeIngredient rows first. Fills in
+    normalized_name on the survivors and returns {kept id: [merged ids]}.
+    Takes the models so migrations can pass their historical versions.
+    """
+    groups = defaultdict(list)
+    names = Ingredient.objects.exclude(name=None).order_by("id").values_list("id", "name")
+    for pk, name in names.iterator():
+        groups[normalize_name(name)].append(pk)
+
+    merged = {ids[0]: ids[1:] for ids in groups.values() if len(ids) > 1}
+    if dry_run:
+        return merged
+
+    for keep, duplicates in merged.items():
+        RecipeIngredient.objects.filter(ingredient_id__in=duplicates).update(
+            ingredient_id=keep
+        )
+        Ingredient.objects.filter(id__in=duplicates).delete()
+
+    stale = Ingredient.objects.exclude(name=None).only("id", "name", "normalized_name")
+    changed = []
+    for ingredient in stale.iterator():
+        normalized = normalize_name(ingredient.name)
+        if ingredient.normalized_name != normalized:
+            ingredient.normalized_name = normalized
+            changed.append(ingredient)
+    Ingredient.objects.bulk_update(changed, ["normalized_name"], batch_size=500)
+    return merged
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from ingredient.catalog import merge_duplicate_ingredients
+from ingredient.models import Ingredient
+from recipe.caching import invalidate_recipes
+from recipe.models import Recipe, touch_recipes
+from recipe.search import index_recipes
+from recipeingredient.models import RecipeIngredient
+
+
+def refresh_merged_recipes(merged):
+    # The lines were repointed with update(), which skips the signals, so the
+    # recipes now using a kept ingredient get their search rows, updated_at
+    # and cached pages refreshed here
+    recipe_ids = list(
+        Recipe.objects.filter(recipe_ingredients__ingredient_id__in=list(merged))
+        .values_list("pk", flat=True)
+        .distinct()
+    )
+    index_recipes(recipe_ids)
+    touch_recipes(recipe_ids)
+    invalidate_recipes(recipe_ids)
+
+
+class Command(BaseCommand):
+    help = (
+        "Merge ingredients whose names only differ in case or whitespace and "
+        "repoint the recipe ingredients that use them"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run", action="store_true", help="Only list what would be merged"
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            merged = merge_duplicate_ingredients(
+                Ingredient, RecipeIngredient, dry_run=options["dry_run"]
+            )
+            if merged and not options["dry_run"]:
+                refresh_merged_recipes(merged)
+        names = dict(
+            Ingredient.objects.filter(id__in=merged).values_list("id", "name")
+        )
+        for keep, duplicates in merged.items():
+            self.stdout.write(f"{names.get(keep)!r} (#{keep}) <- {duplicates}")
+        verb = "Would merge" if options["dry_run"] else "Merged"
+        count = sum(len(duplicates) for duplicates in merged.values())
+        self.stdout.write(f"{verb} {count} duplicate ingredients into {len(merged)}")
@@ -0,0 +1,23 @@
+from django.db import migrations
+
+from ingredient.catalog import merge_duplicate_ingredients
+
+
+def merge_duplicates(apps, schema_editor):
+    # Existing "Tomato" / "tomato " rows must become one before the unique index
+    merge_duplicate_ingredients(
+        apps.get_model("ingredient", "Ingredient"),
+        apps.get_model("recipeingredient", "RecipeIngredient"),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ingredient', '0002_ingredient_normalized_name'),
+        ('recipeingredient', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+    ]
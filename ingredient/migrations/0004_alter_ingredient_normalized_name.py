@@ -0,0 +1,18 @@
+# Generated by Django 4.2.3 on 2026-10-18 19:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ingredient', '0003_merge_duplicate_ingredients'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='ingredient',
+            name='normalized_name',
+            field=models.CharField(editable=False, max_length=255, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.2.3 on 2026-10-18 20:39
+
+from decimal import Decimal
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ingredient', '0004_alter_ingredient_normalized_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='density',
+            field=models.DecimalField(blank=True, decimal_places=3, help_text='Grams per milliliter', max_digits=6, null=True, validators=[django.core.validators.MinValueValidator(Decimal('0.001'))]),
+        ),
+    ]
@@ -1,9 +1,129 @@
-from django.db import models
+import threading
+from decimal import Decimal
+from collections import OrderedDict
+from functools import partial
+from django.core.validators import MinValueValidator
+from django.db import models, transaction
+from recipeingredient.units import density_for
+
+
+def normalize_name(name):
+    # "  Tomato " and "tomato" are the same catalog entry
+    return " ".join(name.split()).casefold()
+
+
+class IngredientManager(models.Manager):
+    # normalized name -> id, for the names this process looked up recently.
+    # Renames and deletes made here evict entries (see ingredient.signals);
+    # after merge_duplicate_ingredients, restart the other worker processes.
+    id_cache = OrderedDict()
+    id_cache_size = 10000
+    id_cache_lock = threading.Lock()
+
+    def id_for_name(self, name):
+        """
+        Id of the catalog ingredient called ``name``, created if missing.
+        Safe against concurrent requests adding the same new name.
+        """
+        key = normalize_name(name)
+        with self.id_cache_lock:
+            if key in self.id_cache:
+                self.id_cache.move_to_end(key)
+                return self.id_cache[key]
+        ingredient, created = self.get_or_create(
+            normalized_name=key, defaults={"name": " ".join(name.split())}
+        )
+        if created:
+            self.cache_id_on_commit(key, ingredient.pk)
+        else:
+            self.cache_id(key, ingredient.pk)
+        return ingredient.pk
+
+    def ids_for_names(self, names):
+        """
+        Map each normalized name to its ingredient id, creating the missing
+        ingredients with one bulk insert. Uncached names are read in one query.
+        Returns the map and the ingredients created, which bulk_create saved
+        without the signals, so the caller updates the indexes for them.
+        """
+        wanted = {}
+        for name in names:
+            wanted.setdefault(normalize_name(name), " ".join(name.split()))
+        with self.id_cache_lock:
+            for key in wanted:
+                if key in self.id_cache:
+                    self.id_cache.move_to_end(key)
+            ids = {key: self.id_cache[key] for key in wanted if key in self.id_cache}
+        missing = [key for key in wanted if key not in ids]
+        if missing:
+            found = self.filter(normalized_name__in=missing)
+            ids.update(found.values_list("normalized_name", "id"))
+        new = [key for key in missing if key not in ids]
+        created = []
+        if new:
+            # Another request may add the same names meanwhile; keep theirs
+            self.bulk_create(
+                [self.model(name=wanted[key], normalized_name=key) for key in new],
+                ignore_conflicts=True,
+            )
+            created = list(self.filter(normalized_name__in=new))
+            ids.update((item.normalized_name, item.pk) for item in created)
+        # Rows read here may have been added earlier in the caller's transaction
+        for key in missing:
+            self.cache_id_on_commit(key, ids[key])
+        return ids, created
+
+    def densities_for_names(self, names):
+        # normalized name -> grams per milliliter, or None when unknown, with
+        # the common densities filling in for ingredients without their own
+        keys = {normalize_name(name) for name in names}
+        found = dict(
+            self.filter(normalized_name__in=keys, density__isnull=False).values_list(
+                "normalized_name", "density"
+            )
+        )
+        return {key: density_for(key, found.get(key)) for key in keys}
+
+    def cache_id(self, key, pk):
+        with self.id_cache_lock:
+            self.id_cache[key] = pk
+            self.id_cache.move_to_end(key)
+            while len(self.id_cache) > self.id_cache_size:
+                self.id_cache.popitem(last=False)
+
+    def cache_id_on_commit(self, key, pk):
+        # A new row may still be rolled back, taking its id with it
+        transaction.on_commit(partial(self.cache_id, key, pk))
+
+    def forget_id(self, pk):
+        with self.id_cache_lock:
+            for key in [key for key, value in self.id_cache.items() if value == pk]:
+                del self.id_cache[key]
 
 
 # Create your models here.
 class Ingredient(models.Model):
     id = models.AutoField(primary_key=True)
     name = models.CharField(max_length=255, null=True, blank=False)
+    # Lower cased name with collapsed whitespace; unique across the catalog
+    normalized_name = models.CharField(
+        max_length=255, null=True, unique=True, editable=False
+    )
+    # Converts volumes of this ingredient to weights (see recipeingredient.units)
+    density = models.DecimalField(
+        max_digits=6,
+        decimal_places=3,
+        null=True,
+        blank=True,
+        validators=[MinValueValidator(Decimal("0.001"))],
+        help_text="Grams per milliliter",
+    )
+
+    objects = IngredientManager()
+
+    def save(self, *args, **kwargs):
+        self.normalized_name = None if self.name is None else normalize_name(self.name)
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return str(self.name)
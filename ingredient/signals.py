@@ -0,0 +1,10 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .models import Ingredient
+
+
+# Keep the name -> id cache of Ingredient.objects.id_for_name in step
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def forget_cached_ingredient_id(sender, instance, **kwargs):
+    Ingredient.objects.forget_id(instance.pk)
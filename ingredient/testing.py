@@ -0,0 +1,15 @@
+from django.test import TestCase
+from .models import Ingredient
+
+
+class IngredientCacheTestCase(TestCase):
+    """
+    TestCase emptying the name -> id cache of Ingredient.objects before and
+    after every test, since the rows it remembers are rolled back with the
+    test that created them.
+    """
+
+    def setUp(self):
+        super().setUp()
+        Ingredient.objects.id_cache.clear()
+        self.addCleanup(Ingredient.objects.id_cache.clear)
@@ -1,6 +1,15 @@
+from decimal import Decimal
+from io import StringIO
 from django.test import TestCase
 from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from customuser.models import CustomUser
+from recipe.caching import get_versions, recipe_version_key
+from recipe.models import Recipe
+from recipeingredient.models import RecipeIngredient
 from .models import Ingredient
+from .testing import IngredientCacheTestCase
 # Create your tests here.
 
 class IngredientModelTest(TestCase):
@@ -24,3 +33,105 @@ class IngredientModelTest(TestCase):
             ingredient_blank.full_clean()
  
 
+
+class IngredientCatalogTest(IngredientCacheTestCase):
+    def test_names_are_unique_once_normalized(self):
+        ingredient = Ingredient.objects.create(name="  Cherry   Tomato ")
+        self.assertEqual(ingredient.normalized_name, "cherry tomato")
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Ingredient.objects.create(name="cherry tomato")
+
+    def test_id_for_name_reuses_existing_ingredients(self):
+        tomato = Ingredient.objects.create(name="Tomato")
+        self.assertEqual(Ingredient.objects.id_for_name("tomato "), tomato.pk)
+        # Answered from the cache the second time
+        with self.assertNumQueries(0):
+            self.assertEqual(Ingredient.objects.id_for_name("TOMATO"), tomato.pk)
+
+        basil_id = Ingredient.objects.id_for_name(" Thai  basil")
+        self.assertEqual(Ingredient.objects.get(pk=basil_id).name, "Thai basil")
+        self.assertEqual(Ingredient.objects.id_for_name("thai basil"), basil_id)
+        self.assertEqual(Ingredient.objects.count(), 2)
+
+    def test_ids_for_names_caches_ids_once_committed(self):
+        tomato = Ingredient.objects.create(name="Tomato")
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            ids, created = Ingredient.objects.ids_for_names(
+                ["tomato", " Thai basil", "thai BASIL"]
+            )
+            self.assertEqual(len(Ingredient.objects.id_cache), 0)
+        self.assertEqual(len(callbacks), 2)
+        self.assertEqual([ingredient.name for ingredient in created], ["Thai basil"])
+        self.assertEqual(ids, {"tomato": tomato.pk, "thai basil": created[0].pk})
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                Ingredient.objects.ids_for_names(["TOMATO"]), ({"tomato": tomato.pk}, [])
+            )
+
+    def test_cache_forgets_renamed_and_deleted_ingredients(self):
+        tomato_id = Ingredient.objects.id_for_name("Tomato")
+        tomato = Ingredient.objects.get(pk=tomato_id)
+        tomato.name = "Roma Tomato"
+        tomato.save()
+        self.assertNotEqual(Ingredient.objects.id_for_name("Tomato"), tomato_id)
+
+        Ingredient.objects.get(name="Tomato").delete()
+        self.assertTrue(
+            Ingredient.objects.filter(pk=Ingredient.objects.id_for_name("Tomato")).exists()
+        )
+
+    def test_merge_command_repoints_recipe_ingredients(self):
+        # bulk_create skips save(), like rows written before the unique index
+        Ingredient.objects.bulk_create(
+            [Ingredient(name="Tomato"), Ingredient(name="tomato "), Ingredient(name="Salt")]
+        )
+        tomato, duplicate, salt = Ingredient.objects.order_by("id")
+        recipe_ingredient = RecipeIngredient.objects.create(
+            ingredient=duplicate,
+            calorie_content=10,
+            amount=1,
+            amount_type="each",
+            cost=1,
+            supplier="supplier",
+            grams=100,
+        )
+        user = CustomUser.objects.create_user(username="cook", password="pw")
+        recipe = Recipe.objects.create(
+            title="Salsa", directions="Chop.", recipe_type="snack", user=user
+        )
+        recipe.recipe_ingredients.add(recipe_ingredient)
+        recipe.refresh_from_db()
+        updated_at = recipe.updated_at
+        version = get_versions([recipe_version_key(recipe.pk)])
+
+        out = StringIO()
+        call_command("merge_duplicate_ingredients", dry_run=True, stdout=out)
+        self.assertIn("Would merge 1 duplicate ingredients into 1", out.getvalue())
+        self.assertEqual(Ingredient.objects.count(), 3)
+
+        out = StringIO()
+        call_command("merge_duplicate_ingredients", stdout=out)
+        self.assertIn(f"'Tomato' (#{tomato.pk}) <- [{duplicate.pk}]", out.getvalue())
+        self.assertEqual(
+            list(Ingredient.objects.order_by("id").values_list("id", "normalized_name")),
+            [(tomato.pk, "tomato"), (salt.pk, "salt")],
+        )
+        recipe_ingredient.refresh_from_db()
+        self.assertEqual(recipe_ingredient.ingredient_id, tomato.pk)
+        # The recipe's search row, updated_at and cached version follow
+        recipe.refresh_from_db()
+        self.assertGreater(recipe.updated_at, updated_at)
+        self.assertNotEqual(get_versions([recipe_version_key(recipe.pk)]), version)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT ingredients FROM recipe_search WHERE rowid = %s", [recipe.pk]
+            )
+            self.assertEqual(cursor.fetchone(), ("Tomato",))
+
+    def test_densities_for_names_fall_back_to_common_ones(self):
+        Ingredient.objects.create(name="Flour", density=Decimal("0.6"))
+        Ingredient.objects.create(name="Milk")
+        self.assertEqual(
+            Ingredient.objects.densities_for_names([" flour", "Milk", "Gravel"]),
+            {"flour": Decimal("0.6"), "milk": Decimal("1.03"), "gravel": None},
+        )
@@ -0,0 +1,16 @@
+from django.contrib import admin
+from .models import MealPlan, MealPlanDay, MealSlot
+
+
+class MealSlotInline(admin.TabularInline):
+    model = MealSlot
+    extra = 1
+    raw_id_fields = ("recipe",)
+
+
+class MealPlanDayAdmin(admin.ModelAdmin):
+    inlines = [MealSlotInline]
+
+
+admin.site.register(MealPlan)
+admin.site.register(MealPlanDay, MealPlanDayAdmin)
@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class MealPlanConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'mealplan'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,42 @@
+from django import forms
+from recipe.models import Recipe
+from .models import MealPlan, MealSlot
+
+
+class MealPlanForm(forms.ModelForm):
+    class Meta:
+        model = MealPlan
+        fields = ["name", "start_date"]
+        widgets = {"start_date": forms.DateInput(attrs={"type": "date"})}
+
+
+class MealSlotForm(forms.ModelForm):
+    class Meta:
+        model = MealSlot
+        fields = ["day", "meal", "recipe", "servings"]
+        # The recipe id, picked from the recipe:autocomplete suggestions the
+        # template loads as the user types rather than a list of every recipe
+        widgets = {
+            "recipe": forms.TextInput(
+                attrs={
+                    "list": "recipe-suggestions",
+                    "autocomplete": "off",
+                    "placeholder": "Start typing a recipe title",
+                }
+            )
+        }
+
+    def __init__(self, *args, plan, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Days of this plan only; the recipe is looked up by the id given
+        self.fields["day"].queryset = plan.days.order_by("date")
+        self.fields["day"].label_from_instance = lambda day: f"{day.date:%A %b %d}"
+        self.fields["recipe"].queryset = Recipe.objects.only("id", "title", "servings")
+
+    def clean(self):
+        cleaned_data = super().clean()
+        recipe = cleaned_data.get("recipe")
+        # As recipe.scaling: a recipe without servings is only made as it is
+        if recipe and cleaned_data.get("servings") and not recipe.servings:
+            self.add_error("servings", "This recipe has no servings to scale from")
+        return cleaned_data
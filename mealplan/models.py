@@ -0,0 +1,64 @@
+from django.core.validators import MinValueValidator
+from django.db import models
+from django.shortcuts import reverse
+from customuser.models import CustomUser
+
+MEALS = (
+    ("breakfast", "Breakfast"),
+    ("lunch", "Lunch"),
+    ("dinner", "Dinner"),
+    ("snack", "Snack"),
+)
+# Days a new plan starts with
+PLAN_DAYS = 7
+
+
+class MealPlan(models.Model):
+    user = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name="meal_plans",
+    )
+    name = models.CharField(max_length=255)
+    start_date = models.DateField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "start_date"], name="mealplan_user_start_idx"),
+        ]
+
+    def __str__(self):
+        return str(self.name)
+
+    def get_absolute_url(self):
+        return reverse("mealplan:detail", kwargs={"pk": self.pk})
+
+
+class MealPlanDay(models.Model):
+    plan = models.ForeignKey(MealPlan, on_delete=models.CASCADE, related_name="days")
+    date = models.DateField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["plan", "date"], name="mealplan_day_date_uniq"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.plan} - {self.date}"
+
+
+class MealSlot(models.Model):
+    day = models.ForeignKey(MealPlanDay, on_delete=models.CASCADE, related_name="slots")
+    meal = models.CharField(max_length=20, choices=MEALS)
+    recipe = models.ForeignKey(
+        "recipe.Recipe", on_delete=models.CASCADE, related_name="meal_slots"
+    )
+    # Servings to make, the recipe's own when empty
+    servings = models.PositiveIntegerField(
+        null=True, blank=True, validators=[MinValueValidator(1)]
+    )
+
+    def __str__(self):
+        return f"{self.day} - {self.meal}: {self.recipe_id}"
@@ -0,0 +1,28 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .models import MealPlanDay, MealSlot
+from .totals import invalidate_plans
+
+# Drop the cached totals of a plan when its days or slots change. Changes to
+# the recipes in it are covered by the recipe versions the totals are cached
+# under (see mealplan.totals).
+
+
+@receiver(post_save, sender=MealPlanDay)
+@receiver(post_delete, sender=MealPlanDay)
+def invalidate_day_plan(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invalidate_plans([instance.plan_id])
+
+
+@receiver(post_save, sender=MealSlot)
+@receiver(post_delete, sender=MealSlot)
+def invalidate_slot_plan(sender, instance, raw=False, **kwargs):
+    if not raw:
+        plan_id = (
+            MealPlanDay.objects.filter(pk=instance.day_id)
+            .values_list("plan_id", flat=True)
+            .first()
+        )
+        if plan_id is not None:
+            invalidate_plans([plan_id])
@@ -0,0 +1,153 @@
+from datetime import date
+from decimal import Decimal
+from django.core.cache import cache
+from django.urls import reverse
+from customuser.models import CustomUser
+from recipe.testing import RecipeTestCase, recipe_line
+from recipeingredient.models import RecipeIngredient
+from .models import MealPlan, MealPlanDay, MealSlot
+from .totals import plan_totals
+
+
+class MealPlanTest(RecipeTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.soup = cls.recipe(
+            "Soup", 4, [("Onion", 400, "2.00"), ("Stock", 100, "2.00")]
+        )
+        cls.salad = cls.recipe("Salad", None, [("Lettuce", 50, "1.50")])
+        cls.plan = MealPlan.objects.create(
+            user=cls.user, name="First week", start_date=date(2026, 1, 5)
+        )
+        cls.monday = MealPlanDay.objects.create(plan=cls.plan, date=date(2026, 1, 5))
+        cls.tuesday = MealPlanDay.objects.create(plan=cls.plan, date=date(2026, 1, 6))
+
+    @classmethod
+    def recipe(cls, title, servings, lines):
+        lines = [
+            recipe_line(name, calorie_content=calories, cost=cost)
+            for name, calories, cost in lines
+        ]
+        return cls.create_recipe(title, servings, lines)
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def add_slots(self):
+        MealSlot.objects.create(day=self.monday, meal="dinner", recipe=self.soup)
+        MealSlot.objects.create(day=self.monday, meal="lunch", recipe=self.salad)
+        # Soup for 6 instead of 4
+        MealSlot.objects.create(
+            day=self.tuesday, meal="dinner", recipe=self.soup, servings=6
+        )
+
+    def test_totals_come_from_the_recipe_rollups(self):
+        self.add_slots()
+        with self.assertNumQueries(2):
+            totals = plan_totals(self.plan.pk)
+        monday = {"calories": Decimal("550.00"), "cost": Decimal("5.50")}
+        tuesday = {"calories": Decimal("750.00"), "cost": Decimal("6.00")}
+        self.assertEqual(
+            totals["days"], {date(2026, 1, 5): monday, date(2026, 1, 6): tuesday}
+        )
+        self.assertEqual(
+            totals["total"], {"calories": Decimal("1300.00"), "cost": Decimal("11.50")}
+        )
+        with self.assertNumQueries(0):
+            self.assertEqual(plan_totals(self.plan.pk), totals)
+
+    def test_totals_follow_the_plan_and_its_recipes_only(self):
+        self.add_slots()
+        plan_totals(self.plan.pk)
+
+        # Other recipes do not touch the cached totals
+        other = self.recipe("Cake", 8, [("Flour", 900, "3.00")])
+        RecipeIngredient.objects.filter(ingredient__name="Flour").first().save()
+        with self.assertNumQueries(0):
+            plan_totals(self.plan.pk)
+
+        onion = RecipeIngredient.objects.get(ingredient__name="Onion")
+        onion.calorie_content = 500
+        onion.save()
+        totals = plan_totals(self.plan.pk)
+        self.assertEqual(totals["total"]["calories"], Decimal("1550.00"))
+
+        MealSlot.objects.create(day=self.tuesday, meal="snack", recipe=other)
+        self.assertEqual(plan_totals(self.plan.pk)["total"]["cost"], Decimal("14.50"))
+        MealSlot.objects.filter(recipe=other).delete()
+        self.assertEqual(plan_totals(self.plan.pk)["total"]["cost"], Decimal("11.50"))
+        self.soup.delete()
+        self.assertEqual(plan_totals(self.plan.pk)["total"]["cost"], Decimal("1.50"))
+
+    def test_detail_page_takes_a_fixed_number_of_queries(self):
+        self.client.login(username="cook", password="pw")
+        url = self.plan.get_absolute_url()
+        self.add_slots()
+        # Session, user, plan, days and slots, then the recipe ids and totals
+        with self.assertNumQueries(7):
+            response = self.client.get(url)
+        self.assertContains(response, "1300.00 calories | $11.50")
+        meals = [slot.meal for slot in response.context["days"][0].meals]
+        self.assertEqual(meals, ["lunch", "dinner"])
+
+        for day in (self.monday, self.tuesday):
+            for meal in ("breakfast", "snack"):
+                MealSlot.objects.create(day=day, meal=meal, recipe=self.salad)
+        with self.assertNumQueries(7):
+            self.client.get(url)
+        # Cached totals
+        with self.assertNumQueries(5):
+            self.client.get(url)
+
+    def test_plans_belong_to_their_user(self):
+        other = CustomUser.objects.create_user(username="other", password="pw")
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(self.plan.get_absolute_url()).status_code, 404)
+        url = reverse("mealplan:add_slot", kwargs={"plan_pk": self.plan.pk})
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse("mealplan:list")).status_code, 302)
+
+    def test_create_plan_and_add_and_remove_meals(self):
+        self.client.login(username="cook", password="pw")
+        data = {"name": "Next week", "start_date": "2026-01-12"}
+        response = self.client.post(reverse("mealplan:create"), data)
+        plan = MealPlan.objects.get(name="Next week")
+        self.assertRedirects(response, plan.get_absolute_url())
+        self.assertEqual(plan.days.count(), 7)
+
+        day = plan.days.get(date=date(2026, 1, 14))
+        url = reverse("mealplan:add_slot", kwargs={"plan_pk": plan.pk})
+        # Recipes are picked by id from the autocomplete suggestions
+        response = self.client.get(url)
+        self.assertContains(response, 'list="recipe-suggestions"')
+        self.assertNotContains(response, "Soup")
+        data = {"day": day.pk, "meal": "dinner", "recipe": "Soup", "servings": 2}
+        response = self.client.post(url, data)
+        self.assertFormError(
+            response.context["form"],
+            "recipe",
+            "Select a valid choice. That choice is not one of the available choices.",
+        )
+        data = {"day": day.pk, "meal": "dinner", "recipe": self.soup.pk, "servings": 2}
+        self.assertRedirects(self.client.post(url, data), plan.get_absolute_url())
+        self.assertEqual(plan_totals(plan.pk)["total"]["cost"], Decimal("2.00"))
+        # Days of other plans cannot be picked
+        data["day"] = self.monday.pk
+        self.assertEqual(self.client.post(url, data).status_code, 200)
+        # Nor servings for a recipe that has none to scale from
+        data.update(day=day.pk, recipe=self.salad.pk)
+        response = self.client.post(url, data)
+        self.assertFormError(
+            response.context["form"],
+            "servings",
+            "This recipe has no servings to scale from",
+        )
+
+        slot = MealSlot.objects.get(day=day)
+        kwargs = {"plan_pk": plan.pk, "pk": slot.pk}
+        url = reverse("mealplan:delete_slot", kwargs=kwargs)
+        self.client.post(url)
+        self.assertEqual(plan_totals(plan.pk)["total"]["cost"], 0)
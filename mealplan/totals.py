@@ -0,0 +1,76 @@
+from decimal import ROUND_HALF_UP, Decimal
+from recipe.caching import cached, invalidate_versions, recipe_version_key
+from recipe.models import CENT
+from .models import MealSlot
+
+# Daily and whole plan calorie and cost totals of a meal plan, worked out
+# from the totals stored on each recipe (recipe.rollups), so they take one
+# row per slot rather than one per ingredient line. They are cached under
+# the plan's version, replaced when its days or slots change (see
+# mealplan.signals), and under the version of every recipe in the plan,
+# which recipe.signals replaces when a recipe or its ingredient lines change.
+PLAN_TOTALS = {"calories": "recipe__total_calories", "cost": "recipe__total_cost"}
+
+
+def plan_version_key(plan_id):
+    return f"mealplan:{plan_id}:version"
+
+
+def invalidate_plans(plan_ids):
+    invalidate_versions([plan_version_key(pk) for pk in plan_ids])
+
+
+def slot_factor(servings, recipe_servings):
+    # How many times over a slot makes its recipe; recipes without servings
+    # can only be made as they are (MealSlotForm refuses servings for them)
+    if servings is None or not recipe_servings:
+        return Decimal(1)
+    return Decimal(servings) / recipe_servings
+
+
+def compute_plan_totals(plan_id):
+    """
+    {"days": {date: totals}, "total": totals} for the plan, with totals of
+    PLAN_TOTALS, from one query over its slots. Days without slots are left
+    out.
+    """
+    slots = MealSlot.objects.filter(day__plan_id=plan_id).values(
+        "day__date", "servings", "recipe__servings", *PLAN_TOTALS.values()
+    )
+    days = {}
+    for slot in slots:
+        factor = slot_factor(slot["servings"], slot["recipe__servings"])
+        day = days.setdefault(slot["day__date"], dict.fromkeys(PLAN_TOTALS, 0))
+        for total, field in PLAN_TOTALS.items():
+            day[total] += slot[field] * factor
+
+    total = dict.fromkeys(PLAN_TOTALS, Decimal(0))
+    for day in days.values():
+        for name, value in day.items():
+            day[name] = Decimal(value).quantize(CENT, ROUND_HALF_UP)
+            # The plan total adds up the rounded days, as the page shows them
+            total[name] += day[name]
+    return {"days": days, "total": total}
+
+
+def plan_totals(plan_id):
+    # compute_plan_totals, cached until the plan or one of its recipes changes
+    versions = (plan_version_key(plan_id),)
+    recipe_ids = cached(
+        "mealplan",
+        ("recipes", plan_id),
+        lambda: sorted(
+            set(
+                MealSlot.objects.filter(day__plan_id=plan_id).values_list(
+                    "recipe_id", flat=True
+                )
+            )
+        ),
+        versions=versions,
+    )
+    return cached(
+        "mealplan",
+        ("totals", plan_id),
+        lambda: compute_plan_totals(plan_id),
+        versions=(*versions, *(recipe_version_key(pk) for pk in recipe_ids)),
+    )
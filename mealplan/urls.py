@@ -0,0 +1,23 @@
+from django.urls import path
+from .views import (
+    MealPlanCreateView,
+    MealPlanDetailView,
+    MealPlanListView,
+    MealSlotCreateView,
+    MealSlotDeleteView,
+)
+
+app_name = "mealplan"
+
+
+urlpatterns = [
+    path("", MealPlanListView.as_view(), name="list"),
+    path("create/", MealPlanCreateView.as_view(), name="create"),
+    path("<int:pk>/", MealPlanDetailView.as_view(), name="detail"),
+    path("<int:plan_pk>/add/", MealSlotCreateView.as_view(), name="add_slot"),
+    path(
+        "<int:plan_pk>/slots/<int:pk>/delete/",
+        MealSlotDeleteView.as_view(),
+        name="delete_slot",
+    ),
+]
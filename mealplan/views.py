@@ -0,0 +1,98 @@
+from datetime import timedelta
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.db import transaction
+from django.db.models import Prefetch
+from django.shortcuts import get_object_or_404
+from django.views.generic import CreateView, DeleteView, DetailView, ListView
+from .forms import MealPlanForm, MealSlotForm
+from .models import MEALS, PLAN_DAYS, MealPlan, MealPlanDay, MealSlot
+from .totals import PLAN_TOTALS, plan_totals
+
+MEAL_ORDER = {meal: i for i, (meal, _) in enumerate(MEALS)}
+
+
+class MealPlanListView(LoginRequiredMixin, ListView):
+    template_name = "mealplan/plan_list.html"
+    context_object_name = "plans"
+
+    def get_queryset(self):
+        return MealPlan.objects.filter(user=self.request.user).order_by("-start_date")
+
+
+class MealPlanCreateView(LoginRequiredMixin, CreateView):
+    form_class = MealPlanForm
+    template_name = "mealplan/plan_form.html"
+
+    def form_valid(self, form):
+        form.instance.user = self.request.user
+        with transaction.atomic():
+            response = super().form_valid(form)
+            start = self.object.start_date
+            MealPlanDay.objects.bulk_create(
+                MealPlanDay(plan=self.object, date=start + timedelta(days=i))
+                for i in range(PLAN_DAYS)
+            )
+        return response
+
+
+class MealPlanDetailView(LoginRequiredMixin, DetailView):
+    template_name = "mealplan/plan_detail.html"
+    context_object_name = "plan"
+
+    def get_queryset(self):
+        # The days and their slots with the recipe titles, in two more queries
+        slots = MealSlot.objects.select_related("recipe").only(
+            "day", "meal", "servings", "recipe__title"
+        )
+        return MealPlan.objects.filter(user=self.request.user).prefetch_related(
+            Prefetch("days", queryset=MealPlanDay.objects.order_by("date")),
+            Prefetch("days__slots", queryset=slots.order_by("pk")),
+        )
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # Totals come from the cache, or from one row per slot
+        totals = plan_totals(self.object.pk)
+        empty = dict.fromkeys(PLAN_TOTALS, 0)
+        days = list(self.object.days.all())
+        for day in days:
+            day.meals = sorted(day.slots.all(), key=lambda slot: MEAL_ORDER[slot.meal])
+            day.totals = totals["days"].get(day.date, empty)
+        context["days"] = days
+        context["totals"] = totals["total"]
+        return context
+
+
+class PlanOwnerMixin(LoginRequiredMixin):
+    # Views of one of the signed in user's plans, from the URL's plan_pk
+    def dispatch(self, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            self.plan = get_object_or_404(
+                MealPlan, pk=kwargs["plan_pk"], user=request.user
+            )
+        return super().dispatch(request, *args, **kwargs)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["plan"] = self.plan
+        return context
+
+    def get_success_url(self):
+        return self.plan.get_absolute_url()
+
+
+class MealSlotCreateView(PlanOwnerMixin, CreateView):
+    form_class = MealSlotForm
+    template_name = "mealplan/slot_form.html"
+
+    def get_form_kwargs(self):
+        kwargs = super().get_form_kwargs()
+        kwargs["plan"] = self.plan
+        return kwargs
+
+
+class MealSlotDeleteView(PlanOwnerMixin, DeleteView):
+    template_name = "mealplan/slot_confirm_delete.html"
+
+    def get_queryset(self):
+        return MealSlot.objects.filter(day__plan=self.plan).select_related("recipe")
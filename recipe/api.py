@@ -0,0 +1,263 @@
+from decimal import Decimal, InvalidOperation
+from django.db.models import Prefetch
+from django.http import JsonResponse
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import conditional_page
+from django.views.generic import View
+from recipeingredient.models import RecipeIngredient
+from .fuzzy import fuzzy_search_recipes
+from .images import IMAGE_VARIANTS, image_url
+from .models import Recipe
+from .pagination import KEYSET_SORTS, SEARCH_SORTS, KeysetPaginator
+from .scaling import ScalingError, parse_servings, scale_recipe
+from .search import search_recipes
+from .shopping import ShoppingListError, build_shopping_list, parse_recipe_list
+from .utils import INGREDIENT_LINE_FIELDS
+
+# Read-only JSON API over the recipes:
+#   GET api/recipes/              list, keyset paginated (?cursor=, ?sort=, ?limit=)
+#   GET api/recipes/?q=tomato     ranked full text search, fuzzy when nothing matches
+#   GET api/recipes/<id>/         one recipe, ?servings=N scales it (recipe.scaling)
+#   GET api/shopping-list/?recipes=1,2:6
+#                                 combined shopping list (recipe.shopping)
+# The list can be narrowed down on the ingredient totals with ?max_calories=,
+# ?max_cost=, ?max_cost_per_serving= and ?max_ingredients=.
+# ?fields=id,title,... picks the fields of each recipe; only the columns and
+# relations those fields need are loaded. Responses carry an ETag and answer
+# If-None-Match with 304 Not Modified.
+
+# Field -> Recipe columns it reads. "owner" and "ingredients" also pull in
+# the user and the ingredient lines (see RecipeApiMixin.get_queryset).
+API_FIELDS = {
+    "id": ["id"],
+    "title": ["title"],
+    "url": ["id"],
+    "small_desc": ["small_desc"],
+    "directions": ["directions"],
+    "recipe_type": ["recipe_type"],
+    "cooking_time": ["cooking_time"],
+    "star_count": ["star_count"],
+    "servings": ["servings"],
+    "yield_amount": ["yield_amount"],
+    "allergens": ["allergens"],
+    "adapted_link": ["adapted_link"],
+    "image": ["image_hash"],
+    "ingredient_count": ["ingredient_count"],
+    "total_calories": ["total_calories"],
+    "total_grams": ["total_grams"],
+    "total_cost": ["total_cost"],
+    "cost_per_serving": ["cost_per_serving"],
+    "owner": ["user__username"],
+    "ingredients": [],
+}
+LIST_FIELDS = [
+    "id",
+    "title",
+    "url",
+    "small_desc",
+    "star_count",
+    "cooking_time",
+    "image",
+]
+DETAIL_FIELDS = list(API_FIELDS)
+
+# Query parameter -> lookup on the stored ingredient totals (recipe.rollups)
+API_FILTERS = {
+    "max_ingredients": "ingredient_count__lte",
+    "max_calories": "total_calories__lte",
+    "max_cost": "total_cost__lte",
+    "max_cost_per_serving": "cost_per_serving__lte",
+}
+
+API_PAGE_SIZE = 20
+API_MAX_PAGE_SIZE = 100
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def error_response(message, status):
+    return JsonResponse({"error": message}, status=status)
+
+
+class RecipeApiMixin:
+    default_fields = LIST_FIELDS
+
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        except ApiError as e:
+            return error_response(str(e), e.status)
+
+    def get_fields(self):
+        fields = self.request.GET.get("fields")
+        if not fields:
+            return self.default_fields
+        fields = [field.strip() for field in fields.split(",") if field.strip()]
+        unknown = [field for field in fields if field not in API_FIELDS]
+        if unknown:
+            raise ApiError(f"Unknown fields: {', '.join(unknown)}")
+        return fields
+
+    def get_queryset(self, fields, queryset=None):
+        queryset = Recipe.objects.all() if queryset is None else queryset
+        # The pagination keys are always loaded, whatever fields are picked
+        sort_columns = [field for field, _ in KEYSET_SORTS.values() if field]
+        columns = {"id", *sort_columns}.union(*(API_FIELDS[field] for field in fields))
+        if "owner" in fields:
+            queryset = queryset.select_related("user")
+        if "ingredients" in fields:
+            queryset = queryset.prefetch_related(
+                Prefetch(
+                    "recipe_ingredients",
+                    queryset=RecipeIngredient.objects.select_related("ingredient")
+                    .only("ingredient__name", *INGREDIENT_LINE_FIELDS)
+                    .order_by("pk"),
+                )
+            )
+        return queryset.only(*columns)
+
+    def serialize(self, recipe, fields):
+        data = {}
+        for field in fields:
+            if field == "url":
+                data[field] = self.request.build_absolute_uri(recipe.get_absolute_url())
+            elif field == "image":
+                data[field] = self.image_urls(recipe.image_hash)
+            elif field == "owner":
+                data[field] = recipe.user.username
+            elif field == "ingredients":
+                items = recipe.recipe_ingredients.all()
+                data[field] = [self.serialize_line(item) for item in items]
+            else:
+                data[field] = getattr(recipe, field)
+        return data
+
+    def serialize_line(self, item):
+        line = {"ingredient": item.ingredient.name}
+        line.update((name, getattr(item, name)) for name in INGREDIENT_LINE_FIELDS)
+        return line
+
+    def image_urls(self, digest):
+        # Links to the stored picture in every size, or None without one
+        if not digest:
+            return None
+        return {
+            variant: self.request.build_absolute_uri(image_url(digest, variant))
+            for variant in IMAGE_VARIANTS
+        }
+
+
+@method_decorator(conditional_page, name="dispatch")
+class RecipeListApiView(RecipeApiMixin, View):
+    def get(self, request):
+        fields = self.get_fields()
+        try:
+            limit = int(request.GET.get("limit", API_PAGE_SIZE))
+        except ValueError:
+            raise ApiError("limit must be a whole number")
+        limit = max(1, min(limit, API_MAX_PAGE_SIZE))
+        self.filters = self.get_filters()
+
+        query = request.GET.get("q", "")[:150]
+        cursor = request.GET.get("cursor")
+        page, fuzzy = self.get_page(query, fields, limit, cursor)
+        # Nothing matched exactly, so look for titles and ingredient names
+        # close to what was typed, as the search page does
+        if query and not page and not cursor:
+            page, fuzzy = self.get_page(query, fields, limit, cursor, fuzzy=True)
+
+        data = {
+            "results": [self.serialize(recipe, fields) for recipe in page],
+            "next": self.page_url(page.next_cursor),
+            "previous": self.page_url(page.previous_cursor),
+        }
+        if query:
+            data["fuzzy"] = fuzzy
+        return JsonResponse(data)
+
+    def get_filters(self):
+        filters = {}
+        for param, lookup in API_FILTERS.items():
+            value = self.request.GET.get(param)
+            if not value:
+                continue
+            try:
+                filters[lookup] = Decimal(value)
+            except InvalidOperation:
+                raise ApiError(f"{param} must be a number")
+            if not filters[lookup].is_finite():
+                raise ApiError(f"{param} must be a number")
+        return filters
+
+    def get_page(self, query, fields, limit, cursor, fuzzy=False):
+        sorts = KEYSET_SORTS
+        queryset = Recipe.objects.filter(**self.filters)
+        if query:
+            sorts = SEARCH_SORTS
+            # The filters go into the search, so its result limit applies to
+            # the recipes they keep
+            search = fuzzy_search_recipes if fuzzy else search_recipes
+            queryset = search(query, queryset)
+            if "search_rank" not in queryset.query.annotations:
+                sorts = KEYSET_SORTS
+        queryset = self.get_queryset(fields, queryset)
+        sort = self.request.GET.get("sort")
+        paginator = KeysetPaginator(queryset, limit, sort, sorts)
+        return paginator.page(cursor), fuzzy
+
+    def page_url(self, cursor):
+        if cursor is None:
+            return None
+        params = self.request.GET.copy()
+        params["cursor"] = cursor
+        return self.request.build_absolute_uri(
+            f"{self.request.path}?{params.urlencode()}"
+        )
+
+
+@method_decorator(conditional_page, name="dispatch")
+class RecipeDetailApiView(RecipeApiMixin, View):
+    default_fields = DETAIL_FIELDS
+
+    def get(self, request, pk):
+        fields = self.get_fields()
+        try:
+            servings = parse_servings(request.GET.get("servings"))
+        except ScalingError as e:
+            raise ApiError(str(e))
+        # Scaling reads the recipe's servings and every ingredient line
+        loaded = fields if servings is None else [*fields, "servings", "ingredients"]
+        recipe = self.get_queryset(loaded).filter(pk=pk).first()
+        if recipe is None:
+            raise ApiError("Recipe not found", status=404)
+        data = self.serialize(recipe, fields)
+        if servings is not None:
+            data.update(self.serialize_scaled(recipe, servings, fields))
+        return JsonResponse(data)
+
+    def serialize_scaled(self, recipe, servings, fields):
+        # The fields that change with the number of servings
+        try:
+            scaled = scale_recipe(recipe, servings)
+        except ScalingError as e:
+            raise ApiError(str(e))
+        scaled["ingredients"] = [
+            {name: line[name] for name in ["ingredient", *INGREDIENT_LINE_FIELDS]}
+            for line in scaled["lines"]
+        ]
+        return {field: scaled[field] for field in fields if field in scaled}
+
+
+@method_decorator(conditional_page, name="dispatch")
+class ShoppingListApiView(View):
+    def get(self, request):
+        # ?recipes=1,2:6 lists recipe ids, each optionally with ":servings"
+        try:
+            entries = parse_recipe_list(request.GET.get("recipes", ""))
+            return JsonResponse(build_shopping_list(entries))
+        except ShoppingListError as e:
+            return error_response(str(e), 400)
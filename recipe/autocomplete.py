@@ -0,0 +1,198 @@
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left, insort
+from heapq import merge
+from itertools import islice
+from django.db import connections
+from ingredient.models import Ingredient
+from .models import Recipe
+
+# Reload from the database after this many seconds, which picks up changes
+# saved by other worker processes; changes made in this process are applied
+# by recipe.signals once they are committed. Reloads run in a background thread while
+# lookups are answered from the previous entries.
+AUTOCOMPLETE_MAX_AGE = 300
+
+AUTOCOMPLETE_LIMIT = 10
+AUTOCOMPLETE_MAX_LIMIT = 20
+
+# Keys looked at per lookup at most, which bounds the time a short prefix
+# matching many repeated names can take
+AUTOCOMPLETE_MAX_SCAN = 200
+
+LABEL_KINDS = ["recipe", "ingredient"]
+
+WORD_START_RE = re.compile(r"\b\w")
+
+
+def normalize(text):
+    return " ".join(text.casefold().split())
+
+
+def word_suffixes(text):
+    # "tomato salsa" -> ["tomato salsa", "salsa"], so any word can start a match
+    return [text[match.start():] for match in WORD_START_RE.finditer(text)]
+
+
+class LabelIndex(ABC):
+    """
+    Base for the in-memory indexes of recipe titles and ingredient names.
+    Entries are (kind, pk, label) with kind "recipe" or "ingredient";
+    subclasses keep their lookup structure in step in rebuild, _insert and
+    _delete, which are always called with the lock held.
+    """
+
+    def __init__(self, max_age=AUTOCOMPLETE_MAX_AGE):
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.labels = {}  # (kind, pk) -> label
+        self.loaded_at = None
+        # (kind, pk, label or None) changes made while a load reads the
+        # database, replayed on top of what it read; None when not loading
+        self.changes = None
+
+    def is_loaded(self):
+        return self.loaded_at is not None
+
+    def read_entries(self):
+        recipes = Recipe.objects.values_list("pk", "title")
+        ingredients = Ingredient.objects.exclude(name=None).values_list("pk", "name")
+        entries = [("recipe", pk, title) for pk, title in recipes]
+        entries += [("ingredient", pk, name) for pk, name in ingredients]
+        return entries
+
+    def load(self):
+        # The database is read outside the lock, so lookups and changes go on
+        # meanwhile; a change saved after the read started could be missing
+        # from it, so every change made until the swap is applied again
+        with self.lock:
+            if self.changes is not None:
+                return  # another thread is loading
+            self.changes = []
+        try:
+            entries = self.read_entries()
+            with self.lock:
+                self.rebuild(entries)
+                for kind, pk, label in self.changes:
+                    self._replace(kind, pk, label)
+                self.loaded_at = time.monotonic()
+        finally:
+            with self.lock:
+                self.changes = None
+
+    def reload_in_background(self):
+        def reload():
+            try:
+                self.load()
+            finally:
+                connections.close_all()  # this thread's connections only
+
+        threading.Thread(target=reload, daemon=True).start()
+
+    def ensure_fresh(self):
+        if self.loaded_at is None:
+            self.load()
+        elif self.changes is None and time.monotonic() - self.loaded_at > self.max_age:
+            self.reload_in_background()
+
+    def add(self, kind, pk, label):
+        with self.lock:
+            if self.changes is not None:
+                self.changes.append((kind, pk, label))
+            if self.loaded_at is not None:
+                self._replace(kind, pk, label)
+
+    def remove(self, kind, pk):
+        self.add(kind, pk, None)
+
+    def _replace(self, kind, pk, label):
+        old = self.labels.pop((kind, pk), None)
+        if old is not None:
+            self._delete(kind, pk, old)
+        if label:
+            self.labels[(kind, pk)] = label
+            self._insert(kind, pk, label)
+
+    def rebuild(self, entries):
+        self.labels = {(kind, pk): label for kind, pk, label in entries}
+
+    @abstractmethod
+    def _insert(self, kind, pk, label):
+        pass
+
+    @abstractmethod
+    def _delete(self, kind, pk, label):
+        pass
+
+
+class PrefixIndex(LabelIndex):
+    """
+    In-memory typeahead index of recipe titles and ingredient names. Keys are
+    kept in a sorted list of (suffix, kind, pk) tuples per kind; a prefix
+    lookup is a bisect to the first key at or after the prefix followed by a
+    short scan, merged across the kinds asked for.
+    """
+
+    def __init__(self, max_age=AUTOCOMPLETE_MAX_AGE):
+        super().__init__(max_age)
+        self.keys = {kind: [] for kind in LABEL_KINDS}
+
+    def prefix_keys(self, kind, pk, label):
+        return [(suffix, kind, pk) for suffix in word_suffixes(normalize(label))]
+
+    def rebuild(self, entries):
+        super().rebuild(entries)
+        self.keys = {kind: [] for kind in LABEL_KINDS}
+        for kind, pk, label in entries:
+            self.keys[kind].extend(self.prefix_keys(kind, pk, label))
+        for keys in self.keys.values():
+            keys.sort()
+
+    def _insert(self, kind, pk, label):
+        for key in self.prefix_keys(kind, pk, label):
+            insort(self.keys[kind], key)
+
+    def _delete(self, kind, pk, label):
+        keys = self.keys[kind]
+        for key in self.prefix_keys(kind, pk, label):
+            position = bisect_left(keys, key)
+            if position < len(keys) and keys[position] == key:
+                del keys[position]
+
+    def matching_keys(self, keys, prefix):
+        position = bisect_left(keys, (prefix,))
+        while position < len(keys) and keys[position][0].startswith(prefix):
+            yield keys[position]
+            position += 1
+
+    def complete(self, prefix, limit=AUTOCOMPLETE_LIMIT, kind=None):
+        """
+        Up to ``limit`` (kind, pk, label) matches whose label has a word
+        starting with ``prefix``, in alphabetical order of the matched words,
+        of the given ``kind`` only when given. Labels matching on several of
+        their words and ingredient names shared by several rows are returned
+        once; at most AUTOCOMPLETE_MAX_SCAN keys are looked at.
+        """
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        self.ensure_fresh()
+        with self.lock:
+            kinds = LABEL_KINDS if kind is None else [kind]
+            matches = merge(*(self.matching_keys(self.keys[k], prefix) for k in kinds))
+            results = []
+            seen = set()
+            for _, key_kind, pk in islice(matches, AUTOCOMPLETE_MAX_SCAN):
+                if len(results) == limit:
+                    break
+                label = self.labels[(key_kind, pk)]
+                if (key_kind, pk) in seen or (key_kind, normalize(label)) in seen:
+                    continue
+                seen.update([(key_kind, pk), (key_kind, normalize(label))])
+                results.append((key_kind, pk, label))
+        return results
+
+
+autocomplete_index = PrefixIndex()
@@ -0,0 +1,108 @@
+import hashlib
+import uuid
+from django.core.cache import cache
+from django.db import transaction
+
+# Cached page data, by name:
+#   home         a page of home page recipes
+#   detail       a recipe with its owner and ingredient lines
+#   ingredients  the rendered ingredient table and charts (see recipe.charts)
+#   search       a page of search results
+#   mealplan     the recipes of a meal plan and its totals (see mealplan.totals)
+# Keys include the version of the recipe they show and/or the catalog version
+# shared by all listings. recipe.signals replaces those versions when recipes
+# or their ingredient lines change, so stale entries are never read again and
+# simply expire. Writes that skip the signals (queryset update(), raw SQL)
+# need invalidate_recipes called by hand.
+FRAGMENT_CACHE_TIMEOUT = 60 * 60
+FRAGMENT_NAMES = ("home", "detail", "ingredients", "search", "mealplan")
+CATALOG_VERSION_KEY = "recipes:version"
+
+MISSING = object()
+
+
+def recipe_version_key(recipe_id):
+    return f"recipe:{recipe_id}:version"
+
+
+def get_versions(keys):
+    versions = cache.get_many(keys)
+    missing = {key: uuid.uuid4().hex for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def invalidate_versions(keys):
+    """
+    Replace the given version keys, dropping everything cached under them.
+    Done again once the transaction commits, in case another request cached
+    the old rows in the meantime.
+    """
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def invalidate_recipes(recipe_ids=()):
+    # Drop the cached data of the given recipes and of every listing
+    keys = [CATALOG_VERSION_KEY, *(recipe_version_key(pk) for pk in recipe_ids)]
+    invalidate_versions(keys)
+
+
+def cached(name, parts, build, versions=(CATALOG_VERSION_KEY,)):
+    """
+    The cached ``name`` entry for ``parts``, made with ``build()`` and stored on
+    a miss. Replacing any of the ``versions`` keys invalidates it.
+    """
+    key_parts = [*get_versions(list(versions)), *parts]
+    digest = hashlib.sha1(repr(key_parts).encode("utf-8")).hexdigest()
+    key = f"fragment:{name}:{digest}"
+    value = cache.get(key, MISSING)
+    if value is MISSING:
+        count(name, "miss")
+        value = build()
+        cache.set(key, value, FRAGMENT_CACHE_TIMEOUT)
+    else:
+        count(name, "hit")
+    return value
+
+
+# Hit and miss counters are kept in the cache itself, so with a shared
+# backend they add up every worker process
+def stats_key(name, outcome):
+    return f"cache-stats:{name}:{outcome}"
+
+
+STATS_KEYS = [
+    stats_key(name, outcome) for name in FRAGMENT_NAMES for outcome in ("hit", "miss")
+]
+
+
+def count(name, outcome):
+    key = stats_key(name, outcome)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, None)
+        cache.incr(key)
+
+
+def cache_stats():
+    # name -> {"hits", "misses", "hit_rate"}
+    values = cache.get_many(STATS_KEYS)
+    stats = {}
+    for name in FRAGMENT_NAMES:
+        hits = values.get(stats_key(name, "hit"), 0)
+        misses = values.get(stats_key(name, "miss"), 0)
+        total = hits + misses
+        stats[name] = {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / total, 3) if total else None,
+        }
+    return stats
+
+
+def reset_cache_stats():
+    cache.delete_many(STATS_KEYS)
@@ -0,0 +1,113 @@
+import csv
+import json
+from pathlib import Path
+from django.core.files.storage import default_storage
+from django.db.models import Prefetch
+from recipeingredient.models import RecipeIngredient
+from .images import image_path
+from .utils import INGREDIENT_LINE_FIELDS
+
+# Streaming export of recipes with their ingredient lines, in the record
+# layout read by "manage.py import_recipes" (see recipe.importer). Recipes
+# are read with iterator(chunk_size=...) and each chunk's ingredients with
+# one prefetch query, so memory use stays flat however many recipes there are.
+EXPORT_CHUNK_SIZE = 500
+
+RECIPE_EXPORT_FIELDS = [
+    "title",
+    "directions",
+    "recipe_type",
+    "cooking_time",
+    "star_count",
+    "servings",
+    "yield_amount",
+    "adapted_link",
+    "allergens",
+    "small_desc",
+]
+CSV_COLUMNS = RECIPE_EXPORT_FIELDS + ["image", "ingredients"]
+
+
+def export_records(queryset, image=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield each recipe of ``queryset`` as a dict with its ingredient lines.
+    ``image(digest)`` gives the "image" value of recipes with a picture;
+    without it, or when it returns None, the key is left out.
+    """
+    recipes = queryset.order_by("pk").prefetch_related(
+        Prefetch(
+            "recipe_ingredients",
+            queryset=RecipeIngredient.objects.select_related("ingredient").order_by("pk"),
+        )
+    )
+    for recipe in recipes.iterator(chunk_size=chunk_size):
+        record = {field: getattr(recipe, field) for field in RECIPE_EXPORT_FIELDS}
+        if image and recipe.image_hash:
+            value = image(recipe.image_hash)
+            if value:
+                record["image"] = value
+        record["ingredients"] = [
+            {
+                "ingredient": item.ingredient.name,
+                **{field: getattr(item, field) for field in INGREDIENT_LINE_FIELDS},
+            }
+            for item in recipe.recipe_ingredients.all()
+        ]
+        yield record
+
+
+class ImageCopier:
+    """
+    image callback for export_records that copies each picture (full size)
+    into ``directory``/images once and refers to it by its relative path,
+    which import_recipes reads back with --image-root ``directory``.
+    """
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+
+    def __call__(self, digest):
+        relative = f"images/{digest}.jpg"
+        target = self.directory / relative
+        if not target.exists():
+            try:
+                source = default_storage.open(image_path(digest, "full"))
+            except FileNotFoundError:
+                return None
+            target.parent.mkdir(parents=True, exist_ok=True)
+            with source, open(target, "wb") as file:
+                for chunk in source.chunks():
+                    file.write(chunk)
+        return relative
+
+
+class Echo:
+    # Stand-in file for csv.writer: writerow returns the formatted row
+    def write(self, value):
+        return value
+
+
+def json_default(value):
+    # Decimals are written as strings to keep their exact value
+    return str(value)
+
+
+def jsonl_lines(records):
+    for record in records:
+        yield json.dumps(record, default=json_default) + "\n"
+
+
+def csv_lines(records):
+    # One row per recipe with the ingredient lines as a JSON list
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_COLUMNS)
+    for record in records:
+        record["ingredients"] = json.dumps(record["ingredients"], default=json_default)
+        yield writer.writerow([record.get(column) for column in CSV_COLUMNS])
+
+
+# format -> (line generator, content type)
+EXPORT_FORMATS = {
+    "jsonl": (jsonl_lines, "application/x-ndjson"),
+    "csv": (csv_lines, "text/csv"),
+}
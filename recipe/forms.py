@@ -2,6 +2,8 @@ from collections import OrderedDict
 from django import forms  # import django forms
 from recipeingredientintermediary.models import RecipeIngredientIntermediary
 from .models import Recipe
+from .images import decode_base64_image, open_image
+from .utils import derive_grams
 from django.core.validators import MinValueValidator
 
 SEARCH__CHOICES = (  # specify choices as a tuple
@@ -46,11 +48,28 @@ class RecipeSearchForm(forms.Form):
                 "class": "form-control",
                 "placeholder": "Search...",
                 "style": "display: block; width: 100%;",
+                # Suggestions filled in by the navbar script (recipe:autocomplete)
+                "list": "search-suggestions",
+                "autocomplete": "off",
             }
         ),
     )
 
 
+def clean_image_data(form):
+    # Decode the base64 picture posted by the page script into image bytes,
+    # kept on the form as image_data for the view to store
+    base64_string = form.cleaned_data.get("base64_string")
+    form.image_data = None
+    if base64_string:
+        try:
+            form.image_data = decode_base64_image(base64_string)
+            open_image(form.image_data)
+        except ValueError as e:
+            raise forms.ValidationError(str(e))
+    return base64_string
+
+
 class RecipeForm(forms.ModelForm):
     # Define the additional fields
     image = forms.ImageField(
@@ -67,9 +86,12 @@ class RecipeForm(forms.ModelForm):
         exclude = [
             "user",
             "recipe_ingredients",
-            "pic",
+            "image_hash",
         ]  # Exclude user and recipe_ingredient fields from the form
 
+    def clean_base64_string(self):
+        return clean_image_data(self)
+
     def save(self, commit=True, user=None):
         instance = super().save(commit=False)
         if user:
@@ -95,16 +117,16 @@ class RecipeEditForm(forms.ModelForm):
         exclude = [
             "user",
             "recipe_ingredients",
-            "pic",
+            "image_hash",
         ]
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.fields["image"].required = False
 
-        # If the instance has pic data, populate base64_string with it
-        if self.instance.pic:
-            self.fields["base64_string"].initial = self.instance.pic
+    def clean_base64_string(self):
+        # Leaving the picture blank keeps the recipe's current image
+        return clean_image_data(self)
 
     def save(self, commit=True, user=None):
         instance = super().save(commit=False)
@@ -115,6 +137,10 @@ class RecipeEditForm(forms.ModelForm):
         return instance
 
 
+GRAMS_HELP = "Leave blank to work it out from the amount"
+GRAMS_NEEDED = "Enter the grams, they cannot be worked out from this amount."
+
+
 class RecipeIngredientIntermediaryForm(forms.ModelForm):
     recipe_id = forms.IntegerField(widget=forms.HiddenInput(), required=False)
     # Add the fields from RecipeIngredient
@@ -129,9 +155,68 @@ class RecipeIngredientIntermediaryForm(forms.ModelForm):
     )
     supplier = forms.CharField(max_length=255)
     grams = forms.DecimalField(
-        max_digits=8, decimal_places=2, validators=[MinValueValidator(0)]
+        max_digits=8,
+        decimal_places=2,
+        validators=[MinValueValidator(0)],
+        required=False,
+        help_text=GRAMS_HELP,
     )
 
     class Meta:
         model = RecipeIngredientIntermediary
         exclude = ["recipe", "recipe_ingredient"]  # Exclude the foreign key fields
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get("grams") is None and not self.errors:
+            if derive_grams([cleaned_data]):
+                self.add_error("grams", GRAMS_NEEDED)
+        return cleaned_data
+
+
+class IngredientLineForm(forms.Form):
+    # One row of the bulk ingredient form, same fields as the single add form.
+    # The blank unit choice lets untouched extra rows count as unchanged.
+    ingredient = forms.CharField(max_length=255)
+    calorie_content = forms.DecimalField(max_digits=8, decimal_places=2)
+    amount = forms.DecimalField(
+        max_digits=8, decimal_places=2, validators=[MinValueValidator(0)]
+    )
+    amount_type = forms.ChoiceField(choices=[("", "---------"), *AMOUNT_TYPES])
+    cost = forms.DecimalField(
+        max_digits=8, decimal_places=2, validators=[MinValueValidator(0)]
+    )
+    supplier = forms.CharField(max_length=255)
+    grams = forms.DecimalField(
+        max_digits=8,
+        decimal_places=2,
+        validators=[MinValueValidator(0)],
+        required=False,
+        help_text=GRAMS_HELP,
+    )
+
+
+class BaseIngredientLineFormSet(forms.BaseFormSet):
+    def clean(self):
+        # Work out the grams left blank on every line with one conversion
+        blank = [
+            form
+            for form in self.forms
+            if form.has_changed()
+            and form.is_valid()
+            and form.cleaned_data.get("grams") is None
+        ]
+        failed = {id(line) for line in derive_grams([f.cleaned_data for f in blank])}
+        for form in blank:
+            if id(form.cleaned_data) in failed:
+                form.add_error("grams", GRAMS_NEEDED)
+
+
+# Blank extra rows are skipped; up to 100 lines per submit
+IngredientLineFormSet = forms.formset_factory(
+    IngredientLineForm,
+    formset=BaseIngredientLineFormSet,
+    extra=10,
+    max_num=100,
+    validate_max=True,
+)
@@ -0,0 +1,182 @@
+import re
+from collections import Counter
+from django.db import connection
+from .autocomplete import LabelIndex, normalize
+from .models import Recipe
+from .search import SEARCH_RESULT_LIMIT, rank_by_ids, restrict_to, search_backend
+
+# Typo tolerant search over recipe titles and ingredient names, scored with
+# pg_trgm's trigram similarity: |shared trigrams| / |all trigrams|.
+#   postgresql: pg_trgm word_similarity() with GIN trigram indexes (migration 0023)
+#   otherwise:  the in-process TrigramIndex below
+FUZZY_THRESHOLD = 0.3
+
+# Bounds on the work per query: posting entries counted, then the candidates
+# sharing the most trigrams with the query that get a full similarity score
+FUZZY_MAX_POSTINGS = 50000
+FUZZY_CANDIDATES = 200
+
+WORD_RE = re.compile(r"\w+")
+
+
+def trigrams(text):
+    # pg_trgm style: each word padded with two spaces in front and one behind
+    grams = set()
+    for word in WORD_RE.findall(text):
+        padded = f"  {word} "
+        grams.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def similarity(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def word_similarity(query, label):
+    """
+    Best similarity between the query and any run of as many consecutive
+    words of the label, so "tomatoe" scores well against "Tomato Salsa".
+    """
+    query_grams = trigrams(query)
+    words = WORD_RE.findall(label)
+    size = max(len(WORD_RE.findall(query)), 1)
+    best = similarity(query_grams, trigrams(label))
+    for start in range(max(len(words) - size + 1, 0)):
+        window = " ".join(words[start : start + size])
+        best = max(best, similarity(query_grams, trigrams(window)))
+    return best
+
+
+class TrigramIndex(LabelIndex):
+    """
+    In-memory inverted index from trigram to the (kind, pk) entries whose
+    label contains it. Candidates are gathered from the query's rarest
+    trigrams first and only the closest FUZZY_CANDIDATES are scored.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.postings = {}
+
+    def rebuild(self, entries):
+        super().rebuild(entries)
+        self.postings = {}
+        for kind, pk, label in entries:
+            self._insert(kind, pk, label)
+
+    def _insert(self, kind, pk, label):
+        for gram in trigrams(normalize(label)):
+            self.postings.setdefault(gram, set()).add((kind, pk))
+
+    def _delete(self, kind, pk, label):
+        for gram in trigrams(normalize(label)):
+            posting = self.postings.get(gram)
+            if posting is not None:
+                posting.discard((kind, pk))
+                if not posting:
+                    del self.postings[gram]
+
+    def search(
+        self,
+        query,
+        kind,
+        limit=SEARCH_RESULT_LIMIT,
+        threshold=FUZZY_THRESHOLD,
+        among=None,
+    ):
+        # [(pk, score)] of the given kind, best first, of the pks in ``among``
+        # when given
+        query = normalize(query)
+        grams = trigrams(query)
+        if not grams:
+            return []
+        self.ensure_fresh()
+        with self.lock:
+            postings = sorted(
+                (self.postings.get(gram, ()) for gram in grams), key=len
+            )
+            counts = Counter()
+            examined = 0
+            for posting in postings:
+                if examined >= FUZZY_MAX_POSTINGS:
+                    break
+                examined += len(posting)
+                counts.update(
+                    key
+                    for key in posting
+                    if key[0] == kind and (among is None or key[1] in among)
+                )
+            candidates = [
+                (key[1], self.labels[key])
+                for key, _ in counts.most_common(FUZZY_CANDIDATES)
+            ]
+        scored = [
+            (pk, word_similarity(query, normalize(label))) for pk, label in candidates
+        ]
+        scored = [(pk, score) for pk, score in scored if score >= threshold]
+        scored.sort(key=lambda item: (-item[1], item[0]))
+        return scored[:limit]
+
+
+trigram_index = TrigramIndex()
+
+
+# kind -> table and column searched on postgresql, and the field of a recipe
+# holding the ids of that kind
+FUZZY_KINDS = {
+    "recipe": ("recipe_recipe", "title", "pk"),
+    "ingredient": ("ingredient_ingredient", "name", "recipe_ingredients__ingredient"),
+}
+
+
+def postgres_matches(query, kind, queryset, limit):
+    table, column, field = FUZZY_KINDS[kind]
+    restriction, params = restrict_to(queryset, "id", field)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT set_config('pg_trgm.word_similarity_threshold', %s, false)",
+            [str(FUZZY_THRESHOLD)],
+        )
+        cursor.execute(
+            f"SELECT id, word_similarity(%s, {column}) AS score FROM {table} "
+            f"WHERE %s <%% {column}{restriction} ORDER BY score DESC, id LIMIT %s",
+            [query, query, *params, limit],
+        )
+        return cursor.fetchall()
+
+
+def fuzzy_matches(query, kind, queryset=None, limit=SEARCH_RESULT_LIMIT):
+    # [(pk, score)] of the given kind, best first, of the recipes in
+    # ``queryset`` or the ingredients they use, so the limit applies to those
+    if search_backend() == "postgresql":
+        return postgres_matches(query, kind, queryset, limit)
+    among = None
+    if queryset is not None and queryset.query.where:
+        field = FUZZY_KINDS[kind][2]
+        among = set(queryset.order_by().values_list(field, flat=True))
+    return trigram_index.search(query, kind, limit, among=among)
+
+
+def fuzzy_search_recipes(query, queryset=None):
+    """
+    Recipes from ``queryset`` whose title or one of whose ingredient names is
+    similar to ``query``, annotated with ``search_rank`` (best match first).
+    A recipe scores as its closest title or ingredient match.
+    """
+    queryset = Recipe.objects.all() if queryset is None else queryset
+    if not normalize(query) or queryset.query.is_empty():
+        return queryset.none()
+
+    scores = dict(fuzzy_matches(query, "recipe", queryset))
+    ingredient_scores = dict(fuzzy_matches(query, "ingredient", queryset))
+    if ingredient_scores:
+        links = queryset.order_by().filter(
+            recipe_ingredients__ingredient__in=list(ingredient_scores)
+        ).values_list("pk", "recipe_ingredients__ingredient")
+        for pk, ingredient_id in links:
+            scores[pk] = max(scores.get(pk, 0.0), ingredient_scores[ingredient_id])
+
+    recipe_ids = sorted(scores, key=lambda pk: (-scores[pk], pk))[:SEARCH_RESULT_LIMIT]
+    return rank_by_ids(queryset, recipe_ids)
@@ -0,0 +1,81 @@
+import base64
+import binascii
+import hashlib
+import re
+from io import BytesIO
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.templatetags.static import static
+from django.urls import reverse
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+# Recipe pictures are stored once per distinct upload, keyed by the sha256 of the
+# uploaded bytes: MEDIA_ROOT/recipe/images/<ab>/<digest>/<variant>.jpg
+IMAGE_ROOT = "recipe/images"
+
+# variant -> bounding box (width, height); every variant keeps its aspect ratio
+IMAGE_VARIANTS = {
+    "full": (1600, 1600),
+    "card": (800, 600),
+    "detail": (400, 400),
+    "row": (200, 200),
+}
+
+DIGEST_RE = re.compile(r"^[0-9a-f]{64}$")
+DATA_URL_PREFIX_RE = re.compile(r"^data:image/[a-zA-Z0-9.+-]+;base64,")
+
+
+def decode_base64_image(value):
+    # Accepts plain base64 or a data URL, raises ValueError for anything else
+    value = DATA_URL_PREFIX_RE.sub("", value.strip())
+    try:
+        return base64.b64decode(value, validate=True)
+    except (binascii.Error, ValueError):
+        raise ValueError("Image data is not valid base64.")
+
+
+def open_image(data):
+    # Fully decode the image so that truncated or bogus uploads fail here
+    try:
+        image = Image.open(BytesIO(data))
+        image.load()
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError):
+        raise ValueError("Upload a valid image.")
+    return ImageOps.exif_transpose(image).convert("RGB")
+
+
+def image_path(digest, variant):
+    return f"{IMAGE_ROOT}/{digest[:2]}/{digest}/{variant}.jpg"
+
+
+def render_variant(image, size):
+    thumbnail = image.copy()
+    thumbnail.thumbnail(size, Image.LANCZOS)
+    buffer = BytesIO()
+    thumbnail.save(buffer, format="JPEG", quality=85, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def store_image(data):
+    """
+    Store an uploaded picture and its thumbnails, returning the content hash
+    that identifies it. Uploading the same bytes twice reuses the stored files.
+    """
+    digest = hashlib.sha256(data).hexdigest()
+    missing = [
+        variant
+        for variant in IMAGE_VARIANTS
+        if not default_storage.exists(image_path(digest, variant))
+    ]
+    if missing:
+        image = open_image(data)
+        for variant in missing:
+            content = ContentFile(render_variant(image, IMAGE_VARIANTS[variant]))
+            default_storage.save(image_path(digest, variant), content)
+    return digest
+
+
+def image_url(digest, variant):
+    if not digest:
+        return static("images/no_picture.jpg")
+    return reverse("recipe:image", kwargs={"digest": digest, "variant": variant})
@@ -0,0 +1,291 @@
+import csv
+import json
+import os
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+from django.db import transaction
+from recipeingredient.models import AMOUNT_TYPES
+from .caching import invalidate_recipes
+from .images import store_image
+from .models import RECIPE_TYPES, Recipe
+from .rollups import rollup_fields
+from .search import index_recipes
+from .signals import update_label_indexes
+from .utils import create_ingredient_lines, derive_grams
+
+# Bulk import of recipes from a JSON Lines or CSV file, used by
+# "manage.py import_recipes". Each record is one recipe:
+#   title, directions, recipe_type (required)
+#   cooking_time, star_count, servings, yield_amount, adapted_link,
+#   allergens, small_desc (optional)
+#   image: path of a picture, relative to the image root
+#   ingredients: list of {"ingredient", "calorie_content", "amount",
+#     "amount_type", "cost", "supplier", "grams"}; in a CSV file this column
+#     holds the list as JSON. Without grams, the weight is worked out from
+#     the amount (see recipeingredient.units).
+# The file is read one record at a time and written in batches, each batch in
+# its own transaction, so memory use does not grow with the file.
+IMPORT_BATCH_SIZE = 1000
+
+OPTIONAL_INTEGER_FIELDS = ["cooking_time", "star_count", "servings", "yield_amount"]
+OPTIONAL_TEXT_FIELDS = ["adapted_link", "allergens", "small_desc"]
+
+# field -> whether it may be negative
+LINE_DECIMAL_FIELDS = {
+    "calorie_content": True,
+    "amount": False,
+    "cost": False,
+    "grams": False,
+}
+AMOUNT_TYPE_VALUES = {value for value, _ in AMOUNT_TYPES}
+RECIPE_TYPE_VALUES = {value for value, _ in RECIPE_TYPES}
+
+# DecimalField(max_digits=8, decimal_places=2)
+DECIMAL_LIMIT = Decimal("1000000")
+CENT = Decimal("0.01")
+
+
+class RecordError(ValueError):
+    pass
+
+
+def read_records(path):
+    """
+    Yield (record number, raw record) from a .csv file (one row per recipe)
+    or a JSON Lines file (one object per line). Record numbers count rows or
+    lines from 1 and are what an import resumes from.
+    """
+    with open(path, newline="", encoding="utf-8") as file:
+        if Path(path).suffix.lower() == ".csv":
+            yield from enumerate(csv.DictReader(file), 1)
+        else:
+            for number, line in enumerate(file, 1):
+                if line.strip():
+                    yield number, line
+
+
+def clean_decimal(value, name, negative=False):
+    try:
+        value = Decimal(str(value).strip()).quantize(CENT)
+    except (InvalidOperation, ValueError):
+        raise RecordError(f"{name} must be a number")
+    if not value.is_finite() or abs(value) >= DECIMAL_LIMIT:
+        raise RecordError(f"{name} is out of range")
+    if value < 0 and not negative:
+        raise RecordError(f"{name} must not be negative")
+    return value
+
+
+def clean_line(line):
+    if not isinstance(line, dict):
+        raise RecordError("each ingredient must be an object")
+    name = " ".join(str(line.get("ingredient") or "").split())
+    if not name or len(name) > 255:
+        raise RecordError("ingredient needs a name of up to 255 characters")
+    if line.get("amount_type") not in AMOUNT_TYPE_VALUES:
+        raise RecordError(f"{name}: unknown amount_type {line.get('amount_type')!r}")
+    cleaned = {
+        "ingredient": name,
+        "amount_type": line["amount_type"],
+        "supplier": str(line.get("supplier") or "")[:255],
+    }
+    for field, negative in LINE_DECIMAL_FIELDS.items():
+        if field == "grams" and line.get(field) in (None, ""):
+            # Worked out from the amount when the batch is written
+            cleaned[field] = None
+            continue
+        if line.get(field) in (None, ""):
+            raise RecordError(f"{name}: {field} is required")
+        cleaned[field] = clean_decimal(line[field], f"{name}: {field}", negative)
+    return cleaned
+
+
+def clean_record(raw, image_root):
+    """
+    Check one raw record and return {"fields", "ingredients", "image_hash"},
+    raising RecordError with the reason when it cannot be imported.
+    Pictures are stored here, before the batch is written.
+    """
+    if isinstance(raw, str):
+        try:
+            raw = json.loads(raw)
+        except json.JSONDecodeError as e:
+            raise RecordError(f"invalid JSON: {e}")
+    if not isinstance(raw, dict):
+        raise RecordError("a record must be an object")
+
+    title = " ".join(str(raw.get("title") or "").split())
+    if not title or len(title) > 255:
+        raise RecordError("title is required, up to 255 characters")
+    if not raw.get("directions"):
+        raise RecordError("directions are required")
+    if raw.get("recipe_type") not in RECIPE_TYPE_VALUES:
+        raise RecordError(f"unknown recipe_type {raw.get('recipe_type')!r}")
+    fields = {
+        "title": title,
+        "directions": str(raw["directions"]),
+        "recipe_type": raw["recipe_type"],
+    }
+    for field in OPTIONAL_INTEGER_FIELDS:
+        if raw.get(field) not in (None, ""):
+            try:
+                fields[field] = int(raw[field])
+            except (TypeError, ValueError):
+                raise RecordError(f"{field} must be a whole number")
+    if fields.get("star_count") not in (None, 1, 2, 3, 4, 5):
+        raise RecordError("star_count must be between 1 and 5")
+    for field in OPTIONAL_TEXT_FIELDS:
+        if raw.get(field):
+            fields[field] = str(raw[field])
+
+    ingredients = raw.get("ingredients") or []
+    if isinstance(ingredients, str):
+        try:
+            ingredients = json.loads(ingredients)
+        except json.JSONDecodeError as e:
+            raise RecordError(f"ingredients are not valid JSON: {e}")
+    if not isinstance(ingredients, list):
+        raise RecordError("ingredients must be a list")
+    lines = [clean_line(line) for line in ingredients]
+
+    image_hash = ""
+    if raw.get("image"):
+        try:
+            data = (Path(image_root) / raw["image"]).read_bytes()
+            image_hash = store_image(data)
+        except (OSError, ValueError) as e:
+            raise RecordError(f"image {raw['image']!r}: {e}")
+    return {
+        "fields": fields,
+        "ingredients": lines,
+        "image_hash": image_hash,
+    }
+
+
+class RecipeImporter:
+    """
+    Import recipes for ``user`` in batches of ``batch_size``. Recipes whose
+    title is already taken are skipped, so running an import again after a
+    failure only adds what is missing.
+    """
+
+    def __init__(
+        self, user, batch_size=IMPORT_BATCH_SIZE, image_root=".", on_error=None
+    ):
+        self.user = user
+        self.batch_size = batch_size
+        self.image_root = image_root
+        # on_error(number, reason) is told about each rejected record
+        self.on_error = on_error
+        self.imported = 0
+        self.lines = 0
+        self.skipped = 0
+        self.rejected = 0
+
+    def run(self, records, start_after=0, on_batch=None):
+        """
+        Import (number, raw record) pairs, skipping numbers up to
+        ``start_after``. ``on_batch(number)`` is called after each committed
+        batch with the number of the last record it covers.
+        """
+        batch = []
+        number = saved = start_after
+        for number, raw in records:
+            if number <= start_after:
+                continue
+            try:
+                batch.append((number, clean_record(raw, self.image_root)))
+            except RecordError as e:
+                self.rejected += 1
+                if self.on_error:
+                    self.on_error(number, str(e))
+            if len(batch) >= self.batch_size:
+                self.write_batch(batch)
+                batch = []
+                saved = number
+                if on_batch:
+                    on_batch(number)
+        if batch:
+            self.write_batch(batch)
+        if on_batch and number > saved:
+            on_batch(number)
+
+    def write_batch(self, batch):
+        batch = self.fill_in_grams(batch)
+        if not batch:
+            return
+        titles = [record["fields"]["title"] for _, record in batch]
+        with transaction.atomic():
+            taken = set(
+                Recipe.objects.filter(title__in=titles).values_list("title", flat=True)
+            )
+            records = []
+            for _, record in batch:
+                title = record["fields"]["title"]
+                if title in taken:
+                    self.skipped += 1
+                    continue
+                taken.add(title)
+                records.append(record)
+            # The totals are filled in here, as bulk_create skips the signals
+            recipes = Recipe.objects.bulk_create(
+                Recipe(
+                    user=self.user,
+                    image_hash=record["image_hash"],
+                    **record["fields"],
+                    **rollup_fields(
+                        record["ingredients"], record["fields"].get("servings")
+                    ),
+                )
+                for record in records
+            )
+            recipe_lines = [
+                (recipe, line)
+                for recipe, record in zip(recipes, records)
+                for line in record["ingredients"]
+            ]
+            create_ingredient_lines(recipe_lines)
+            # bulk_create skips the signals that keep the search index and the
+            # typeahead and fuzzy search indexes in step; the latter are
+            # updated once the batch commits
+            index_recipes([recipe.pk for recipe in recipes])
+            for recipe in recipes:
+                update_label_indexes("recipe", recipe.pk, recipe.title)
+            invalidate_recipes()
+        self.imported += len(recipes)
+        self.lines += len(recipe_lines)
+
+    def fill_in_grams(self, batch):
+        # Convert the amounts of every line without grams in one batch, and
+        # reject the records with a line whose weight cannot be worked out
+        lines = [line for _, record in batch for line in record["ingredients"]]
+        failed = {id(line) for line in derive_grams(lines)}
+        if not failed:
+            return batch
+        kept = []
+        for number, record in batch:
+            bad = [line for line in record["ingredients"] if id(line) in failed]
+            if not bad:
+                kept.append((number, record))
+                continue
+            self.rejected += 1
+            if self.on_error:
+                name = bad[0]["ingredient"]
+                self.on_error(number, f"{name}: grams are needed for this amount")
+        return kept
+
+
+def read_checkpoint(path):
+    # Number of the last record committed by an earlier run, 0 if none
+    try:
+        with open(path, encoding="utf-8") as file:
+            return int(json.load(file)["done"])
+    except FileNotFoundError:
+        return 0
+
+
+def write_checkpoint(path, done):
+    temporary = f"{path}.tmp"
+    with open(temporary, "w", encoding="utf-8") as file:
+        json.dump({"done": done}, file)
+    os.replace(temporary, path)
@@ -0,0 +1,57 @@
+import gzip
+import time
+from django.core.management.base import BaseCommand
+from recipe.charts import chart_renderer, svg_chart_renderer
+
+CHART_NAMES = {"#1": "calories", "#2": "grams", "#3": "cost"}
+
+
+class Command(BaseCommand):
+    help = "Compare render time and payload size of the PNG and SVG detail page charts"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--ingredients", type=int, default=8)
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+        count, repeat = options["ingredients"], options["repeat"]
+        labels = [f"Ingredient {i + 1}" for i in range(count)]
+        values = [float(10 + (i * 37) % 90) for i in range(count)]
+
+        renderers = {
+            "png": lambda chart_type: chart_renderer.render_base64(
+                chart_type, labels, values
+            ),
+            "svg": lambda chart_type: svg_chart_renderer.render(
+                chart_type, labels, values
+            ),
+        }
+
+        self.stdout.write(
+            f"{count} ingredients, {repeat} renders per chart\n"
+            f"{'format':<8}{'chart':<10}{'ms/render':>12}{'bytes':>10}{'gzipped':>10}"
+        )
+        totals = {}
+        for chart_format, render in renderers.items():
+            totals[chart_format] = [0.0, 0]
+            for chart_type, name in CHART_NAMES.items():
+                start = time.perf_counter()
+                for _ in range(repeat):
+                    output = render(chart_type)
+                elapsed = (time.perf_counter() - start) / repeat * 1000
+                size = len(output.encode("utf-8"))
+                gzipped = len(gzip.compress(output.encode("utf-8")))
+                totals[chart_format][0] += elapsed
+                totals[chart_format][1] += size
+                self.stdout.write(
+                    f"{chart_format:<8}{name:<10}{elapsed:>12.2f}{size:>10}{gzipped:>10}"
+                )
+
+        png_ms, png_bytes = totals["png"]
+        svg_ms, svg_bytes = totals["svg"]
+        self.stdout.write(
+            f"per detail page: png {png_ms:.1f} ms / {png_bytes} bytes, "
+            f"svg {svg_ms:.1f} ms / {svg_bytes} bytes "
+            f"({png_ms / max(svg_ms, 1e-9):.0f}x faster, "
+            f"{png_bytes / max(svg_bytes, 1):.1f}x smaller)"
+        )
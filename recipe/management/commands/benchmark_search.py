@@ -0,0 +1,84 @@
+import gzip
+import time
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from customuser.models import CustomUser
+from recipe.models import Recipe
+from recipe.search import rebuild_index
+from recipe.views import RecipeSearchView
+
+WORDS = "tomato basil garlic onion chicken rice bean lemon ginger curry".split()
+
+# Searches timed against the generated catalog: (label, search_mode, search)
+SEARCHES = [
+    ("show all", "#3", ""),
+    ("one word", "#2", "tomato"),
+    ("two words", "#2", "garlic lemon"),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the search page against a generated catalog, reporting queries "
+        "and response size. The catalog is rolled back afterwards. The cache is "
+        "cleared before every timed search, so run it against a scratch cache."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--recipes", type=int, default=10000)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.create_catalog(options["recipes"])
+            self.stdout.write(
+                f"{options['recipes']} recipes\n"
+                f"{'search':<12}{'queries':>8}{'ms':>10}{'bytes':>10}{'gzipped':>10}"
+            )
+            for label, search_mode, search in SEARCHES:
+                self.run_search(label, search_mode, search, options["repeat"])
+            transaction.set_rollback(True)
+
+    def create_catalog(self, count):
+        user = CustomUser.objects.create_user(username="benchmark-search-user")
+        Recipe.objects.bulk_create(
+            (
+                Recipe(
+                    title=f"Benchmark {i} {WORDS[i % 10]} {WORDS[i * 7 % 10]}",
+                    directions=" ".join(WORDS[(i + j) % 10] for j in range(20)),
+                    cooking_time=i % 90,
+                    star_count=i % 5 + 1,
+                    recipe_type="dinner",
+                    servings=2,
+                    user=user,
+                )
+                for i in range(count)
+            ),
+            batch_size=1000,
+        )
+        rebuild_index()
+
+    def run_search(self, label, search_mode, search, repeat):
+        request = RequestFactory().get(
+            "/search/", {"search_mode": search_mode, "search": search}
+        )
+        request.user = AnonymousUser()
+        view = RecipeSearchView.as_view()
+
+        elapsed = []
+        for _ in range(repeat):
+            # Time the queries rather than the results cached by the last run
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                response = view(request)
+                elapsed.append((time.perf_counter() - start) * 1000)
+        size = len(response.content)
+        self.stdout.write(
+            f"{label:<12}{len(queries):>8}{min(elapsed):>10.1f}{size:>10}"
+            f"{len(gzip.compress(response.content)):>10}"
+        )
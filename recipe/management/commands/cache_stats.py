@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from recipe.caching import cache_stats, reset_cache_stats
+
+
+class Command(BaseCommand):
+    help = "Show the hit and miss counts of the recipe page data caches"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reset", action="store_true", help="Set the counts back to zero afterwards"
+        )
+
+    def handle(self, *args, **options):
+        for name, stats in cache_stats().items():
+            rate = "-" if stats["hit_rate"] is None else f"{stats['hit_rate']:.1%}"
+            self.stdout.write(
+                f"{name}: {stats['hits']} hits, {stats['misses']} misses ({rate})"
+            )
+        if options["reset"]:
+            reset_cache_stats()
+            self.stdout.write("Counts reset")
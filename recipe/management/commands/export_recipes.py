@@ -0,0 +1,72 @@
+import os
+import time
+from django.core.management.base import BaseCommand, CommandError
+from recipe.exporter import (
+    EXPORT_CHUNK_SIZE,
+    EXPORT_FORMATS,
+    ImageCopier,
+    export_records,
+)
+from recipe.models import Recipe
+
+
+class Command(BaseCommand):
+    help = (
+        "Export recipes and their ingredient lines as JSON Lines or CSV, in the "
+        "layout read by import_recipes"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Output file, or - for standard output")
+        parser.add_argument(
+            "--format",
+            choices=list(EXPORT_FORMATS),
+            help="By default taken from the file extension, else jsonl",
+        )
+        parser.add_argument("--user", help="Only export this user's recipes")
+        parser.add_argument(
+            "--images",
+            choices=["none", "files"],
+            default="none",
+            help="files: copy pictures next to the output under images/",
+        )
+        parser.add_argument("--chunk-size", type=int, default=EXPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        export_format = options["format"]
+        if export_format is None:
+            export_format = "csv" if path.lower().endswith(".csv") else "jsonl"
+        if options["chunk_size"] < 1:
+            raise CommandError("--chunk-size must be at least 1")
+        if options["images"] == "files" and path == "-":
+            raise CommandError("--images files needs an output file")
+
+        queryset = Recipe.objects.all()
+        if options["user"]:
+            queryset = queryset.filter(user__username=options["user"])
+        image = None
+        if options["images"] == "files":
+            image = ImageCopier(os.path.dirname(os.path.abspath(path)))
+        lines, _ = EXPORT_FORMATS[export_format]
+
+        start = time.perf_counter()
+        count = 0
+
+        def counted(records):
+            nonlocal count
+            for record in records:
+                count += 1
+                yield record
+
+        records = counted(
+            export_records(queryset, image=image, chunk_size=options["chunk_size"])
+        )
+        if path == "-":
+            for line in lines(records):
+                self.stdout.write(line, ending="")
+            return
+        with open(path, "w", newline="", encoding="utf-8") as file:
+            file.writelines(lines(records))
+        elapsed = time.perf_counter() - start
+        self.stdout.write(f"Exported {count} recipes to {path} in {elapsed:.1f} s")
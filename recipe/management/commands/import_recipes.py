@@ -0,0 +1,78 @@
+import os
+import time
+from django.core.management.base import BaseCommand, CommandError
+from customuser.models import CustomUser
+from recipe.importer import (
+    IMPORT_BATCH_SIZE,
+    RecipeImporter,
+    read_checkpoint,
+    read_records,
+    write_checkpoint,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Import recipes from a JSON Lines or CSV file (see recipe.importer for "
+        "the record layout). Progress is saved after every batch; --resume "
+        "carries on after the last saved batch."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="A .jsonl or .csv file")
+        parser.add_argument("--user", required=True, help="Username owning the recipes")
+        parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+        parser.add_argument(
+            "--image-root",
+            help="Directory image paths are relative to, by default the file's",
+        )
+        parser.add_argument(
+            "--checkpoint", help="Progress file, by default <path>.progress"
+        )
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            help="Skip the records imported by an earlier run of the same file",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        if not os.path.isfile(path):
+            raise CommandError(f"No such file: {path}")
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be at least 1")
+        try:
+            user = CustomUser.objects.get(username=options["user"])
+        except CustomUser.DoesNotExist:
+            raise CommandError(f"No user called {options['user']!r}")
+
+        checkpoint = options["checkpoint"] or f"{path}.progress"
+        start_after = read_checkpoint(checkpoint) if options["resume"] else 0
+        if start_after:
+            self.stdout.write(f"Resuming after record {start_after}")
+        importer = RecipeImporter(
+            user,
+            batch_size=options["batch_size"],
+            image_root=options["image_root"] or os.path.dirname(os.path.abspath(path)),
+            on_error=lambda number, reason: self.stderr.write(
+                f"record {number}: {reason}"
+            ),
+        )
+        start = time.perf_counter()
+
+        def on_batch(number):
+            write_checkpoint(checkpoint, number)
+            elapsed = time.perf_counter() - start
+            self.stdout.write(
+                f"record {number}: {importer.imported} imported, "
+                f"{importer.skipped} skipped, {importer.rejected} rejected "
+                f"({importer.imported / elapsed:.0f} recipes/s)"
+            )
+
+        importer.run(read_records(path), start_after=start_after, on_batch=on_batch)
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f"Imported {importer.imported} recipes and {importer.lines} ingredient "
+            f"lines in {elapsed:.1f} s ({importer.imported / elapsed:.0f} recipes/s); "
+            f"{importer.skipped} already present, {importer.rejected} rejected"
+        )
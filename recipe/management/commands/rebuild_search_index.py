@@ -0,0 +1,20 @@
+import time
+from django.core.management.base import BaseCommand
+from recipe.search import rebuild_index, search_backend
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full text recipe search index from the database"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        backend = search_backend()
+        if backend is None:
+            self.stdout.write("This database has no search index; searches use icontains")
+            return
+        start = time.perf_counter()
+        count = rebuild_index(batch_size=options["batch_size"])
+        elapsed = time.perf_counter() - start
+        self.stdout.write(f"Indexed {count} recipes ({backend}) in {elapsed:.2f} s")
@@ -0,0 +1,73 @@
+import json
+import os
+import subprocess
+import sys
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Only the detail and search views need these; importing them at boot costs
+# every worker well over a second before it can serve a request
+HEAVY_MODULES = ("pandas", "matplotlib", "numpy")
+
+# Runs in a fresh interpreter: time the WSGI entry point, then the URLconf
+# (which imports every view) as a worker does on its first request
+STARTUP_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import recipe_project.wsgi
+wsgi = time.perf_counter()
+from django.conf import settings
+__import__(settings.ROOT_URLCONF)
+urls = time.perf_counter()
+print(json.dumps({
+    "wsgi_ms": (wsgi - start) * 1000,
+    "urls_ms": (urls - wsgi) * 1000,
+    "heavy": sorted(m for m in %r if m in sys.modules),
+}))
+"""
+
+
+def measure_startup():
+    env = dict(os.environ)
+    env.setdefault("DJANGO_SETTINGS_MODULE", "recipe_project.settings")
+    result = subprocess.run(
+        [sys.executable, "-c", STARTUP_SCRIPT % (HEAVY_MODULES,)],
+        cwd=settings.BASE_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+class Command(BaseCommand):
+    help = "Report how long a fresh worker takes to import the WSGI app and URLconf"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument(
+            "--max-ms",
+            type=float,
+            help="Fail if the best start up time (wsgi + urls) is above this",
+        )
+
+    def handle(self, *args, **options):
+        runs = [measure_startup() for _ in range(options["repeat"])]
+        best = min(runs, key=lambda run: run["wsgi_ms"] + run["urls_ms"])
+        total = best["wsgi_ms"] + best["urls_ms"]
+
+        self.stdout.write(
+            f"best of {len(runs)}: wsgi {best['wsgi_ms']:.1f} ms, "
+            f"urls {best['urls_ms']:.1f} ms, total {total:.1f} ms"
+        )
+        heavy = sorted({module for run in runs for module in run["heavy"]})
+        if heavy:
+            self.stdout.write(f"heavy modules loaded at start up: {', '.join(heavy)}")
+        else:
+            self.stdout.write("heavy modules loaded at start up: none")
+
+        if options["max_ms"] is not None and total > options["max_ms"]:
+            raise CommandError(
+                f"Start up took {total:.1f} ms, over the {options['max_ms']:.1f} ms budget"
+            )
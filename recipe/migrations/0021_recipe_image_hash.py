@@ -0,0 +1,114 @@
+import base64
+import binascii
+import hashlib
+import re
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import migrations, models
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+# Frozen copies of the recipe.images helpers as they were when this migration
+# was written, so later changes to that module leave it alone
+IMAGE_ROOT = "recipe/images"
+IMAGE_VARIANTS = {
+    "full": (1600, 1600),
+    "card": (800, 600),
+    "detail": (400, 400),
+    "row": (200, 200),
+}
+DATA_URL_PREFIX_RE = re.compile(r"^data:image/[a-zA-Z0-9.+-]+;base64,")
+
+
+def decode_base64_image(value):
+    value = DATA_URL_PREFIX_RE.sub("", value.strip())
+    try:
+        return base64.b64decode(value, validate=True)
+    except (binascii.Error, ValueError):
+        raise ValueError("Image data is not valid base64.")
+
+
+def open_image(data):
+    try:
+        image = Image.open(BytesIO(data))
+        image.load()
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError):
+        raise ValueError("Upload a valid image.")
+    return ImageOps.exif_transpose(image).convert("RGB")
+
+
+def image_path(digest, variant):
+    return f"{IMAGE_ROOT}/{digest[:2]}/{digest}/{variant}.jpg"
+
+
+def render_variant(image, size):
+    thumbnail = image.copy()
+    thumbnail.thumbnail(size, Image.LANCZOS)
+    buffer = BytesIO()
+    thumbnail.save(buffer, format="JPEG", quality=85, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def store_image(data):
+    digest = hashlib.sha256(data).hexdigest()
+    missing = [
+        variant
+        for variant in IMAGE_VARIANTS
+        if not default_storage.exists(image_path(digest, variant))
+    ]
+    if missing:
+        image = open_image(data)
+        for variant in missing:
+            content = ContentFile(render_variant(image, IMAGE_VARIANTS[variant]))
+            default_storage.save(image_path(digest, variant), content)
+    return digest
+
+
+def move_pics_to_image_store(apps, schema_editor):
+    # Decode every base64 pic into the image store and keep only its hash
+    Recipe = apps.get_model("recipe", "Recipe")
+    recipes = Recipe.objects.exclude(pic="").only("id", "pic")
+    for recipe in recipes.iterator(chunk_size=100):
+        try:
+            digest = store_image(decode_base64_image(recipe.pic))
+        except ValueError:
+            # Placeholders and broken uploads fall back to the default picture
+            continue
+        Recipe.objects.filter(pk=recipe.pk).update(image_hash=digest)
+
+
+def move_images_back_to_pics(apps, schema_editor):
+    Recipe = apps.get_model("recipe", "Recipe")
+    recipes = Recipe.objects.exclude(image_hash="").only("id", "image_hash")
+    for recipe in recipes.iterator(chunk_size=100):
+        with default_storage.open(image_path(recipe.image_hash, "full")) as image:
+            pic = base64.b64encode(image.read()).decode("utf-8")
+        Recipe.objects.filter(pk=recipe.pk).update(pic=pic)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0020_recipe_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.RunPython(move_pics_to_image_store, move_images_back_to_pics),
+        # Rolled back, pic comes back empty for the existing rows before the
+        # images are moved back into it
+        migrations.AlterField(
+            model_name='recipe',
+            name='pic',
+            field=models.TextField(default=''),
+        ),
+        migrations.RemoveField(
+            model_name='recipe',
+            name='pic',
+        ),
+    ]
@@ -0,0 +1,24 @@
+from django.db import migrations
+
+from recipe.search import drop_search_table, rebuild_index
+
+
+def build_search_index(apps, schema_editor):
+    # Creates the FTS5 / tsvector table for this database and fills it
+    rebuild_index(model=apps.get_model("recipe", "Recipe"))
+
+
+def remove_search_index(apps, schema_editor):
+    drop_search_table()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0021_recipe_image_hash'),
+        ('recipeingredientintermediary', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(build_search_index, remove_search_index),
+    ]
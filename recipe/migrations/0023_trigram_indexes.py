@@ -0,0 +1,39 @@
+from django.db import migrations
+
+# Fuzzy search (recipe.fuzzy) uses pg_trgm on Postgres; other databases use
+# an in-process trigram index and need nothing here
+CREATE_TRIGRAM_INDEXES = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS recipe_title_trgm_idx "
+    "ON recipe_recipe USING GIN (title gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ingredient_name_trgm_idx "
+    "ON ingredient_ingredient USING GIN (name gin_trgm_ops)",
+]
+DROP_TRIGRAM_INDEXES = [
+    "DROP INDEX IF EXISTS recipe_title_trgm_idx",
+    "DROP INDEX IF EXISTS ingredient_name_trgm_idx",
+]
+
+
+def run_on_postgres(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor == "postgresql":
+            for statement in statements:
+                schema_editor.execute(statement)
+
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0022_recipe_search_index'),
+        ('ingredient', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_on_postgres(CREATE_TRIGRAM_INDEXES),
+            run_on_postgres(DROP_TRIGRAM_INDEXES),
+        ),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 4.2.3 on 2026-10-18 20:31
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from recipe.models import cost_per_serving_sql
+
+
+def fill_rollups(apps, schema_editor):
+    # Sum up every recipe's ingredient lines, one UPDATE for all recipes
+    Recipe = apps.get_model("recipe", "Recipe")
+    Link = apps.get_model("recipeingredientintermediary", "RecipeIngredientIntermediary")
+    links = Link.objects.filter(recipe=OuterRef("pk")).order_by().values("recipe")
+
+    def linked(aggregate, output_field):
+        total = Subquery(links.annotate(total=aggregate).values("total"))
+        return Coalesce(total, Value(0), output_field=output_field)
+
+    decimal = models.DecimalField(max_digits=12, decimal_places=2)
+    total_cost = linked(Sum("recipe_ingredient__cost"), decimal)
+    Recipe.objects.update(
+        ingredient_count=linked(Count("pk"), models.IntegerField()),
+        total_calories=linked(Sum("recipe_ingredient__calorie_content"), decimal),
+        total_grams=linked(Sum("recipe_ingredient__grams"), decimal),
+        total_cost=total_cost,
+        cost_per_serving=cost_per_serving_sql(total_cost),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0024_recipe_updated_at'),
+        ('recipeingredientintermediary', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='cost_per_serving',
+            field=models.DecimalField(decimal_places=2, editable=False, max_digits=12, null=True),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='ingredient_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='total_calories',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='total_cost',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='total_grams',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12),
+        ),
+        migrations.RunPython(fill_rollups, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['ingredient_count', 'id'], name='recipe_ingredient_count_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['total_calories', 'id'], name='recipe_calories_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['total_cost', 'id'], name='recipe_cost_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['cost_per_serving', 'id'], name='recipe_cost_per_serving_id_idx'),
+        ),
+    ]
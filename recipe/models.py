@@ -1,6 +1,11 @@
+from decimal import ROUND_HALF_UP, Decimal
 from django.db import models
+from django.db.models import Case, DecimalField, F, Func, When
+from django.db.models.functions import Round
 from django.shortcuts import reverse
+from django.utils import timezone
 from customuser.models import CustomUser
+from .images import image_url
 
 RECIPE_TYPES = (
     ("breakfast", "Breakfast"),
@@ -42,7 +47,62 @@ class Recipe(models.Model):
     small_desc = models.TextField(
         max_length=200, default="No Description has been added currently."
     )
-    pic = models.TextField()
+    # Content hash of the picture in the image store (see recipe.images)
+    image_hash = models.CharField(max_length=64, blank=True, default="")
+    # Last change to the recipe or its ingredient lines (see touch_recipes),
+    # used for the ETag and Last-Modified headers of the recipe pages
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    # Rollups of the ingredient lines, kept in step by recipe.rollups so that
+    # listings can sort and filter on them and pages need not add them up
+    ingredient_count = models.PositiveIntegerField(default=0, editable=False)
+    total_calories = models.DecimalField(
+        max_digits=12, decimal_places=2, default=0, editable=False
+    )
+    total_grams = models.DecimalField(
+        max_digits=12, decimal_places=2, default=0, editable=False
+    )
+    total_cost = models.DecimalField(
+        max_digits=12, decimal_places=2, default=0, editable=False
+    )
+    # total_cost / servings, empty without servings
+    cost_per_serving = models.DecimalField(
+        max_digits=12, decimal_places=2, null=True, editable=False
+    )
+
+    class Meta:
+        indexes = [
+            # Keyset pagination orderings (see recipe.pagination.KEYSET_SORTS)
+            models.Index(fields=["user", "id"], name="recipe_user_id_idx"),
+            models.Index(fields=["star_count", "id"], name="recipe_star_count_id_idx"),
+            models.Index(fields=["cooking_time", "id"], name="recipe_cooking_time_id_idx"),
+            models.Index(fields=["user", "updated_at"], name="recipe_user_updated_at_idx"),
+            models.Index(
+                fields=["ingredient_count", "id"], name="recipe_ingredient_count_id_idx"
+            ),
+            models.Index(fields=["total_calories", "id"], name="recipe_calories_id_idx"),
+            models.Index(fields=["total_cost", "id"], name="recipe_cost_id_idx"),
+            models.Index(
+                fields=["cost_per_serving", "id"], name="recipe_cost_per_serving_id_idx"
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            self.cost_per_serving = per_serving(self.total_cost, self.servings)
+            return super().save(*args, **kwargs)
+        # The rollups are changed by SQL updates only, so an instance loaded
+        # before its ingredient lines changed never writes back stale totals
+        if kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in ROLLUP_FIELDS
+            ]
+        super().save(*args, **kwargs)
+        if "servings" in kwargs["update_fields"]:
+            Recipe.objects.filter(pk=self.pk).update(
+                cost_per_serving=cost_per_serving_sql()
+            )
 
     def __str__(self):
         return str(self.title)
@@ -50,9 +110,32 @@ class Recipe(models.Model):
     def get_absolute_url(self):
         return reverse("recipe:detail", kwargs={"pk": self.pk})
 
+    @property
+    def card_image_url(self):
+        return image_url(self.image_hash, "card")
+
+    @property
+    def detail_image_url(self):
+        return image_url(self.image_hash, "detail")
+
+    @property
+    def row_image_url(self):
+        return image_url(self.image_hash, "row")
+
+    def count_ingredients(self):
+        # Prefer the stored count, then an annotated count or the prefetched
+        # ingredients over a query
+        if "ingredient_count" not in self.get_deferred_fields():
+            return self.ingredient_count
+        if hasattr(self, "num_ingredients"):
+            return self.num_ingredients
+        if "recipe_ingredients" in getattr(self, "_prefetched_objects_cache", {}):
+            return len(self.recipe_ingredients.all())
+        return self.recipe_ingredients.count()
+
     def calculate_difficulty(self):
         try:
-            ingredients_len = len(self.recipe_ingredients.all())
+            ingredients_len = self.count_ingredients()
             if self.cooking_time < 10 and ingredients_len < 4:
                 return "Easy"
             elif self.cooking_time < 10 and ingredients_len > 4:
@@ -63,3 +146,47 @@ class Recipe(models.Model):
                 return "Hard"
         except:
             return "Missing cooking time or ingredients."
+
+
+def touch_recipes(recipe_ids):
+    # Mark recipes as changed when rows they show change, such as their
+    # ingredient lines; update() does not apply auto_now by itself
+    Recipe.objects.filter(pk__in=recipe_ids).update(updated_at=timezone.now())
+
+
+# Recipe columns summing up the ingredient lines (see recipe.rollups)
+ROLLUP_FIELDS = [
+    "ingredient_count",
+    "total_calories",
+    "total_grams",
+    "total_cost",
+    "cost_per_serving",
+]
+CENT = Decimal("0.01")
+
+
+def per_serving(total_cost, servings):
+    if not servings:
+        return None
+    # Rounded like SQL ROUND, halves away from zero
+    return (Decimal(total_cost) / servings).quantize(CENT, ROUND_HALF_UP)
+
+
+class Divide(Func):
+    # a / b as a decimal. SQLite may store a whole decimal as an integer and
+    # then divides integers, so there the division is done on reals.
+    arg_joiner = " / "
+    template = "(%(expressions)s)"
+    output_field = DecimalField(max_digits=12, decimal_places=2)
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, arg_joiner=" * 1.0 / ", **extra_context)
+
+
+def cost_per_serving_sql(total_cost=F("total_cost")):
+    # per_serving in SQL
+    return Case(
+        When(servings__gt=0, then=Round(Divide(total_cost, F("servings")), 2)),
+        default=None,
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
@@ -0,0 +1,183 @@
+import base64
+import binascii
+import json
+from decimal import Decimal, InvalidOperation
+from django.conf import settings
+from django.db.models import F, Q
+
+# Sort options for keyset pagination: name -> (sort field, descending).
+# Every ordering ends with the primary key so the cursor is always unique.
+KEYSET_SORTS = {
+    "id": (None, False),
+    "star_count": ("star_count", True),
+    "cooking_time": ("cooking_time", False),
+    # Ingredient rollups (see recipe.rollups)
+    "ingredient_count": ("ingredient_count", False),
+    "total_calories": ("total_calories", False),
+    "total_cost": ("total_cost", False),
+    "cost_per_serving": ("cost_per_serving", False),
+}
+
+# Search results default to relevance, the search_rank annotation of
+# recipe.search.search_recipes
+SEARCH_SORTS = {"rank": ("search_rank", False), **KEYSET_SORTS}
+
+
+def encode_cursor(value, pk, direction):
+    # Decimal sort values travel as strings to keep their exact value
+    if isinstance(value, Decimal):
+        value = str(value)
+    payload = json.dumps({"v": value, "pk": pk, "d": direction}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    # Returns (value, pk, direction) or None for a missing or tampered cursor
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        value, pk, direction = payload["v"], payload["pk"], payload["d"]
+    except (binascii.Error, UnicodeError, ValueError, TypeError, KeyError):
+        return None
+    if not isinstance(pk, int) or direction not in ("next", "prev"):
+        return None
+    if isinstance(value, str):
+        try:
+            value = Decimal(value)
+        except InvalidOperation:
+            return None
+        if not value.is_finite():
+            return None
+    elif value is not None and not isinstance(value, int):
+        return None
+    return value, pk, direction
+
+
+class KeysetPage:
+    is_keyset = True
+
+    def __init__(self, object_list, sort, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.sort = sort
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f"<KeysetPage sort={self.sort} size={len(self.object_list)}>"
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """
+    Cursor based paginator: each page is a single ``WHERE (key) > (cursor)
+    ORDER BY key LIMIT n`` query, so deep pages cost the same as the first
+    one and no COUNT(*) is needed.
+    """
+
+    def __init__(self, queryset, per_page, sort="id", sorts=KEYSET_SORTS):
+        # Unknown sorts fall back to the first one in ``sorts``
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.sort = sort if sort in sorts else next(iter(sorts))
+        self.field, self.descending = sorts[self.sort]
+
+    def ordering(self, descending):
+        # Ascending keeps NULLs first and descending keeps them last, so walking
+        # backwards is exactly the reverse of walking forwards
+        if self.field is None:
+            return ["-pk" if descending else "pk"]
+        if descending:
+            return [F(self.field).desc(nulls_last=True), "-pk"]
+        return [F(self.field).asc(nulls_first=True), "pk"]
+
+    def after(self, value, pk, descending):
+        # Rows strictly after (value, pk) in the given ordering
+        if self.field is None:
+            return Q(pk__lt=pk) if descending else Q(pk__gt=pk)
+
+        field = self.field
+        if descending:
+            if value is None:
+                return Q(**{f"{field}__isnull": True, "pk__lt": pk})
+            return (
+                Q(**{f"{field}__lt": value})
+                | Q(**{field: value, "pk__lt": pk})
+                | Q(**{f"{field}__isnull": True})
+            )
+        if value is None:
+            return Q(**{f"{field}__isnull": True, "pk__gt": pk}) | Q(
+                **{f"{field}__isnull": False}
+            )
+        return Q(**{f"{field}__gt": value}) | Q(**{field: value, "pk__gt": pk})
+
+    def cursor_for(self, obj, direction):
+        value = getattr(obj, self.field) if self.field else None
+        return encode_cursor(value, obj.pk, direction)
+
+    def page(self, cursor=None):
+        position = decode_cursor(cursor)
+        backwards = position is not None and position[2] == "prev"
+        descending = self.descending != backwards
+
+        queryset = self.queryset.order_by(*self.ordering(descending))
+        if position is not None:
+            queryset = queryset.filter(self.after(position[0], position[1], descending))
+
+        # Fetch one extra row to find out whether there is another page
+        object_list = list(queryset[: self.per_page + 1])
+        has_more = len(object_list) > self.per_page
+        object_list = object_list[: self.per_page]
+
+        if backwards:
+            object_list.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, position is not None
+
+        page = KeysetPage(object_list, self.sort)
+        if object_list:
+            if has_next:
+                page.next_cursor = self.cursor_for(object_list[-1], "next")
+            if has_previous:
+                page.previous_cursor = self.cursor_for(object_list[0], "prev")
+        return page
+
+
+class KeysetPaginationMixin:
+    # ListView mixin: cursor pagination by default, ?page=N offset pagination
+    # when settings.RECIPE_PAGINATION is "offset"
+    cursor_kwarg = "cursor"
+    sort_kwarg = "sort"
+
+    def get_sort(self):
+        sort = self.request.GET.get(self.sort_kwarg)
+        return sort if sort in KEYSET_SORTS else "id"
+
+    def paginate_queryset(self, queryset, page_size):
+        if settings.RECIPE_PAGINATION == "offset":
+            # Bad or out of range page numbers fall back instead of raising 404
+            paginator = self.get_paginator(queryset, page_size)
+            page_obj = paginator.get_page(self.request.GET.get(self.page_kwarg))
+        else:
+            paginator = KeysetPaginator(queryset, page_size, self.get_sort())
+            page_obj = paginator.page(self.request.GET.get(self.cursor_kwarg))
+        return (paginator, page_obj, page_obj.object_list, page_obj.has_other_pages())
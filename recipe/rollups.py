@@ -0,0 +1,90 @@
+from decimal import Decimal
+from django.db.models import (
+    Count,
+    DecimalField,
+    F,
+    IntegerField,
+    OuterRef,
+    Subquery,
+    Sum,
+    Value,
+)
+from django.db.models.functions import Coalesce
+from recipeingredientintermediary.models import RecipeIngredientIntermediary
+from .models import Recipe, cost_per_serving_sql, per_serving
+
+# Recipe.ingredient_count, total_calories, total_grams, total_cost and
+# cost_per_serving follow the recipe's ingredient lines. Lines added to a
+# recipe are added onto its totals in one UPDATE; removed or edited lines
+# make the recipe's totals be summed again from its remaining lines.
+# recipe.signals covers saves, deletes and m2m changes; bulk writers call
+# add_lines_to_rollups themselves (or fill the totals in before inserting
+# the recipe, as the importer does).
+
+# Recipe total -> RecipeIngredient column it sums
+ROLLUP_TOTALS = {
+    "total_calories": "calorie_content",
+    "total_grams": "grams",
+    "total_cost": "cost",
+}
+
+
+def value(line, field):
+    # Lines are RecipeIngredient instances or dicts of their fields
+    return line[field] if isinstance(line, dict) else getattr(line, field)
+
+
+def line_totals(lines):
+    # ingredient_count and ROLLUP_TOTALS of ``lines``
+    lines = list(lines)
+    totals = {"ingredient_count": len(lines)}
+    for total, field in ROLLUP_TOTALS.items():
+        totals[total] = sum((Decimal(value(line, field)) for line in lines), Decimal(0))
+    return totals
+
+
+def rollup_fields(lines, servings):
+    # Recipe field values for a new recipe with ``lines``
+    totals = line_totals(lines)
+    totals["cost_per_serving"] = per_serving(totals["total_cost"], servings)
+    return totals
+
+
+def add_lines_to_rollups(recipe_id, lines, sign=1):
+    """
+    Add ``lines`` onto the totals of one recipe, or take them off with
+    ``sign=-1``, in a single UPDATE.
+    """
+    totals = line_totals(lines)
+    if not totals["ingredient_count"]:
+        return
+    changes = {field: F(field) + sign * amount for field, amount in totals.items()}
+    # Worked out from the new total, whatever order the database sets columns in
+    changes["cost_per_serving"] = cost_per_serving_sql(changes["total_cost"])
+    Recipe.objects.filter(pk=recipe_id).update(**changes)
+
+
+def recompute_rollups(recipe_ids):
+    # Sum the totals of ``recipe_ids`` again from their lines, in one UPDATE
+    links = RecipeIngredientIntermediary.objects.filter(recipe=OuterRef("pk"))
+
+    def linked(aggregate, output_field):
+        return Coalesce(
+            Subquery(
+                links.order_by()
+                .values("recipe")
+                .annotate(total=aggregate)
+                .values("total")
+            ),
+            Value(0),
+            output_field=output_field,
+        )
+
+    decimal = DecimalField(max_digits=12, decimal_places=2)
+    changes = {
+        total: linked(Sum(f"recipe_ingredient__{field}"), decimal)
+        for total, field in ROLLUP_TOTALS.items()
+    }
+    changes["ingredient_count"] = linked(Count("pk"), IntegerField())
+    changes["cost_per_serving"] = cost_per_serving_sql(changes["total_cost"])
+    Recipe.objects.filter(pk__in=recipe_ids).update(**changes)
@@ -0,0 +1,86 @@
+from decimal import ROUND_HALF_UP, Decimal
+from .models import CENT
+from .rollups import rollup_fields
+from .utils import INGREDIENT_LINE_FIELDS
+
+# A recipe recomputed for another number of servings, as the detail page and
+# the API show it with ?servings=N. Every ingredient line is multiplied by
+# N / recipe.servings in one numpy pass over the (prefetched) lines; the
+# totals are then summed from the scaled lines, so they add up to what the
+# page lists.
+MAX_SERVINGS = 1000
+
+# Line fields that grow with the number of servings
+SCALED_FIELDS = ("amount", "grams", "calorie_content", "cost")
+
+
+class ScalingError(ValueError):
+    pass
+
+
+def parse_servings(value):
+    # The servings asked for in a query string, None when not given
+    if value in (None, ""):
+        return None
+    try:
+        servings = int(value)
+    except ValueError:
+        raise ScalingError("servings must be a whole number")
+    if not 1 <= servings <= MAX_SERVINGS:
+        raise ScalingError(f"servings must be between 1 and {MAX_SERVINGS}")
+    return servings
+
+
+def scale_lines(items, servings, from_servings):
+    """
+    The RecipeIngredient ``items`` as dicts with "id", "ingredient" (the
+    name) and INGREDIENT_LINE_FIELDS, with SCALED_FIELDS multiplied by
+    ``servings / from_servings``. The values are scaled as whole hundredths,
+    so they round half up to the cent exactly, like per_serving.
+    """
+    import numpy as np  # loaded on first use to keep worker start up light
+
+    items = list(items)
+    width = len(SCALED_FIELDS)
+    cents = np.fromiter(
+        (int(getattr(item, field) * 100) for item in items for field in SCALED_FIELDS),
+        np.int64,
+        len(items) * width,
+    ).reshape(len(items), width)
+    scaled = ((2 * servings * cents + from_servings) // (2 * from_servings)).tolist()
+
+    lines = []
+    for item, row in zip(items, scaled):
+        line = {"id": item.pk, "ingredient": item.ingredient.name}
+        line.update((field, getattr(item, field)) for field in INGREDIENT_LINE_FIELDS)
+        for field, value in zip(SCALED_FIELDS, row):
+            line[field] = Decimal(value).scaleb(-2)
+        lines.append(line)
+    return lines
+
+
+def scaled_rows(lines):
+    # (id, name, calories, grams, cost) of scaled lines, as get_ingredient_rows
+    fields = ("id", "ingredient", "calorie_content", "grams", "cost")
+    return [tuple(line[field] for field in fields) for line in lines]
+
+
+def scale_recipe(recipe, servings):
+    """
+    ``recipe`` made for ``servings``: a dict of "servings", "yield_amount",
+    the scaled ingredient "lines" and their totals (see recipe.rollups).
+    """
+    if not recipe.servings:
+        raise ScalingError("This recipe has no servings to scale from")
+    items = sorted(recipe.recipe_ingredients.all(), key=lambda item: item.pk)
+    lines = scale_lines(items, servings, recipe.servings)
+    yield_amount = recipe.yield_amount
+    if yield_amount is not None:
+        yield_amount = Decimal(yield_amount * servings) / recipe.servings
+        yield_amount = yield_amount.quantize(CENT, ROUND_HALF_UP)
+    return {
+        "servings": servings,
+        "yield_amount": yield_amount,
+        "lines": lines,
+        **rollup_fields(lines, servings),
+    }
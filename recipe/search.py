@@ -0,0 +1,234 @@
+import re
+from django.db import connection, transaction
+from django.db.models import CharField, Q, Value
+from django.db.models.functions import Cast, Concat, StrIndex
+from .models import Recipe
+
+# Full text index over each recipe's title, description, directions and
+# ingredient names, one row per recipe in the "recipe_search" table:
+#   sqlite:     FTS5 virtual table, rowid = recipe id, ranked with bm25()
+#   postgresql: weighted tsvector per recipe with a GIN index, ranked with ts_rank()
+# Any other database falls back to unranked icontains filters.
+SEARCH_TABLE = "recipe_search"
+
+# Most relevant matches considered per search; pages are cut from these
+SEARCH_RESULT_LIMIT = 1000
+
+# Relative weight of each indexed column (title, description, directions,
+# ingredient names) in the sqlite bm25 ranking
+FTS5_WEIGHTS = (10.0, 3.0, 1.0, 5.0)
+
+TOKEN_RE = re.compile(r"\w+")
+
+SQLITE_CREATE = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+    "title, small_desc, directions, ingredients, "
+    "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')",
+]
+POSTGRES_CREATE = [
+    f"CREATE TABLE IF NOT EXISTS {SEARCH_TABLE} ("
+    "recipe_id integer PRIMARY KEY REFERENCES recipe_recipe (id) ON DELETE CASCADE, "
+    "document tsvector NOT NULL)",
+    f"CREATE INDEX IF NOT EXISTS {SEARCH_TABLE}_document_idx "
+    f"ON {SEARCH_TABLE} USING GIN (document)",
+]
+
+# title is weighted A, ingredient names B, description C and directions D
+POSTGRES_DOCUMENT = (
+    "setweight(to_tsvector('english', %s), 'A') || "
+    "setweight(to_tsvector('english', %s), 'C') || "
+    "setweight(to_tsvector('english', %s), 'D') || "
+    "setweight(to_tsvector('english', %s), 'B')"
+)
+
+
+def search_backend():
+    if connection.vendor in ("sqlite", "postgresql"):
+        return connection.vendor
+    return None
+
+
+def create_search_table():
+    statements = {"sqlite": SQLITE_CREATE, "postgresql": POSTGRES_CREATE}
+    with connection.cursor() as cursor:
+        for statement in statements.get(search_backend(), []):
+            cursor.execute(statement)
+
+
+def drop_search_table():
+    if search_backend():
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {SEARCH_TABLE}")
+
+
+def search_terms(query):
+    # Lower cased word tokens; anything else in the query is ignored, which
+    # also keeps the FTS5 and tsquery syntax out of user input
+    return TOKEN_RE.findall(query.lower())
+
+
+def recipe_documents(recipe_ids, model=Recipe):
+    # recipe id -> (title, small_desc, directions, ingredient names)
+    documents = {
+        pk: [title, small_desc, directions, []]
+        for pk, title, small_desc, directions in model.objects.filter(
+            pk__in=recipe_ids
+        ).values_list("pk", "title", "small_desc", "directions")
+    }
+    names = model.objects.filter(
+        pk__in=documents, recipe_ingredients__isnull=False
+    ).values_list("pk", "recipe_ingredients__ingredient__name")
+    for pk, name in names:
+        documents[pk][3].append(name)
+    return {
+        pk: (title, small_desc or "", directions or "", " ".join(ingredients))
+        for pk, (title, small_desc, directions, ingredients) in documents.items()
+    }
+
+
+def index_recipes(recipe_ids, model=Recipe):
+    """
+    Write the search rows of the given recipes, replacing any existing ones.
+    Recipes that no longer exist are dropped from the index.
+    """
+    backend = search_backend()
+    recipe_ids = list(recipe_ids)
+    if backend is None or not recipe_ids:
+        return
+    documents = recipe_documents(recipe_ids, model)
+    # One transaction for the batch rather than a commit per row
+    with transaction.atomic(), connection.cursor() as cursor:
+        if backend == "sqlite":
+            placeholders = ", ".join(["%s"] * len(recipe_ids))
+            cursor.execute(
+                f"DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({placeholders})",
+                recipe_ids,
+            )
+            cursor.executemany(
+                f"INSERT INTO {SEARCH_TABLE} "
+                "(rowid, title, small_desc, directions, ingredients) "
+                "VALUES (%s, %s, %s, %s, %s)",
+                [(pk, *document) for pk, document in documents.items()],
+            )
+        else:
+            cursor.executemany(
+                f"INSERT INTO {SEARCH_TABLE} (recipe_id, document) "
+                f"VALUES (%s, {POSTGRES_DOCUMENT}) "
+                "ON CONFLICT (recipe_id) DO UPDATE SET document = EXCLUDED.document",
+                [(pk, *document) for pk, document in documents.items()],
+            )
+            removed = [pk for pk in recipe_ids if pk not in documents]
+            if removed:
+                cursor.execute(
+                    f"DELETE FROM {SEARCH_TABLE} WHERE recipe_id = ANY(%s)", [removed]
+                )
+
+
+def remove_recipes(recipe_ids):
+    backend = search_backend()
+    recipe_ids = list(recipe_ids)
+    if backend is None or not recipe_ids:
+        return
+    column = "rowid" if backend == "sqlite" else "recipe_id"
+    placeholders = ", ".join(["%s"] * len(recipe_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {SEARCH_TABLE} WHERE {column} IN ({placeholders})", recipe_ids
+        )
+
+
+def rebuild_index(batch_size=500, model=Recipe):
+    # Reindex every recipe, e.g. after bulk_create which skips the signals.
+    # Migrations pass their historical Recipe model. The rows are replaced in
+    # one transaction, so searches meanwhile keep seeing the old ones.
+    create_search_table()
+    count = 0
+    recipe_ids = model.objects.order_by("pk").values_list("pk", flat=True)
+    batch = []
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+        for pk in recipe_ids.iterator(chunk_size=batch_size):
+            batch.append(pk)
+            if len(batch) == batch_size:
+                index_recipes(batch, model)
+                count += len(batch)
+                batch = []
+        index_recipes(batch, model)
+    return count + len(batch)
+
+
+def restrict_to(queryset, column, field="pk"):
+    # " AND column IN (...)" keeping the rows whose column is the ``field`` of
+    # a recipe in ``queryset``, so a search limit applies to those recipes
+    # rather than to all of them
+    if queryset is None or not queryset.query.where:
+        return "", []
+    sql, params = queryset.order_by().values(field).query.sql_with_params()
+    return f" AND {column} IN ({sql})", list(params)
+
+
+def ranked_recipe_ids(terms, queryset=None, limit=SEARCH_RESULT_LIMIT):
+    # Ids of the best matching recipes of ``queryset``, most relevant first.
+    # Every term must match, as a word prefix so that partially typed words
+    # still find results
+    backend = search_backend()
+    with connection.cursor() as cursor:
+        if backend == "sqlite":
+            match = " ".join(f'"{term}"*' for term in terms)
+            weights = ", ".join(str(weight) for weight in FTS5_WEIGHTS)
+            restriction, params = restrict_to(queryset, "rowid")
+            cursor.execute(
+                f"SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s"
+                f"{restriction} ORDER BY bm25({SEARCH_TABLE}, {weights}) LIMIT %s",
+                [match, *params, limit],
+            )
+        else:
+            tsquery = " & ".join(f"{term}:*" for term in terms)
+            restriction, params = restrict_to(queryset, "recipe_id")
+            cursor.execute(
+                f"SELECT recipe_id FROM {SEARCH_TABLE}, "
+                f"to_tsquery('english', %s) query WHERE document @@ query{restriction} "
+                "ORDER BY ts_rank(document, query) DESC, recipe_id LIMIT %s",
+                [tsquery, *params, limit],
+            )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def search_recipes(query, queryset=None):
+    """
+    Recipes from ``queryset`` matching every word of ``query`` in their title,
+    description, directions or ingredient names. On the indexed backends each
+    recipe is annotated with ``search_rank``, lower for more relevant matches.
+    The SEARCH_RESULT_LIMIT best matches are taken among ``queryset`` itself.
+    """
+    queryset = Recipe.objects.all() if queryset is None else queryset
+    terms = search_terms(query)
+    if not terms or queryset.query.is_empty():
+        return queryset.none()
+
+    if search_backend() is None:
+        condition = Q()
+        for term in terms:
+            condition &= (
+                Q(title__icontains=term)
+                | Q(small_desc__icontains=term)
+                | Q(directions__icontains=term)
+                | Q(recipe_ingredients__ingredient__name__icontains=term)
+            )
+        return queryset.filter(condition).distinct()
+
+    return rank_by_ids(queryset, ranked_recipe_ids(terms, queryset))
+
+
+def rank_by_ids(queryset, recipe_ids):
+    # Keep the recipes in recipe_ids, annotated with search_rank in that order.
+    # Rank by the recipe's offset in ",id1,id2,...": a single expression,
+    # where a CASE with a branch per result is slow to build and evaluate
+    ranking = "," + ",".join(str(pk) for pk in recipe_ids) + ","
+    marker = Concat(Value(","), Cast("pk", CharField()), Value(","))
+    return (
+        queryset.filter(pk__in=recipe_ids)
+        .annotate(search_rank=StrIndex(Value(ranking), marker))
+        .order_by("search_rank")
+    )
@@ -0,0 +1,147 @@
+from collections import defaultdict
+from decimal import ROUND_HALF_UP, Decimal
+from django.db.models import F
+from recipeingredient.units import density_for, normalize
+from recipeingredientintermediary.models import RecipeIngredientIntermediary
+from .models import CENT, Recipe
+from .scaling import ScalingError, parse_servings
+
+# A combined shopping list for several recipes, each made for its own number
+# of servings or for one given in the request. The recipes are read in one
+# query and all their ingredient lines in a second one, however many recipes
+# there are. Amounts are normalized (see recipeingredient.units.normalize),
+# so cups and tablespoons of the same ingredient add up, and are merged per
+# ingredient, supplier and unit.
+MAX_SHOPPING_RECIPES = 50
+
+# Line value -> lookup from the recipe's link to the line
+LINE_VALUES = {
+    "ingredient_id": "recipe_ingredient__ingredient_id",
+    "name": "recipe_ingredient__ingredient__name",
+    "normalized_name": "recipe_ingredient__ingredient__normalized_name",
+    "density": "recipe_ingredient__ingredient__density",
+    "line_amount": "recipe_ingredient__amount",
+    "line_unit": "recipe_ingredient__amount_type",
+    "line_supplier": "recipe_ingredient__supplier",
+    "line_calories": "recipe_ingredient__calorie_content",
+    "line_grams": "recipe_ingredient__grams",
+    "line_cost": "recipe_ingredient__cost",
+}
+
+# Shopping list total -> line value it sums, besides the amount
+LINE_TOTALS = {"calories": "line_calories", "grams": "line_grams", "cost": "line_cost"}
+
+
+class ShoppingListError(ValueError):
+    pass
+
+
+def parse_recipe_list(value):
+    """
+    Recipes as given in a query string, "1,2:6,3" for recipes 1 and 3 as
+    they are and recipe 2 made for 6 servings, as a list of (id, servings)
+    with None for the recipe's own servings.
+    """
+    entries = []
+    for part in value.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        pk, _, servings = part.partition(":")
+        try:
+            pk = int(pk)
+        except ValueError:
+            raise ShoppingListError(f"{part!r} is not a recipe id")
+        try:
+            entries.append((pk, parse_servings(servings)))
+        except ScalingError as e:
+            raise ShoppingListError(f"recipe {pk}: {e}")
+    if not entries:
+        raise ShoppingListError("Give the recipes to shop for")
+    if len(entries) > MAX_SHOPPING_RECIPES:
+        raise ShoppingListError(f"At most {MAX_SHOPPING_RECIPES} recipes at once")
+    return entries
+
+
+def round_cents(value):
+    return Decimal(value).quantize(CENT, ROUND_HALF_UP)
+
+
+def build_shopping_list(entries):
+    """
+    The shopping list for (recipe id, servings or None) ``entries``: the
+    recipes, the merged "items" with their amount, unit, calories, grams,
+    cost and the recipes needing them, and the "totals" overall and per
+    supplier. A recipe listed twice is bought for twice.
+    """
+    ids = {pk for pk, _ in entries}
+    recipes = Recipe.objects.filter(pk__in=ids).only("id", "title", "servings")
+    recipes = {recipe.pk: recipe for recipe in recipes}
+    missing = sorted(ids - recipes.keys())
+    if missing:
+        raise ShoppingListError(f"Unknown recipes: {', '.join(map(str, missing))}")
+
+    # How many times over each recipe's lines are bought
+    factors = defaultdict(Decimal)
+    for pk, servings in entries:
+        recipe = recipes[pk]
+        if servings is None:
+            factors[pk] += 1
+        elif not recipe.servings:
+            raise ShoppingListError(f"{recipe.title} has no servings to scale from")
+        else:
+            factors[pk] += Decimal(servings) / recipe.servings
+
+    lines = (
+        RecipeIngredientIntermediary.objects.filter(recipe_id__in=ids)
+        .order_by("pk")
+        .values("recipe_id", **{key: F(lookup) for key, lookup in LINE_VALUES.items()})
+    )
+    items = {}
+    for line in lines:
+        factor = factors[line["recipe_id"]]
+        density = density_for(line["normalized_name"], line["density"])
+        amount = line["line_amount"] * factor
+        amount, unit = normalize(amount, line["line_unit"], density)
+        key = (line["ingredient_id"], line["line_supplier"], unit)
+        item = items.get(key)
+        if item is None:
+            item = items[key] = {
+                "ingredient": line["name"],
+                "supplier": line["line_supplier"],
+                "unit": unit,
+                "amount": Decimal(0),
+                **{total: Decimal(0) for total in LINE_TOTALS},
+                "recipes": [],
+            }
+        item["amount"] += amount
+        for total, value in LINE_TOTALS.items():
+            item[total] += line[value] * factor
+        if line["recipe_id"] not in item["recipes"]:
+            item["recipes"].append(line["recipe_id"])
+
+    items = sorted(
+        items.values(),
+        key=lambda i: (i["ingredient"].casefold(), i["supplier"], i["unit"]),
+    )
+    totals = {total: Decimal(0) for total in LINE_TOTALS}
+    suppliers = defaultdict(Decimal)
+    for item in items:
+        for total in ["amount", *LINE_TOTALS]:
+            item[total] = round_cents(item[total])
+        # The totals add up the rounded items, as the list shows them
+        for total in totals:
+            totals[total] += item[total]
+        suppliers[item["supplier"]] += item["cost"]
+    return {
+        "recipes": [
+            {
+                "id": pk,
+                "title": recipes[pk].title,
+                "servings": servings or recipes[pk].servings,
+            }
+            for pk, servings in entries
+        ],
+        "items": items,
+        "totals": {**totals, "suppliers": dict(sorted(suppliers.items()))},
+    }
@@ -0,0 +1,129 @@
+from functools import partial
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from ingredient.models import Ingredient
+from recipeingredient.models import RecipeIngredient
+from recipeingredientintermediary.models import RecipeIngredientIntermediary
+from .autocomplete import autocomplete_index
+from .caching import invalidate_recipes
+from .fuzzy import trigram_index
+from .models import Recipe, touch_recipes
+from .rollups import add_lines_to_rollups, recompute_rollups
+from .search import index_recipes, remove_recipes
+
+# Keep the full text search index (recipe.search) in step with the recipes,
+# their ingredient links and ingredient names. bulk_create and queryset
+# update() skip these; run "manage.py rebuild_search_index" after using them.
+# The in-memory autocomplete and fuzzy search indexes of this process are
+# updated once the changes commit, Recipe.updated_at is bumped when the
+# ingredient lines a recipe shows change, and the cached page data of the
+# recipe and of the listings is dropped (recipe.caching). The ingredient totals stored on the
+# recipes (recipe.rollups) are kept up to date first.
+LABEL_INDEXES = (autocomplete_index, trigram_index)
+
+
+def update_label_indexes(kind, pk, label):
+    # Once committed, so rows that are rolled back are never suggested
+    for index in LABEL_INDEXES:
+        transaction.on_commit(partial(index.add, kind, pk, label))
+
+
+def index_new_ingredients(ingredients):
+    # For ingredients written with bulk_create (Ingredient.objects.ids_for_names),
+    # which skips post_save. New ingredients are in no recipe yet, so only the
+    # label indexes change.
+    for ingredient in ingredients:
+        update_label_indexes("ingredient", ingredient.pk, ingredient.name)
+
+
+def remove_from_label_indexes(kind, pk):
+    for index in LABEL_INDEXES:
+        transaction.on_commit(partial(index.remove, kind, pk))
+
+
+@receiver(post_save, sender=Recipe)
+def index_saved_recipe(sender, instance, raw=False, **kwargs):
+    if not raw:
+        index_recipes([instance.pk])
+        update_label_indexes("recipe", instance.pk, instance.title)
+        invalidate_recipes([instance.pk])
+
+
+@receiver(post_delete, sender=Recipe)
+def remove_deleted_recipe(sender, instance, **kwargs):
+    remove_recipes([instance.pk])
+    remove_from_label_indexes("recipe", instance.pk)
+    invalidate_recipes([instance.pk])
+
+
+@receiver(post_save, sender=RecipeIngredientIntermediary)
+@receiver(post_delete, sender=RecipeIngredientIntermediary)
+def index_linked_recipe(sender, instance, raw=False, created=False, **kwargs):
+    if not raw:
+        if created:
+            add_lines_to_rollups(instance.recipe_id, [instance.recipe_ingredient])
+        else:
+            recompute_rollups([instance.recipe_id])
+        index_recipes([instance.recipe_id])
+        touch_recipes([instance.recipe_id])
+        invalidate_recipes([instance.recipe_id])
+
+
+@receiver(m2m_changed, sender=Recipe.recipe_ingredients.through)
+def index_relinked_recipes(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        recipe_ids = [instance.pk]
+    elif pk_set:
+        recipe_ids = list(pk_set)
+    else:
+        recipe_ids = list(
+            Recipe.objects.filter(recipe_ingredients=instance).values_list("pk", flat=True)
+        )
+    if action == "post_add" and not reverse:
+        # pk_set only holds the lines that were not linked yet
+        lines = RecipeIngredient.objects.filter(pk__in=pk_set).values(
+            "calorie_content", "grams", "cost"
+        )
+        add_lines_to_rollups(instance.pk, lines)
+    else:
+        recompute_rollups(recipe_ids)
+    index_recipes(recipe_ids)
+    touch_recipes(recipe_ids)
+    invalidate_recipes(recipe_ids)
+
+
+@receiver(post_save, sender=RecipeIngredient)
+def index_recipes_using_recipe_ingredient(sender, instance, created, raw=False, **kwargs):
+    # A new RecipeIngredient is not linked to a recipe yet
+    if not raw and not created:
+        recipe_ids = list(
+            Recipe.objects.filter(recipe_ingredients=instance).values_list("pk", flat=True)
+        )
+        recompute_rollups(recipe_ids)
+        index_recipes(recipe_ids)
+        touch_recipes(recipe_ids)
+        invalidate_recipes(recipe_ids)
+
+
+@receiver(post_save, sender=Ingredient)
+def index_recipes_using_ingredient(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    update_label_indexes("ingredient", instance.pk, instance.name)
+    if not created:
+        recipe_ids = list(
+            Recipe.objects.filter(
+                recipe_ingredients__ingredient=instance
+            ).values_list("pk", flat=True)
+        )
+        index_recipes(recipe_ids)
+        touch_recipes(recipe_ids)
+        invalidate_recipes(recipe_ids)
+
+
+@receiver(post_delete, sender=Ingredient)
+def remove_deleted_ingredient(sender, instance, **kwargs):
+    remove_from_label_indexes("ingredient", instance.pk)
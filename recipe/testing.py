@@ -0,0 +1,41 @@
+from customuser.models import CustomUser
+from ingredient.testing import IngredientCacheTestCase
+from .models import Recipe
+from .utils import add_recipe_ingredients
+
+# Values of the ingredient lines made by recipe_line that are not given
+LINE_DEFAULTS = {
+    "amount": 1,
+    "amount_type": "each",
+    "supplier": "Market",
+    "calorie_content": 0,
+    "grams": 100,
+    "cost": 0,
+}
+
+
+def recipe_line(ingredient, **values):
+    # An ingredient line for add_recipe_ingredients, with LINE_DEFAULTS
+    return {"ingredient": ingredient, **LINE_DEFAULTS, **values}
+
+
+class RecipeTestCase(IngredientCacheTestCase):
+    """
+    TestCase creating ``cls.user``, who logs in as "cook" / "pw", in
+    setUpTestData, and recipes of that user with ``cls.create_recipe``.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.user = CustomUser.objects.create_user(username="cook", password="pw")
+
+    @classmethod
+    def create_recipe(cls, title, servings, lines, **fields):
+        # A recipe with the ingredient lines (dicts, see recipe_line)
+        fields = {"directions": "Cook.", "recipe_type": "dinner", **fields}
+        recipe = Recipe.objects.create(
+            title=title, servings=servings, user=cls.user, **fields
+        )
+        add_recipe_ingredients(recipe, lines)
+        return recipe
@@ -1,10 +1,31 @@
 import base64
+import csv
 import json
-from django.test import TestCase, Client
+import re
+import hashlib
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+import tempfile
+import time
+from decimal import Decimal
+from io import BytesIO, StringIO
+from xml.etree import ElementTree
+from PIL import Image
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, Client, override_settings
 from .models import Recipe
 from django.core.exceptions import ValidationError
 from recipeingredient.models import RecipeIngredient
 from ingredient.models import Ingredient
+from ingredient.testing import IngredientCacheTestCase
 from recipeingredientintermediary.models import RecipeIngredientIntermediary
 from customuser.models import CustomUser
 from .forms import (
@@ -12,18 +33,62 @@ from .forms import (
     RecipeForm,
     RecipeIngredientIntermediaryForm,
     RecipeEditForm,
+    GRAMS_NEEDED,
 )
 from django.urls import reverse
-from .utils import get_recipe_from_title
+from .utils import (
+    add_recipe_ingredients,
+    get_chart,
+    get_ingredient_rows,
+    get_ingredient_table,
+    get_recipe_from_title,
+)
+from .pagination import KeysetPaginator, decode_cursor, encode_cursor
+from .search import SEARCH_RESULT_LIMIT, index_recipes, search_recipes
+from .api import LIST_FIELDS
+from .importer import RecipeImporter
+from .caching import cache_stats
+from .autocomplete import PrefixIndex, autocomplete_index
+from .fuzzy import (
+    FUZZY_THRESHOLD,
+    fuzzy_search_recipes,
+    similarity,
+    trigram_index,
+    trigrams,
+    word_similarity,
+)
+from .charts import (
+    ChartRenderer,
+    chart_cache_key,
+    chart_renderer,
+    get_cached_charts,
+    ingredient_fingerprint,
+    nice_ticks,
+    svg_chart_renderer,
+)
+from .images import IMAGE_VARIANTS, decode_base64_image, image_path, store_image
+from .scaling import MAX_SERVINGS, ScalingError, parse_servings, scale_recipe
+from .shopping import MAX_SHOPPING_RECIPES, build_shopping_list, parse_recipe_list
+from .testing import RecipeTestCase, recipe_line
+from .management.commands.startup_time import measure_startup
 from unittest.mock import patch
 from pandas import DataFrame
-from recipe.views import format_cost
+from recipe.views import format_cost, with_ingredients
 from django.contrib.auth import get_user_model
 import pandas as pd
 
 # Create your tests here.
 
 
+def make_base64_image(color="red", size=(40, 30)):
+    buffer = BytesIO()
+    Image.new("RGB", size, color).save(buffer, format="JPEG")
+    return base64.b64encode(buffer.getvalue()).decode("utf-8")
+
+
+TEST_IMAGE = make_base64_image()
+
+
 class RecipeModelTest(TestCase):
     @classmethod
     def setUpTestData(cls):
@@ -46,7 +111,6 @@ class RecipeModelTest(TestCase):
             yield_amount=12,
             allergens="unknown",
             user=cls.user,
-            pic="fsfsgsrgsgsrgsrgsrgsrg",
         )
         Recipe.objects.create(
             title="Pancakes",
@@ -223,6 +287,8 @@ class RecipeModelTest(TestCase):
             recipe=Recipe.objects.get(id=2),
             recipe_ingredient=RecipeIngredient.objects.get(id=4),
         )
+        # The stored ingredient count was updated when the lines were linked
+        recipe.refresh_from_db()
         result = recipe.calculate_difficulty()
 
         self.assertEqual(result, "Medium")
@@ -235,9 +301,11 @@ class RecipeModelTest(TestCase):
         result = recipe.calculate_difficulty()
         self.assertEqual(result, "Missing cooking time or ingredients.")
 
-    def test_pic_field(self):
+    def test_image_urls_without_picture(self):
         recipe = Recipe.objects.get(title="Nachos")
-        self.assertEqual(recipe.pic, "fsfsgsrgsgsrgsrgsrgsrg")
+        self.assertEqual(recipe.image_hash, "")
+        self.assertEqual(recipe.card_image_url, "/static/images/no_picture.jpg")
+        self.assertEqual(recipe.row_image_url, "/static/images/no_picture.jpg")
 
 
 class RecipeFormTest(TestCase):
@@ -306,7 +374,6 @@ class RecipeViewTest(TestCase):
             yield_amount=12,
             allergens="unknown",
             user=cls.user,  # Associate the user with the recipe
-            pic="no_picture.jpg",
         )
         RecipeIngredient.objects.create(
             recipe=cls.recipe,
@@ -343,6 +410,9 @@ class RecipeViewTest(TestCase):
 
         cls.recipe = Recipe.objects.get(id=1)
 
+    def setUp(self):
+        cache.clear()
+
     def test_recipe_home_view(self):
         response = self.client.get(reverse("recipe:home"))
         self.assertEqual(response.status_code, 200)
@@ -380,13 +450,9 @@ class RecipeViewTest(TestCase):
             "Cost": ["$20.40", "$5.10", "$10.15"],
         }
 
-        # Convert the data into a DataFrame
-        mock_df = DataFrame(data)
+        self.recipe.recipe_ingredients.add(*RecipeIngredient.objects.all())
 
-        # Set the DataFrame as the mocked DataFrame to be returned by the mock function
-        with patch("recipe.views.get_chart", side_effect=self.mock_get_chart), patch(
-            "recipe.views.pd.DataFrame.from_dict", return_value=mock_df
-        ):
+        with patch("recipe.views.get_chart", side_effect=self.mock_get_chart):
             url = reverse("recipe:detail", kwargs={"pk": self.recipe.pk})
             response = self.client.get(url)
 
@@ -417,10 +483,10 @@ class RecipeViewTest(TestCase):
             self.assertContains(response, "<div>Mocked Chart</div>")
 
     @patch("recipe.views.RecipeSearchView.get_queryset")
-    @patch("recipe.views.pd.DataFrame.from_dict")
+    @patch("pandas.DataFrame.from_dict")
     def test_recipe_search_view(self, mock_from_dict, mock_get_queryset):
         # Mock the queryset returned by get_queryset method
-        mock_get_queryset.return_value = [self.recipe]
+        mock_get_queryset.return_value = Recipe.objects.filter(pk=self.recipe.pk)
         fake_image_data = (
             b"Fake image data"  # Replace this with your actual image binary data
         )
@@ -468,6 +534,1030 @@ class RecipeViewTest(TestCase):
         )
 
 
+class RecipeHomeQueryCountTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(
+            username="testuser", email="testuser@example.com", password="testpassword"
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def create_recipes(self, count):
+        start = Recipe.objects.count()
+        Recipe.objects.bulk_create(
+            Recipe(
+                title=f"Recipe {start + i}",
+                directions="Directions",
+                cooking_time=5,
+                star_count=3,
+                recipe_type="snack",
+                servings=1,
+                user=self.user,
+            )
+            for i in range(count)
+        )
+
+    def test_home_query_count_is_constant(self):
+        # A single bounded query per page, however big the table gets; the
+        # ETag comes from the cache
+        self.create_recipes(5)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("recipe:home"))
+        self.assertEqual(len(response.context["page_obj"]), 4)
+
+        self.create_recipes(200)
+        cursor = None
+        for _ in range(30):
+            response = self.client.get(reverse("recipe:home"), {"cursor": cursor or ""})
+            cursor = response.context["page_obj"].next_cursor
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("recipe:home"), {"cursor": cursor})
+        self.assertEqual(len(response.context["page_obj"]), 4)
+        self.assertEqual(response.context["page_obj"][0].title, "Recipe 120")
+
+    @override_settings(RECIPE_PAGINATION="offset")
+    def test_home_offset_query_count_is_constant(self):
+        self.create_recipes(5)
+        with self.assertNumQueries(2):
+            self.client.get(reverse("recipe:home"))
+
+        self.create_recipes(200)
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse("recipe:home"), {"page": 30})
+        self.assertEqual(len(response.context["page_obj"]), 4)
+
+    def test_home_defers_unused_columns(self):
+        self.create_recipes(1)
+        response = self.client.get(reverse("recipe:home"))
+        recipe = response.context["page_obj"][0]
+        self.assertEqual(
+            recipe.get_deferred_fields(),
+            {
+                "user_id",
+                "directions",
+                "cooking_time",
+                "star_count",
+                "recipe_type",
+                "adapted_link",
+                "servings",
+                "yield_amount",
+                "allergens",
+                "updated_at",
+                "ingredient_count",
+                "total_calories",
+                "total_grams",
+                "total_cost",
+                "cost_per_serving",
+            },
+        )
+
+    @override_settings(RECIPE_PAGINATION="offset")
+    def test_home_out_of_range_page_shows_last_page(self):
+        self.create_recipes(6)
+        response = self.client.get(reverse("recipe:home"), {"page": 99})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["page_obj"].number, 2)
+
+
+class RecipeIngredientQueryCountTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(
+            username="testuser", email="testuser@example.com", password="testpassword"
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.login(username="testuser", password="testpassword")
+
+    def create_recipe(self, title, ingredient_count):
+        recipe = Recipe.objects.create(
+            title=title,
+            directions="Directions",
+            cooking_time=5,
+            star_count=3,
+            recipe_type="snack",
+            servings=1,
+            user=self.user,
+        )
+        for i in range(ingredient_count):
+            recipe.recipe_ingredients.add(
+                RecipeIngredient.objects.create(
+                    ingredient=Ingredient.objects.create(name=f"{title} ingredient {i}"),
+                    calorie_content=10,
+                    amount=1,
+                    amount_type="cup",
+                    cost=1,
+                    supplier="supplier",
+                    grams=100,
+                )
+            )
+        return recipe
+
+    def test_your_recipes_query_count_is_fixed(self):
+        # session, user, one page of recipes, their ingredients with names
+        self.create_recipe("Recipe 1", 1)
+        with self.assertNumQueries(4):
+            self.client.get(reverse("recipe:your_recipes"))
+
+        self.create_recipe("Recipe 2", 6)
+        self.create_recipe("Recipe 3", 6)
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse("recipe:your_recipes"))
+        self.assertContains(response, "Recipe 3 ingredient 5")
+
+    @patch("recipe.views.get_chart", return_value="chart")
+    def test_detail_query_count_is_fixed(self, mock_get_chart):
+        # ETag check, session, user, recipe with its owner, its ingredients
+        # with names
+        small = self.create_recipe("Recipe 1", 1)
+        large = self.create_recipe("Recipe 2", 8)
+        with self.assertNumQueries(5):
+            self.client.get(reverse("recipe:detail", kwargs={"pk": small.pk}))
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse("recipe:detail", kwargs={"pk": large.pk}))
+        self.assertContains(response, "Recipe 2 ingredient 7")
+        self.assertContains(response, "Medium")
+
+    def test_difficulty_uses_stored_prefetched_or_annotated_count(self):
+        pk = self.create_recipe("Recipe 1", 5).pk
+        recipe = Recipe.objects.get(pk=pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(recipe.calculate_difficulty(), "Medium")
+
+        # Without the stored count
+        deferred = Recipe.objects.defer("ingredient_count")
+        recipe = deferred.prefetch_related("recipe_ingredients").get(pk=pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(recipe.calculate_difficulty(), "Medium")
+
+        recipe = deferred.annotate(num_ingredients=Count("recipe_ingredients")).get(pk=pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(recipe.calculate_difficulty(), "Medium")
+
+        recipe = deferred.get(pk=pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(recipe.count_ingredients(), 5)
+
+class KeysetPaginatorTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(
+            username="testuser", email="testuser@example.com", password="testpassword"
+        )
+        stars = [5, None, 3, 5, 1, None, 3, 4, 2, 5, None]
+        times = [10, 3, None, 45, 10, 8, None, 3, 20, 10, 60]
+        for i, (star_count, cooking_time) in enumerate(zip(stars, times)):
+            Recipe.objects.create(
+                title=f"Recipe {i}",
+                directions="Directions",
+                cooking_time=cooking_time,
+                star_count=star_count,
+                recipe_type="snack",
+                servings=1,
+                user=cls.user,
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def walk(self, sort, per_page=3):
+        paginator = KeysetPaginator(Recipe.objects.all(), per_page, sort)
+        pages = [paginator.page()]
+        while pages[-1].has_next():
+            pages.append(paginator.page(pages[-1].next_cursor))
+        return paginator, pages
+
+    def expected_ids(self, sort):
+        paginator = KeysetPaginator(Recipe.objects.all(), 1, sort)
+        ordering = paginator.ordering(paginator.descending)
+        return list(Recipe.objects.order_by(*ordering).values_list("id", flat=True))
+
+    def test_forward_walk_visits_every_row_once_in_order(self):
+        for sort in ["id", "star_count", "cooking_time"]:
+            _, pages = self.walk(sort)
+            ids = [recipe.id for page in pages for recipe in page]
+            self.assertEqual(ids, self.expected_ids(sort), sort)
+            self.assertFalse(pages[0].has_previous())
+            self.assertFalse(pages[-1].has_next())
+
+    def test_backward_walk_returns_the_same_pages(self):
+        for sort in ["id", "star_count", "cooking_time"]:
+            paginator, pages = self.walk(sort)
+            for index in range(len(pages) - 1, 0, -1):
+                previous = paginator.page(pages[index].previous_cursor)
+                self.assertEqual(
+                    [r.id for r in previous], [r.id for r in pages[index - 1]], sort
+                )
+            self.assertFalse(paginator.page(pages[1].previous_cursor).has_previous())
+
+    def test_star_count_sort_is_descending_with_nulls_last(self):
+        _, pages = self.walk("star_count", per_page=20)
+        stars = [recipe.star_count for recipe in pages[0]]
+        self.assertEqual(stars, [5, 5, 5, 4, 3, 3, 2, 1, None, None, None])
+
+    def test_invalid_cursor_falls_back_to_first_page(self):
+        paginator = KeysetPaginator(Recipe.objects.all(), 3)
+        first = [r.id for r in paginator.page()]
+        for cursor in ["garbage", encode_cursor("x", 1, "next"), "e30"]:
+            self.assertEqual([r.id for r in paginator.page(cursor)], first)
+
+    def test_cursor_round_trip(self):
+        self.assertEqual(decode_cursor(encode_cursor(5, 12, "prev")), (5, 12, "prev"))
+        self.assertEqual(decode_cursor(encode_cursor(None, 3, "next")), (None, 3, "next"))
+
+    def test_your_recipes_cursor_pages(self):
+        self.client.login(username="testuser", password="testpassword")
+        url = reverse("recipe:your_recipes")
+        response = self.client.get(url, {"sort": "cooking_time"})
+        page_obj = response.context["page_obj"]
+        self.assertEqual(len(page_obj), 3)
+        self.assertContains(response, f"cursor={page_obj.next_cursor}")
+
+        response = self.client.get(
+            url, {"sort": "cooking_time", "cursor": page_obj.next_cursor}
+        )
+        next_page = response.context["page_obj"]
+        self.assertEqual(len(next_page), 3)
+        self.assertTrue(next_page.has_previous())
+        self.assertTrue(
+            page_obj[-1].cooking_time is None
+            or next_page[0].cooking_time >= page_obj[-1].cooking_time
+        )
+
+    def test_search_results_are_paginated(self):
+        url = reverse("recipe:search")
+        response = self.client.post(url, {"search_mode": "#3", "search": ""})
+        page_obj = response.context["page_obj"]
+        self.assertEqual(len(page_obj), 10)
+        self.assertTrue(page_obj.has_next())
+
+        response = self.client.get(
+            url, {"search_mode": "#3", "search": "", "cursor": page_obj.next_cursor}
+        )
+        self.assertEqual(len(response.context["page_obj"]), 1)
+        self.assertContains(response, "Recipe 10")
+
+
+class RecipeSearchIndexTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(
+            username="testuser", email="testuser@example.com", password="testpassword"
+        )
+        cls.other_user = CustomUser.objects.create_user(
+            username="otheruser", email="otheruser@example.com", password="testpassword"
+        )
+        cls.salsa = cls.create_recipe("Tomato Salsa", "Chop everything.", ["Onion"])
+        cls.soup = cls.create_recipe("Winter Soup", "Simmer the tomatoes.", ["Leek"])
+        cls.pasta = cls.create_recipe(
+            "Pasta", "Boil the pasta.", ["Cherry Tomato"], user=cls.other_user
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    @classmethod
+    def create_recipe(cls, title, directions, ingredient_names, user=None):
+        recipe = Recipe.objects.create(
+            title=title,
+            directions=directions,
+            cooking_time=5,
+            star_count=3,
+            recipe_type="snack",
+            servings=1,
+            user=user or cls.user,
+        )
+        for name in ingredient_names:
+            recipe.recipe_ingredients.add(
+                RecipeIngredient.objects.create(
+                    ingredient=Ingredient.objects.create(name=name),
+                    calorie_content=10,
+                    amount=1,
+                    amount_type="cup",
+                    cost=1,
+                    supplier="supplier",
+                    grams=100,
+                )
+            )
+        return recipe
+
+    def titles(self, query, queryset=None):
+        return [recipe.title for recipe in search_recipes(query, queryset)]
+
+    def test_matches_titles_directions_and_ingredients_ranked(self):
+        # A title hit no longer hides the ingredient and directions hits
+        titles = self.titles("tomato")
+        self.assertEqual(titles[0], "Tomato Salsa")
+        self.assertCountEqual(titles, ["Tomato Salsa", "Winter Soup", "Pasta"])
+
+    def test_every_word_must_match_as_a_prefix(self):
+        self.assertEqual(self.titles("tom sal"), ["Tomato Salsa"])
+        self.assertEqual(self.titles("tomato leek"), ["Winter Soup"])
+        self.assertEqual(self.titles("pizza"), [])
+        self.assertEqual(self.titles("   "), [])
+
+    def test_query_syntax_is_ignored(self):
+        self.assertEqual(self.titles('salsa" OR (NEAR*'), [])
+        self.assertEqual(self.titles('"salsa"'), ["Tomato Salsa"])
+
+    def test_search_runs_two_queries(self):
+        with self.assertNumQueries(2):
+            self.titles("tomato")
+
+    def test_index_follows_saves_and_deletes(self):
+        self.salsa.title = "Green Salsa"
+        self.salsa.save()
+        self.assertEqual(self.titles("green"), ["Green Salsa"])
+
+        Ingredient.objects.filter(name="Leek").get().save()
+        leek = Ingredient.objects.get(name="Leek")
+        leek.name = "Parsnip"
+        leek.save()
+        self.assertEqual(self.titles("parsnip"), ["Winter Soup"])
+
+        RecipeIngredientIntermediary.objects.filter(recipe=self.soup).delete()
+        self.assertEqual(self.titles("parsnip"), [])
+
+        self.pasta.delete()
+        self.assertEqual(self.titles("pasta"), [])
+        self.assertEqual(self.titles("boil"), [])
+
+    def test_search_view_scopes_and_ranks(self):
+        self.client.login(username="testuser", password="testpassword")
+        url = reverse("recipe:search")
+        response = self.client.post(url, {"search_mode": "#1", "search": "tomato"})
+        titles = [recipe.title for recipe in response.context["page_obj"]]
+        self.assertEqual(titles, ["Tomato Salsa", "Winter Soup"])
+        self.assertEqual(response.context["page_obj"].sort, "rank")
+
+        response = self.client.post(url, {"search_mode": "#2", "search": "tomato"})
+        self.assertEqual(len(response.context["page_obj"]), 3)
+        self.assertContains(response, "sort=rank")
+
+    def test_result_limit_applies_after_the_scope(self):
+        # More title matches than the result limit, all ranked above the
+        # user's soup, which only mentions tomatoes in its directions
+        bulk = Recipe.objects.bulk_create(
+            Recipe(
+                title=f"Tomato {i}",
+                directions="Slice.",
+                recipe_type="snack",
+                total_cost=5,
+                user=self.other_user,
+            )
+            for i in range(SEARCH_RESULT_LIMIT)
+        )
+        index_recipes(recipe.pk for recipe in bulk)
+        self.assertNotIn("Winter Soup", self.titles("tomato"))
+
+        mine = Recipe.objects.filter(user=self.user)
+        self.assertEqual(self.titles("tomato", mine), ["Tomato Salsa", "Winter Soup"])
+        self.assertEqual(self.titles("tomato", mine.none()), [])
+
+        self.client.login(username="testuser", password="testpassword")
+        url = reverse("recipe:search")
+        response = self.client.post(url, {"search_mode": "#1", "search": "tomato"})
+        titles = [recipe.title for recipe in response.context["page_obj"]]
+        self.assertEqual(titles, ["Tomato Salsa", "Winter Soup"])
+
+        url = reverse("recipe:api_recipes")
+        response = self.client.get(url, {"q": "tomato", "max_cost": 2, "fields": "title"})
+        titles = [recipe["title"] for recipe in response.json()["results"]]
+        self.assertCountEqual(titles, ["Tomato Salsa", "Winter Soup", "Pasta"])
+
+    def test_rebuild_command_restores_bulk_created_recipes(self):
+        Recipe.objects.bulk_create(
+            Recipe(
+                title=f"Bulk {i}",
+                directions="Fold gently.",
+                recipe_type="snack",
+                user=self.user,
+            )
+            for i in range(3)
+        )
+        self.assertEqual(self.titles("fold"), [])
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO recipe_search (rowid, title, small_desc, directions, "
+                "ingredients) VALUES (99999, 'Ghost', '', '', '')"
+            )
+        out = StringIO()
+        # The rows are replaced in place; the table is never dropped
+        with CaptureQueriesContext(connection) as queries:
+            call_command("rebuild_search_index", batch_size=2, stdout=out)
+        self.assertFalse(any("DROP" in query["sql"] for query in queries))
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT count(*) FROM recipe_search")
+            self.assertEqual(cursor.fetchone()[0], 6)
+        self.assertIn("Indexed 6 recipes", out.getvalue())
+        self.assertCountEqual(self.titles("fold"), ["Bulk 0", "Bulk 1", "Bulk 2"])
+        self.assertEqual(self.titles("tomato")[0], "Tomato Salsa")
+
+
+class SearchResultsRenderingTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = CustomUser.objects.create_user(username="testuser", password="testpassword")
+        Recipe.objects.create(
+            title="Grandma's <Pie>",
+            directions="Bake it.",
+            cooking_time=40,
+            star_count=5,
+            recipe_type="dessert",
+            servings=8,
+            user=user,
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_results_page_is_one_query_of_the_shown_columns(self):
+        url = reverse("recipe:search")
+        with self.assertNumQueries(2):  # full text lookup, then the page
+            response = self.client.get(url, {"search_mode": "#2", "search": "pie"})
+        recipe = response.context["page_obj"][0]
+        self.assertEqual(
+            recipe.get_deferred_fields(),
+            {
+                "user_id",
+                "directions",
+                "recipe_type",
+                "adapted_link",
+                "servings",
+                "yield_amount",
+                "allergens",
+                "small_desc",
+                "updated_at",
+                "ingredient_count",
+                "total_calories",
+                "total_grams",
+                "total_cost",
+                "cost_per_serving",
+            },
+        )
+        self.assertNotIn("search_results_df", response.context)
+
+    def test_rows_are_rendered_escaped_by_the_template(self):
+        response = self.client.get(
+            reverse("recipe:search"), {"search_mode": "#2", "search": "pie"}
+        )
+        self.assertContains(response, "<td>Grandma&#x27;s &lt;Pie&gt;</td>", html=False)
+        self.assertContains(response, "/static/images/no_picture.jpg")
+        self.assertEqual(
+            json.loads(response.context["recipe_urls_json"]),
+            {"Grandma's <Pie>": Recipe.objects.get().get_absolute_url()},
+        )
+        # The JSON map is embedded as a JavaScript string literal
+        self.assertContains(response, "JSON.parse('{\\u0022Grandma\\u0027s")
+
+    def test_no_results_message(self):
+        response = self.client.get(
+            reverse("recipe:search"), {"search_mode": "#2", "search": "soup"}
+        )
+        self.assertContains(response, "No recipes found.")
+        self.assertNotContains(response, "search-results-table\"")
+
+    def test_benchmark_command_rolls_back_its_catalog(self):
+        out = StringIO()
+        call_command("benchmark_search", recipes=30, repeat=2, stdout=out)
+        self.assertIn("show all", out.getvalue())
+        # Every timed search runs its queries instead of hitting the cache
+        rows = [line.split() for line in out.getvalue().splitlines()[2:]]
+        self.assertTrue(all(int(row[-4]) > 0 for row in rows))
+        self.assertEqual(Recipe.objects.count(), 1)
+        self.assertEqual([r.title for r in search_recipes("pie")], ["Grandma's <Pie>"])
+
+
+class PrefixIndexTest(TestCase):
+    def setUp(self):
+        self.index = PrefixIndex()
+        self.index.loaded_at = time.monotonic()  # start empty, skip the database
+        self.index.add("recipe", 1, "Tomato Salsa")
+        self.index.add("recipe", 2, "Green Salad")
+        self.index.add("ingredient", 1, "Tomato")
+        self.index.add("ingredient", 2, "tomato")
+        self.index.add("ingredient", 3, "Salt")
+
+    def labels(self, prefix, limit=10):
+        return [label for kind, pk, label in self.index.complete(prefix, limit)]
+
+    def test_matches_the_start_of_any_word(self):
+        self.assertEqual(self.labels("sal"), ["Green Salad", "Tomato Salsa", "Salt"])
+        self.assertEqual(self.labels("  TOM"), ["Tomato", "Tomato Salsa"])
+        self.assertEqual(self.labels("omato"), [])
+        self.assertEqual(self.labels(""), [])
+        self.assertEqual(self.labels("sal", limit=1), ["Green Salad"])
+
+    def test_updates_and_removals(self):
+        self.index.add("recipe", 1, "Mango Salsa")
+        self.assertEqual(self.labels("tomato s"), [])
+        self.assertEqual(self.labels("mango"), ["Mango Salsa"])
+        self.index.remove("recipe", 1)
+        self.index.remove("recipe", 99)
+        self.assertEqual(self.labels("salsa"), [])
+        self.assertEqual(sum(map(len, self.index.keys.values())), 5)
+
+    def test_kinds_are_looked_up_apart_and_scans_are_bounded(self):
+        self.assertEqual(
+            self.index.complete("sal", kind="recipe"),
+            [("recipe", 2, "Green Salad"), ("recipe", 1, "Tomato Salsa")],
+        )
+        tomatoes = self.index.complete("tom", kind="ingredient")
+        self.assertEqual(tomatoes, [("ingredient", 1, "Tomato")])
+        with patch("recipe.autocomplete.AUTOCOMPLETE_MAX_SCAN", 2):
+            self.assertEqual(self.labels("sal"), ["Green Salad", "Tomato Salsa"])
+            # The second key is the same name again
+            self.assertEqual(self.labels("tom"), ["Tomato"])
+
+
+    def test_changes_made_during_a_load_are_kept(self):
+        def read_entries():
+            # Saved while the entries are read, so maybe missing from them
+            self.index.add("recipe", 3, "Mango Salsa")
+            self.index.remove("ingredient", 3)
+            return [("recipe", 1, "Tomato Salsa"), ("ingredient", 3, "Salt")]
+
+        with patch.object(self.index, "read_entries", read_entries):
+            self.index.load()
+        self.assertEqual(self.labels("sal"), ["Tomato Salsa", "Mango Salsa"])
+        self.assertIsNone(self.index.changes)
+
+    def test_stale_entries_are_reloaded_in_the_background(self):
+        self.index.loaded_at -= self.index.max_age + 1
+        with patch("recipe.autocomplete.threading.Thread") as thread:
+            self.assertEqual(self.labels("salt"), ["Salt"])
+        thread.return_value.start.assert_called_once_with()
+
+
+class AutocompleteViewTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(username="testuser", password="testpassword")
+        cls.recipe = Recipe.objects.create(
+            title="Tomato Salsa",
+            directions="Chop.",
+            recipe_type="snack",
+            user=cls.user,
+        )
+        Ingredient.objects.create(name="Tomatillo")
+
+    def setUp(self):
+        cache.clear()
+        autocomplete_index.load()
+        self.addCleanup(setattr, autocomplete_index, "loaded_at", None)
+
+    def test_answers_from_memory(self):
+        url = reverse("recipe:autocomplete")
+        with self.assertNumQueries(0):
+            response = self.client.get(url, {"q": "toma"})
+        self.assertEqual(
+            response.json(),
+            {
+                "query": "toma",
+                "results": [
+                    {"type": "ingredient", "label": "Tomatillo"},
+                    {
+                        "type": "recipe",
+                        "label": "Tomato Salsa",
+                        "id": self.recipe.pk,
+                        "url": self.recipe.get_absolute_url(),
+                    },
+                ],
+            },
+        )
+        response = self.client.get(url, {"q": "toma", "type": "recipe"})
+        self.assertEqual(
+            [result["label"] for result in response.json()["results"]], ["Tomato Salsa"]
+        )
+        response = self.client.get(url, {"q": "toma", "limit": "x"})
+        self.assertEqual(len(response.json()["results"]), 2)
+        response = self.client.get(url, {"q": "toma", "limit": "1"})
+        self.assertEqual(len(response.json()["results"]), 1)
+
+    def test_follows_saves_and_deletes(self):
+        url = reverse("recipe:autocomplete")
+        # The index follows changes once they are committed
+        with self.captureOnCommitCallbacks() as callbacks:
+            recipe = Recipe.objects.create(
+                title="Tofu Stir Fry",
+                directions="Fry.",
+                recipe_type="dinner",
+                user=self.user,
+            )
+        self.assertEqual(self.client.get(url, {"q": "stir"}).json()["results"], [])
+        for callback in callbacks:
+            callback()
+        results = self.client.get(url, {"q": "stir"}).json()["results"]
+        self.assertEqual(results[0]["label"], "Tofu Stir Fry")
+        recipe.title = "Tofu Curry"
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.save()
+        self.assertEqual(self.client.get(url, {"q": "stir"}).json()["results"], [])
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.delete()
+            Ingredient.objects.filter(name="Tomatillo").get().delete()
+        results = self.client.get(url, {"q": "to"}).json()["results"]
+        self.assertEqual([result["label"] for result in results], ["Tomato Salsa"])
+
+        # Ingredients added in bulk with the recipe's lines are suggested too
+        line = {"ingredient": "Tamarind", "amount_type": "each", "supplier": "Market"}
+        line.update(calorie_content=5, amount=1, cost=1, grams=10)
+        with self.captureOnCommitCallbacks(execute=True):
+            add_recipe_ingredients(self.recipe, [line])
+        results = self.client.get(url, {"q": "tamar"}).json()["results"]
+        self.assertEqual([result["label"] for result in results], ["Tamarind"])
+
+    def test_navbar_search_box_uses_the_suggestions(self):
+        response = self.client.get(reverse("recipe:home"))
+        self.assertContains(response, 'list="search-suggestions"')
+        self.assertContains(response, '<datalist id="search-suggestions">')
+
+
+class FuzzySearchTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(username="testuser", password="testpassword")
+        cls.nachos = Recipe.objects.create(
+            title="Loaded Nachos", directions="Bake.", recipe_type="snack", user=cls.user
+        )
+        cls.soup = Recipe.objects.create(
+            title="Tomato Soup", directions="Simmer.", recipe_type="lunch", user=cls.user
+        )
+        for recipe, name in [(cls.nachos, "Jalapeno"), (cls.soup, "Tomato")]:
+            recipe.recipe_ingredients.add(
+                RecipeIngredient.objects.create(
+                    ingredient=Ingredient.objects.create(name=name),
+                    calorie_content=10,
+                    amount=1,
+                    amount_type="each",
+                    cost=1,
+                    supplier="supplier",
+                    grams=50,
+                )
+            )
+
+    def setUp(self):
+        cache.clear()
+        trigram_index.load()
+        self.addCleanup(setattr, trigram_index, "loaded_at", None)
+
+    def titles(self, query):
+        return [recipe.title for recipe in fuzzy_search_recipes(query)]
+
+    def test_similarity_matches_pg_trgm(self):
+        self.assertEqual(trigrams("cat"), {"  c", " ca", "cat", "at "})
+        self.assertAlmostEqual(similarity(trigrams("jalepeno"), trigrams("jalapeno")), 0.5)
+        self.assertGreater(word_similarity("tomatoe", "tomato soup"), 0.6)
+        self.assertLess(word_similarity("pizza", "tomato soup"), FUZZY_THRESHOLD)
+
+    def test_misspelled_ingredients_and_titles_match(self):
+        self.assertEqual(self.titles("jalepeno"), ["Loaded Nachos"])
+        self.assertEqual(self.titles("tomatoe"), ["Tomato Soup"])
+        self.assertEqual(self.titles("nachoes"), ["Loaded Nachos"])
+        self.assertEqual(self.titles("pizza"), [])
+        self.assertEqual(self.titles(" "), [])
+
+    def test_candidates_are_bounded(self):
+        with patch("recipe.fuzzy.FUZZY_CANDIDATES", 1):
+            self.assertEqual(len(trigram_index.search("tomato soup", "recipe")), 1)
+        with patch("recipe.fuzzy.FUZZY_MAX_POSTINGS", 0):
+            self.assertEqual(trigram_index.search("tomato soup", "recipe"), [])
+
+    def test_candidates_are_taken_from_the_scope(self):
+        other = CustomUser.objects.create_user(username="other", password="pw")
+        with self.captureOnCommitCallbacks(execute=True):
+            Recipe.objects.create(
+                title="Loaded Nachoes", directions="Bake.", recipe_type="snack", user=other
+            )
+        mine = Recipe.objects.filter(user=self.user)
+        with patch("recipe.fuzzy.FUZZY_CANDIDATES", 1):
+            self.assertEqual(self.titles("loaded nachoes"), ["Loaded Nachoes"])
+            results = fuzzy_search_recipes("loaded nachoes", mine)
+            self.assertEqual([recipe.title for recipe in results], ["Loaded Nachos"])
+        self.assertEqual(list(fuzzy_search_recipes("nachoes", mine.none())), [])
+
+    def test_index_follows_renames(self):
+        Ingredient.objects.filter(name="Jalapeno").update(name="Chipotle")
+        self.assertEqual(self.titles("chipotel"), [])  # update() skips signals
+        ingredient = Ingredient.objects.get(name="Chipotle")
+        with self.captureOnCommitCallbacks(execute=True):
+            ingredient.save()
+        self.assertEqual(self.titles("chipotel"), ["Loaded Nachos"])
+        self.assertEqual(self.titles("jalepeno"), [])
+
+    def test_search_view_falls_back_to_close_matches(self):
+        url = reverse("recipe:search")
+        response = self.client.get(url, {"search_mode": "#2", "search": "jalepeno"})
+        self.assertTrue(response.context["fuzzy"])
+        self.assertEqual([r.title for r in response.context["page_obj"]], ["Loaded Nachos"])
+        self.assertContains(response, "No exact matches")
+
+        response = self.client.get(url, {"search_mode": "#2", "search": "jalapeno"})
+        self.assertFalse(response.context["fuzzy"])
+        self.assertNotContains(response, "No exact matches")
+
+
+class RecipeChartCacheTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(
+            username="testuser", email="testuser@example.com", password="testpassword"
+        )
+        cls.recipe = Recipe.objects.create(
+            title="Nachos",
+            directions="Directions",
+            cooking_time=3,
+            star_count=5,
+            recipe_type="snack",
+            servings=3,
+            user=cls.user,
+        )
+        for name, calories in [("Cheese", 120), ("Chips", 300)]:
+            cls.recipe.recipe_ingredients.add(
+                RecipeIngredient.objects.create(
+                    ingredient=Ingredient.objects.create(name=name),
+                    calorie_content=calories,
+                    amount=1,
+                    amount_type="cup",
+                    cost=2.50,
+                    supplier="supplier",
+                    grams=100,
+                )
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse("recipe:detail", kwargs={"pk": self.recipe.pk})
+        patcher = patch("recipe.views.get_chart", return_value="chart")
+        self.get_chart = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_repeat_views_do_not_plot(self):
+        self.client.get(self.url)
+        self.assertEqual(self.get_chart.call_count, 3)
+
+        response = self.client.get(self.url)
+        self.assertEqual(self.get_chart.call_count, 3)
+        self.assertEqual(response.context["chart1"], "chart")
+
+    def test_changed_ingredient_rows_are_replotted(self):
+        self.client.get(self.url)
+        chips = RecipeIngredient.objects.get(ingredient__name="Chips")
+        chips.cost = 9
+        chips.save()
+        self.client.get(self.url)
+        self.assertEqual(self.get_chart.call_count, 6)
+
+    def test_charts_are_keyed_by_the_ingredient_rows(self):
+        # Writes that skip the signals still never get charts of other rows
+        self.client.get(self.url)
+        rows = get_ingredient_rows(self.recipe)
+        fingerprint = ingredient_fingerprint(rows)
+        self.assertIsNotNone(get_cached_charts(self.recipe.pk, fingerprint))
+        rows[0] = rows[0][:4] + (Decimal("9.00"),)
+        fingerprint = ingredient_fingerprint(rows)
+        self.assertIsNone(get_cached_charts(self.recipe.pk, fingerprint))
+
+    def test_adding_an_ingredient_invalidates_charts(self):
+        self.client.get(self.url)
+        self.client.login(username="testuser", password="testpassword")
+        self.client.post(
+            reverse("recipe:add_ingredient", kwargs={"pk": self.recipe.pk}),
+            {
+                "recipe_id": self.recipe.pk,
+                "ingredient": "Salsa",
+                "calorie_content": 40,
+                "amount": 1,
+                "amount_type": "cup",
+                "cost": 3,
+                "supplier": "supplier",
+                "grams": 80,
+            },
+        )
+        self.assertIsNone(cache.get(chart_cache_key(self.recipe.pk)))
+        self.client.get(self.url)
+        self.assertEqual(self.get_chart.call_count, 6)
+
+    def test_deleting_an_ingredient_invalidates_charts(self):
+        self.client.get(self.url)
+        self.client.login(username="testuser", password="testpassword")
+        self.client.post(
+            reverse(
+                "recipe:delete_ingredient",
+                kwargs={"pk": self.recipe.pk, "ingredient": "Cheese"},
+            )
+        )
+        self.assertIsNone(cache.get(chart_cache_key(self.recipe.pk)))
+        self.client.get(self.url)
+        self.assertEqual(self.get_chart.call_count, 6)
+
+
+class ChartRendererTest(TestCase):
+    labels = ["Cheese", "Chips", "Salsa"]
+    values = [120.0, 300.0, 40.5]
+
+    def test_render_produces_png(self):
+        for chart_type in ["#1", "#2", "#3"]:
+            png = ChartRenderer().render(chart_type, self.labels, self.values)
+            self.assertTrue(png.startswith(b"\x89PNG"), chart_type)
+
+    def test_render_leaves_global_pyplot_state_alone(self):
+        import matplotlib
+        import matplotlib.pyplot as plt
+
+        rc_before = dict(matplotlib.rcParams)
+        for chart_type in ["#1", "#2", "#3"]:
+            chart_renderer.render(chart_type, self.labels, self.values)
+        self.assertEqual(plt.get_fignums(), [])
+        self.assertEqual(dict(matplotlib.rcParams), rc_before)
+
+    def test_concurrent_renders_match_sequential_renders(self):
+        jobs = [
+            (chart_type, self.labels[:n], self.values[:n])
+            for chart_type in ["#1", "#2", "#3"]
+            for n in [1, 2, 3]
+        ]
+        expected = [chart_renderer.render(*job) for job in jobs]
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(lambda job: chart_renderer.render(*job), jobs * 2))
+        self.assertEqual(results, expected * 2)
+
+    def test_unknown_chart_type(self):
+        with self.assertRaises(ValueError):
+            chart_renderer.render("#9", self.labels, self.values)
+        self.assertEqual(get_chart("#9", DataFrame({"Cost": [1]})), "")
+
+    def test_get_chart_plots_numeric_table_columns(self):
+        data = DataFrame({"Ingredient": ["a", "b"], "Cost": [20.4, 5.1]})
+        chart = get_chart("#3", data)
+        self.assertEqual(
+            base64.b64decode(chart), chart_renderer.render("#3", ["a", "b"], [20.4, 5.1])
+        )
+
+
+class SvgChartRendererTest(TestCase):
+    def parse(self, svg):
+        return ElementTree.fromstring(svg)
+
+    def test_every_chart_type_is_well_formed_svg(self):
+        cases = [
+            ([], []),
+            (["Cheese"], [120]),
+            (["Cheese", "Cheese", "Chips"], [120, 60, 0]),
+            (["Cheese", "Chips"], [0, 0]),
+        ]
+        for chart_type in ["#1", "#2", "#3"]:
+            for labels, values in cases:
+                root = self.parse(svg_chart_renderer.render(chart_type, labels, values))
+                self.assertEqual(root.tag, "{http://www.w3.org/2000/svg}svg")
+
+    def test_labels_are_escaped(self):
+        svg = svg_chart_renderer.render("#3", ["<script>alert(1)</script>"], [2])
+        self.assertNotIn("<script>", svg)
+        texts = [el.text for el in self.parse(svg).iter("{http://www.w3.org/2000/svg}text")]
+        self.assertIn("<script>alert(1)</script>", texts)
+
+    def test_bars_follow_data_order(self):
+        svg = svg_chart_renderer.render("#1", ["a", "b", "c"], [30, 10, 20])
+        rects = self.parse(svg).iter("{http://www.w3.org/2000/svg}rect")
+        bars = [rect for rect in rects if rect.get("width") == "288.0"]
+        self.assertEqual([float(bar.get("x")) for bar in bars], [116.0, 476.0, 836.0])
+        self.assertEqual([float(bar.get("height")) for bar in bars], [450.0, 150.0, 300.0])
+
+    def test_pie_slices_follow_costs(self):
+        svg = svg_chart_renderer.render("#3", ["a", "b", "c"], [1, 1, 2])
+        self.assertEqual(svg.count("<path"), 3)
+        self.assertIn("50.0%", svg)
+        self.assertIn("25.0%", svg)
+        single = svg_chart_renderer.render("#3", ["a"], [5])
+        self.assertIn("<circle", single)
+
+    def test_unknown_chart_type(self):
+        with self.assertRaises(ValueError):
+            svg_chart_renderer.render("#9", ["a"], [1])
+
+    def test_nice_ticks(self):
+        self.assertEqual(nice_ticks(300), [0, 100, 200, 300])
+        self.assertEqual(nice_ticks(0), [0.0, 1.0])
+        self.assertEqual(nice_ticks(9)[-1], 10)
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command("benchmark_charts", ingredients=3, repeat=1, stdout=out)
+        self.assertIn("per detail page", out.getvalue())
+
+
+@override_settings(RECIPE_CHART_FORMAT="svg")
+class RecipeDetailSvgChartTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = CustomUser.objects.create_user(username="testuser", password="testpassword")
+        cls.recipe = Recipe.objects.create(
+            title="Nachos",
+            directions="Directions",
+            cooking_time=3,
+            star_count=5,
+            recipe_type="snack",
+            servings=3,
+            user=user,
+        )
+        cls.recipe.recipe_ingredients.add(
+            RecipeIngredient.objects.create(
+                ingredient=Ingredient.objects.create(name="Cheese"),
+                calorie_content=120,
+                amount=1,
+                amount_type="cup",
+                cost=2.50,
+                supplier="supplier",
+                grams=100,
+            )
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_detail_page_inlines_svg_charts(self):
+        response = self.client.get(reverse("recipe:detail", kwargs={"pk": self.recipe.pk}))
+        self.assertEqual(response.context["chart_format"], "svg")
+        self.assertContains(response, "<svg", count=3)
+        self.assertNotContains(response, "data:image/png")
+        self.assertIsNotNone(cache.get(chart_cache_key(self.recipe.pk, "svg")))
+        self.assertIsNone(cache.get(chart_cache_key(self.recipe.pk, "png")))
+
+
+class IngredientTableTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = CustomUser.objects.create_user(username="testuser", password="testpassword")
+        cls.recipe = Recipe.objects.create(
+            title="Salsa",
+            directions="Directions",
+            cooking_time=5,
+            star_count=4,
+            recipe_type="snack",
+            servings=2,
+            user=user,
+        )
+        # Two rows for the same ingredient, e.g. added for two different steps
+        tomato = Ingredient.objects.create(name="Tomato")
+        for calories, grams, cost in [(10, 100, 1.25), (5, 50, 0.75)]:
+            cls.recipe.recipe_ingredients.add(
+                RecipeIngredient.objects.create(
+                    ingredient=tomato,
+                    calorie_content=calories,
+                    amount=1,
+                    amount_type="each",
+                    cost=cost,
+                    supplier="supplier",
+                    grams=grams,
+                )
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_rows_come_from_a_single_query(self):
+        with self.assertNumQueries(1):
+            rows = get_ingredient_rows(self.recipe)
+        self.assertEqual([row[1] for row in rows], ["Tomato", "Tomato"])
+
+    def test_table_keeps_duplicate_names_and_numeric_costs(self):
+        df = get_ingredient_table(get_ingredient_rows(self.recipe))
+        self.assertEqual(df["Ingredient"].tolist(), ["Tomato", "Tomato"])
+        self.assertEqual(df["Calorie Content"].tolist(), [10.0, 5.0])
+        self.assertEqual(df["Cost"].tolist(), [1.25, 0.75])
+        self.assertEqual(df["Cost"].dtype, "float64")
+
+    def test_detail_page_shows_every_row(self):
+        with patch("recipe.views.get_chart", return_value="chart") as get_chart_mock:
+            response = self.client.get(
+                reverse("recipe:detail", kwargs={"pk": self.recipe.pk})
+            )
+        table = response.context["recipe_dataframe"]
+        self.assertEqual(table.count("<td>Tomato</td>"), 2)
+        self.assertIn("<td>$1.25</td>", table)
+        self.assertIn("<td>$0.75</td>", table)
+        charted = get_chart_mock.call_args_list[2].args[1]
+        self.assertEqual(charted["Cost"].tolist(), [1.25, 0.75])
+
+    def test_ingredient_names_are_escaped(self):
+        Ingredient.objects.filter(name="Tomato").update(name="<b>Tomato</b>")
+        with patch("recipe.views.get_chart", return_value="chart"):
+            response = self.client.get(
+                reverse("recipe:detail", kwargs={"pk": self.recipe.pk})
+            )
+        self.assertIn("&lt;b&gt;Tomato&lt;/b&gt;", response.context["recipe_dataframe"])
+
+    def test_recipe_without_ingredients_has_no_table(self):
+        self.recipe.recipe_ingredients.clear()
+        response = self.client.get(reverse("recipe:detail", kwargs={"pk": self.recipe.pk}))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("recipe_dataframe", response.context)
+
+
 class RecipeCreateViewTest(TestCase):
     def setUp(self):
         self.client = Client()
@@ -528,7 +1618,6 @@ class IngredientAddViewTestCase(TestCase):
             yield_amount=6,
             allergens="Dairy, Nuts",
             small_desc="Test description",
-            pic="no_picture.jpg",
             user=self.user,
         )
         # URL for the IngredientAddView
@@ -565,22 +1654,1089 @@ class IngredientAddViewTestCase(TestCase):
         self.assertEqual(response.status_code, 200)
 
 
+class IngredientBulkAddViewTest(IngredientCacheTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(username="testuser", password="testpassword")
+        cls.recipe = Recipe.objects.create(
+            title="Chili", directions="Simmer.", recipe_type="dinner", user=cls.user
+        )
+        cls.url = reverse("recipe:add_ingredients", kwargs={"pk": cls.recipe.pk})
+        Ingredient.objects.create(name="Onion")
+
+    def setUp(self):
+        super().setUp()
+        self.client.login(username="testuser", password="testpassword")
+
+    def post_lines(self, lines, total_forms=None):
+        data = {
+            "form-TOTAL_FORMS": total_forms or len(lines),
+            "form-INITIAL_FORMS": 0,
+            "form-MIN_NUM_FORMS": 0,
+            "form-MAX_NUM_FORMS": 100,
+        }
+        for i, line in enumerate(lines):
+            for field, value in line.items():
+                data[f"form-{i}-{field}"] = value
+        return self.client.post(self.url, data)
+
+    def line(self, name, **kwargs):
+        line = {
+            "ingredient": name,
+            "calorie_content": 10,
+            "amount": 1,
+            "amount_type": "cup",
+            "cost": 2,
+            "supplier": "Market",
+            "grams": 100,
+        }
+        line.update(kwargs)
+        return line
+
+    def test_adds_every_line_with_a_fixed_number_of_queries(self):
+        lines = [self.line(f"Spice {i}") for i in range(20)] + [self.line(" onion ")]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.post_lines(lines)
+        # executemany is logged as "N times: INSERT ..."
+        insert_re = re.compile(r'^(?:\d+ times: )?INSERT[\w ]* INTO "?(\w+)')
+        writes = [
+            match.group(1)
+            for query in queries.captured_queries
+            if (match := insert_re.search(query["sql"]))
+        ]
+        self.assertRedirects(response, reverse("recipe:your_recipes"))
+        # One insert per table, plus the recipe's search row
+        self.assertEqual(
+            writes,
+            [
+                "ingredient_ingredient",
+                "recipeingredient_recipeingredient",
+                "recipeingredientintermediary_recipeingredientintermediary",
+                "recipe_search",
+            ],
+        )
+        self.assertEqual(self.recipe.recipe_ingredients.count(), 21)
+        self.assertEqual(Ingredient.objects.filter(name__startswith="Spice").count(), 20)
+        self.assertEqual(Ingredient.objects.filter(normalized_name="onion").count(), 1)
+
+        # The search index knows the new lines
+        self.assertEqual([r.title for r in search_recipes("spice")], ["Chili"])
+
+    def test_blank_rows_are_skipped_and_bad_rows_save_nothing(self):
+        response = self.post_lines([self.line("Garlic")], total_forms=3)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.recipe.recipe_ingredients.count(), 1)
+
+        response = self.post_lines([self.line("Cumin"), self.line("Salt", cost=-1)])
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context["form"].errors[1])
+        self.assertEqual(self.recipe.recipe_ingredients.count(), 1)
+        self.assertFalse(Ingredient.objects.filter(name="Cumin").exists())
+
+    def test_blank_grams_are_worked_out_from_the_amount(self):
+        Ingredient.objects.filter(name="Onion").update(density=Decimal("0.5"))
+        lines = [
+            self.line("Onion", grams="", amount=2, amount_type="cup"),
+            self.line("Milk", grams="", amount_type="liter"),
+            self.line("Beef", grams="", amount=1, amount_type="pound"),
+            self.line("Rice", grams=50),
+        ]
+        response = self.post_lines(lines)
+        self.assertEqual(response.status_code, 302)
+        grams = dict(
+            self.recipe.recipe_ingredients.values_list("ingredient__name", "grams")
+        )
+        self.assertEqual(
+            grams,
+            {
+                "Onion": Decimal("236.59"),
+                "Milk": Decimal("1030.00"),
+                "Beef": Decimal("453.59"),
+                "Rice": Decimal("50.00"),
+            },
+        )
+
+        response = self.post_lines(
+            [self.line("Egg", grams="", amount_type="each"), self.line("Salt", grams="")]
+        )
+        self.assertEqual(response.status_code, 200)
+        errors = response.context["form"].errors
+        self.assertEqual(errors[0], {"grams": [GRAMS_NEEDED]})
+        # A cup of salt has a known density
+        self.assertEqual(errors[1], {})
+        self.assertEqual(self.recipe.recipe_ingredients.count(), 4)
+
+    def test_only_the_owner_can_add(self):
+        other = CustomUser.objects.create_user(username="other", password="testpassword")
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        self.client.logout()
+        self.assertEqual(self.client.get(self.url).status_code, 302)
+
+    def test_form_renders(self):
+        response = self.client.get(self.url)
+        self.assertTemplateUsed(response, "recipe/add_ingredients.html")
+        self.assertContains(response, 'name="form-9-ingredient"')
+
+
+class ImportRecipesCommandTest(IngredientCacheTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(username="importer", password="pw")
+        Ingredient.objects.create(name="Onion")
+
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.enterContext(override_settings(MEDIA_ROOT=self.directory))
+
+    def record(self, title, **kwargs):
+        record = {
+            "title": title,
+            "directions": "Chop and simmer.",
+            "recipe_type": "dinner",
+            "cooking_time": 20,
+            "star_count": 4,
+            "servings": 2,
+            "ingredients": [
+                {
+                    "ingredient": " onion ",
+                    "calorie_content": "40",
+                    "amount": 1,
+                    "amount_type": "each",
+                    "cost": "0.50",
+                    "supplier": "Market",
+                    "grams": 110,
+                },
+                {
+                    "ingredient": f"{title} spice",
+                    "calorie_content": 5,
+                    "amount": "2",
+                    "amount_type": "teaspoon",
+                    "cost": 1,
+                    "supplier": "Market",
+                    "grams": 4,
+                },
+            ],
+        }
+        record.update(kwargs)
+        return record
+
+    def write_jsonl(self, records):
+        path = f"{self.directory}/recipes.jsonl"
+        with open(path, "w") as file:
+            for record in records:
+                if not isinstance(record, str):
+                    record = json.dumps(record)
+                file.write(record + "\n")
+        return path
+
+    def import_file(self, path, **options):
+        out, err = StringIO(), StringIO()
+        call_command(
+            "import_recipes", path, user="importer", stdout=out, stderr=err, **options
+        )
+        return out.getvalue(), err.getvalue()
+
+    def test_imports_recipes_with_their_ingredients(self):
+        with open(f"{self.directory}/soup.jpg", "wb") as file:
+            file.write(base64.b64decode(TEST_IMAGE))
+        path = self.write_jsonl(
+            [self.record(f"Soup {i}") for i in range(5)]
+            + [self.record("Picture soup", image="soup.jpg")]
+        )
+        out, err = self.import_file(path, batch_size=2)
+
+        self.assertIn("Imported 6 recipes and 12 ingredient lines", out)
+        self.assertEqual(err, "")
+        recipe = Recipe.objects.get(title="Soup 3")
+        self.assertEqual(recipe.user, self.user)
+        self.assertEqual(recipe.star_count, 4)
+        self.assertEqual(recipe.count_ingredients(), 2)
+        self.assertEqual(
+            sorted(recipe.recipe_ingredients.values_list("ingredient__name", "cost")),
+            [("Onion", Decimal("0.50")), ("Soup 3 spice", Decimal("1.00"))],
+        )
+        # The existing catalog entry is reused rather than duplicated
+        self.assertEqual(Ingredient.objects.filter(normalized_name="onion").count(), 1)
+        self.assertEqual(
+            Recipe.objects.get(title="Picture soup").image_hash,
+            hashlib.sha256(base64.b64decode(TEST_IMAGE)).hexdigest(),
+        )
+        self.assertEqual([r.title for r in search_recipes("soup 3 spice")], ["Soup 3"])
+
+    def test_imported_recipes_are_suggested_once_committed(self):
+        autocomplete_index.load()
+        self.addCleanup(setattr, autocomplete_index, "loaded_at", None)
+        path = self.write_jsonl([self.record("Gumbo"), self.record("Gazpacho")])
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.import_file(path)
+        self.assertEqual(autocomplete_index.complete("g", kind="recipe"), [])
+        for callback in callbacks:
+            callback()
+        suggestions = autocomplete_index.complete("g", kind="recipe")
+        self.assertEqual([label for _, _, label in suggestions], ["Gazpacho", "Gumbo"])
+
+    def test_queries_per_batch_do_not_grow_with_the_batch(self):
+        def count_queries(size, offset):
+            records = [self.record(f"Stew {offset + i}") for i in range(size)]
+            path = self.write_jsonl(records)
+            with CaptureQueriesContext(connection) as queries:
+                self.import_file(path, batch_size=size)
+            return len(queries)
+
+        self.assertEqual(count_queries(2, 0), count_queries(20, 100))
+
+    def test_imports_csv_rows(self):
+        path = f"{self.directory}/recipes.csv"
+        columns = ["title", "directions", "recipe_type", "cooking_time", "ingredients"]
+        with open(path, "w", newline="") as file:
+            writer = csv.DictWriter(file, columns)
+            writer.writeheader()
+            record = self.record("Curry")
+            writer.writerow(
+                {
+                    "title": "Curry",
+                    "directions": "Stir.",
+                    "recipe_type": "dinner",
+                    "cooking_time": "",
+                    "ingredients": json.dumps(record["ingredients"]),
+                }
+            )
+        self.import_file(path)
+
+        recipe = Recipe.objects.get(title="Curry")
+        self.assertIsNone(recipe.cooking_time)
+        self.assertEqual(recipe.count_ingredients(), 2)
+
+    def test_bad_records_are_reported_and_skipped(self):
+        bad_line = self.record("Bad line")
+        bad_line["ingredients"][0]["amount_type"] = "bucket"
+        path = self.write_jsonl(
+            [
+                self.record("Good"),
+                "{not json",
+                self.record("No type", recipe_type="brunch"),
+                bad_line,
+                self.record("Missing picture", image="nowhere.jpg"),
+            ]
+        )
+        out, err = self.import_file(path)
+
+        self.assertIn("Imported 1 recipes", out)
+        self.assertIn("4 rejected", out)
+        self.assertEqual(
+            [line.split(":")[0] for line in err.splitlines()],
+            ["record 2", "record 3", "record 4", "record 5"],
+        )
+        self.assertIn("unknown amount_type 'bucket'", err)
+        self.assertEqual(list(Recipe.objects.values_list("title", flat=True)), ["Good"])
+
+    def test_missing_grams_are_worked_out_or_the_record_rejected(self):
+        no_grams = self.record("Stew")
+        del no_grams["ingredients"][1]["grams"]
+        no_grams["ingredients"][1]["amount_type"] = "ounce"
+        each = self.record("Salad")
+        each["ingredients"][0]["grams"] = ""
+        out, err = self.import_file(self.write_jsonl([no_grams, each]))
+
+        self.assertIn("Imported 1 recipes", out)
+        self.assertEqual(err, "record 2: onion: grams are needed for this amount\n")
+        line = RecipeIngredient.objects.get(ingredient__name="Stew spice")
+        self.assertEqual(line.grams, Decimal("56.70"))
+        self.assertEqual(Recipe.objects.get(title="Stew").total_grams, Decimal("166.70"))
+
+    def test_resume_continues_after_the_last_saved_batch(self):
+        path = self.write_jsonl([self.record(f"Pie {i}") for i in range(5)])
+        with patch("recipe.importer.index_recipes", side_effect=[None, RuntimeError]):
+            with self.assertRaises(RuntimeError):
+                self.import_file(path, batch_size=2)
+        # The first batch was committed and recorded; the second rolled back
+        self.assertEqual(Recipe.objects.filter(title__startswith="Pie").count(), 2)
+        with open(f"{path}.progress") as file:
+            self.assertEqual(json.load(file), {"done": 2})
+
+        out, _ = self.import_file(path, batch_size=2, resume=True)
+        self.assertIn("Resuming after record 2", out)
+        self.assertIn("Imported 3 recipes", out)
+        self.assertEqual(Recipe.objects.filter(title__startswith="Pie").count(), 5)
+
+        # Without the checkpoint, recipes that already exist are skipped
+        out, _ = self.import_file(path)
+        self.assertIn("Imported 0 recipes", out)
+        self.assertIn("5 already present", out)
+
+    def test_unknown_user(self):
+        path = self.write_jsonl([self.record("Soup")])
+        with self.assertRaisesMessage(CommandError, "No user called 'nobody'"):
+            call_command("import_recipes", path, user="nobody")
+
+
+class ExportRecipesTest(IngredientCacheTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(username="cook", password="pw")
+        other = CustomUser.objects.create_user(username="other", password="pw")
+        onion = Ingredient.objects.create(name="Onion")
+        for i in range(5):
+            recipe = Recipe.objects.create(
+                title=f"Soup {i}",
+                directions="Simmer.",
+                recipe_type="lunch",
+                cooking_time=30,
+                servings=4,
+                user=cls.user,
+            )
+            recipe.recipe_ingredients.add(
+                RecipeIngredient.objects.create(
+                    ingredient=onion,
+                    calorie_content="40.00",
+                    amount=i + 1,
+                    amount_type="each",
+                    cost="0.25",
+                    supplier="Market",
+                    grams=110,
+                )
+            )
+        Recipe.objects.create(
+            title="Other soup", directions="Stir.", recipe_type="lunch", user=other
+        )
+
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.enterContext(override_settings(MEDIA_ROOT=self.directory))
+
+    def test_command_output_imports_back(self):
+        digest = store_image(base64.b64decode(TEST_IMAGE))
+        Recipe.objects.filter(title="Soup 0").update(image_hash=digest)
+        path = f"{self.directory}/export/recipes.jsonl"
+        os.makedirs(os.path.dirname(path))
+        out = StringIO()
+        call_command("export_recipes", path, user="cook", images="files", stdout=out)
+        self.assertIn("Exported 5 recipes", out.getvalue())
+
+        with open(path) as file:
+            records = [json.loads(line) for line in file]
+        self.assertEqual([r["title"] for r in records], [f"Soup {i}" for i in range(5)])
+        self.assertEqual(records[0]["image"], f"images/{digest}.jpg")
+        self.assertNotIn("image", records[1])
+        self.assertEqual(
+            records[2]["ingredients"],
+            [
+                {
+                    "ingredient": "Onion",
+                    "calorie_content": "40.00",
+                    "amount": "3.00",
+                    "amount_type": "each",
+                    "cost": "0.25",
+                    "supplier": "Market",
+                    "grams": "110.00",
+                }
+            ],
+        )
+
+        Recipe.objects.filter(user=self.user).delete()
+        call_command("import_recipes", path, user="cook", stdout=StringIO())
+        recipe = Recipe.objects.get(title="Soup 0")
+        self.assertEqual((recipe.servings, recipe.count_ingredients()), (4, 1))
+        self.assertTrue(recipe.image_hash)
+
+    def test_command_writes_csv(self):
+        out = StringIO()
+        call_command("export_recipes", "-", format="csv", stdout=out)
+        rows = list(csv.DictReader(StringIO(out.getvalue())))
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(json.loads(rows[1]["ingredients"])[0]["amount"], "2.00")
+        self.assertEqual(rows[5]["cooking_time"], "")
+
+    def test_reads_one_query_per_chunk(self):
+        with CaptureQueriesContext(connection) as queries:
+            call_command("export_recipes", "-", chunk_size=2, stdout=StringIO())
+        # The recipes, then the ingredient lines of each of the 3 chunks
+        self.assertEqual(len(queries), 4)
+
+    def test_view_streams_the_users_recipes(self):
+        digest = store_image(base64.b64decode(TEST_IMAGE))
+        Recipe.objects.filter(title="Soup 1").update(image_hash=digest)
+        self.client.login(username="cook", password="pw")
+
+        response = self.client.get(reverse("recipe:export"))
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        self.assertIn('filename="recipes.jsonl"', response["Content-Disposition"])
+        content = b"".join(response.streaming_content)
+        records = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual([r["title"] for r in records], [f"Soup {i}" for i in range(5)])
+        self.assertEqual(
+            records[1]["image"], f"http://testserver/images/{digest}/full.jpg"
+        )
+
+        response = self.client.get(
+            reverse("recipe:export"), {"format": "csv", "images": "none"}
+        )
+        content = b"".join(response.streaming_content).decode()
+        self.assertEqual(response["Content-Type"], "text/csv")
+        self.assertEqual(len(list(csv.DictReader(StringIO(content)))), 5)
+        self.assertNotIn("full.jpg", content)
+
+        response = self.client.get(reverse("recipe:export"), {"format": "xml"})
+        self.assertEqual(response.status_code, 404)
+
+    def test_view_requires_login(self):
+        response = self.client.get(reverse("recipe:export"))
+        self.assertEqual(response.status_code, 302)
+
+
+class RecipeApiTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(username="cook", password="pw")
+        cls.recipes = []
+        names = [("Tomato Soup", "Tomato"), ("Loaded Nachos", "Jalapeno")]
+        names += [(f"Stew {i}", f"Bean {i}") for i in range(5)]
+        for i, (title, name) in enumerate(names):
+            recipe = Recipe.objects.create(
+                title=title,
+                directions="Cook it.",
+                recipe_type="dinner",
+                cooking_time=10 + i,
+                star_count=i % 5 + 1,
+                user=cls.user,
+            )
+            for amount in (1, 2):
+                recipe.recipe_ingredients.add(
+                    RecipeIngredient.objects.create(
+                        ingredient=Ingredient.objects.get_or_create(name=name)[0],
+                        calorie_content=10,
+                        amount=amount,
+                        amount_type="cup",
+                        cost="1.50",
+                        supplier="Market",
+                        grams=50,
+                    )
+                )
+            cls.recipes.append(recipe)
+        cls.list_url = reverse("recipe:api_recipes")
+
+    def setUp(self):
+        trigram_index.load()
+        self.addCleanup(setattr, trigram_index, "loaded_at", None)
+
+    def get(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response["Content-Type"], "application/json")
+        return response
+
+    def test_list_pages_with_cursors_in_one_query_each(self):
+        titles = []
+        url = self.list_url
+        params = {"limit": 3}
+        while url:
+            with self.assertNumQueries(1):
+                data = self.get(url, **params).json()
+            titles += [recipe["title"] for recipe in data["results"]]
+            url, params = data["next"], {}
+        self.assertEqual(titles, [recipe.title for recipe in self.recipes])
+
+        first = data["results"][0]
+        self.assertEqual(set(first), set(LIST_FIELDS))
+        self.assertEqual(first["url"], f"http://testserver/detail/{first['id']}")
+        self.assertIsNone(first["image"])
+        self.assertIsNotNone(data["previous"])
+
+    def test_sparse_fields_only_load_their_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            data = self.get(self.list_url, fields="id,title", sort="star_count").json()
+        self.assertEqual(set(data["results"][0]), {"id", "title"})
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn("directions", queries[0]["sql"])
+        self.assertEqual(data["results"][0]["title"], "Stew 2")  # 5 stars
+
+        response = self.get(self.list_url, fields="id,pic")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"error": "Unknown fields: pic"})
+
+    def test_ingredients_and_owner_are_prefetched(self):
+        with self.assertNumQueries(2):
+            data = self.get(self.list_url, fields="title,owner,ingredients").json()
+        soup = data["results"][0]
+        self.assertEqual(soup["owner"], "cook")
+        self.assertEqual(
+            soup["ingredients"],
+            [
+                {
+                    "ingredient": "Tomato",
+                    "calorie_content": "10.00",
+                    "amount": amount,
+                    "amount_type": "cup",
+                    "cost": "1.50",
+                    "supplier": "Market",
+                    "grams": "50.00",
+                }
+                for amount in ("1.00", "2.00")
+            ],
+        )
+
+    def test_detail(self):
+        digest = "ab" * 32
+        Recipe.objects.filter(pk=self.recipes[1].pk).update(image_hash=digest)
+        url = reverse("recipe:api_recipe", kwargs={"pk": self.recipes[1].pk})
+        with self.assertNumQueries(2):
+            data = self.get(url).json()
+        self.assertEqual(data["title"], "Loaded Nachos")
+        self.assertEqual(len(data["ingredients"]), 2)
+        self.assertEqual(
+            data["image"]["card"], f"http://testserver/images/{digest}/card.jpg"
+        )
+        self.assertNotIn("base64", json.dumps(data))
+
+        with self.assertNumQueries(1):
+            data = self.get(url, fields="title").json()
+        self.assertEqual(data, {"title": "Loaded Nachos"})
+
+        response = self.get(reverse("recipe:api_recipe", kwargs={"pk": 9999}))
+        self.assertEqual(response.status_code, 404)
+
+    def test_search_is_ranked_with_a_fuzzy_fallback(self):
+        # One lookup on the search index, one query for the page
+        with self.assertNumQueries(2):
+            data = self.get(self.list_url, q="tomato", fields="title").json()
+        self.assertEqual(data["results"], [{"title": "Tomato Soup"}])
+        self.assertIsNone(data["next"])
+        self.assertFalse(data["fuzzy"])
+
+        data = self.get(self.list_url, q="jalepeno", fields="title").json()
+        self.assertEqual(data["results"], [{"title": "Loaded Nachos"}])
+        self.assertTrue(data["fuzzy"])
+
+    def test_etag_answers_not_modified(self):
+        response = self.get(self.list_url)
+        etag = response["ETag"]
+        response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+
+        self.recipes[0].title = "Tomato Bisque"
+        self.recipes[0].save()
+        response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(username="cook", password="pw")
+        CustomUser.objects.create_user(username="guest", password="pw")
+        cls.recipe = Recipe.objects.create(
+            title="Chili",
+            directions="Simmer.",
+            recipe_type="dinner",
+            cooking_time=40,
+            user=cls.user,
+        )
+        cls.line = RecipeIngredient.objects.create(
+            ingredient=Ingredient.objects.create(name="Bean"),
+            calorie_content=10,
+            amount=1,
+            amount_type="cup",
+            cost=1,
+            supplier="Market",
+            grams=100,
+        )
+        cls.recipe.recipe_ingredients.add(cls.line)
+        cls.url = reverse("recipe:detail", kwargs={"pk": cls.recipe.pk})
+
+    def setUp(self):
+        cache.clear()
+
+    def revalidate(self, url, response, **headers):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"], **headers)
+
+    def updated_at(self):
+        return Recipe.objects.values_list("updated_at", flat=True).get(pk=self.recipe.pk)
+
+    @patch("recipe.views.get_chart", return_value="chart")
+    def test_unchanged_detail_page_is_not_rendered_again(self, mock_get_chart):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.has_header("Last-Modified"))
+        self.assertEqual(mock_get_chart.call_count, 3)
+
+        with self.assertNumQueries(1):
+            cached = self.revalidate(self.url, response)
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(mock_get_chart.call_count, 3)
+        cached = self.client.get(
+            self.url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]
+        )
+        self.assertEqual(cached.status_code, 304)
+
+        # Another viewer sees another menu
+        self.client.login(username="guest", password="pw")
+        self.assertEqual(self.revalidate(self.url, response).status_code, 200)
+
+    def test_ingredient_changes_update_the_recipe(self):
+        def add_line():
+            line = {"ingredient": "Corn", "amount_type": "cup", "supplier": "Market"}
+            line.update(calorie_content=1, amount=1, cost=1, grams=10)
+            add_recipe_ingredients(self.recipe, [line])
+
+        def edit_line():
+            self.line.amount = 3
+            self.line.save()
+
+        def rename_ingredient():
+            bean = Ingredient.objects.get(name="Bean")
+            bean.name = "Black Bean"
+            bean.save()
+
+        def remove_line():
+            self.recipe.recipe_ingredients.remove(self.line)
+
+        response = self.client.get(self.url)
+        for change in [add_line, edit_line, rename_ingredient, remove_line]:
+            before = self.updated_at()
+            change()
+            self.assertGreater(self.updated_at(), before, change.__name__)
+            self.assertEqual(self.revalidate(self.url, response).status_code, 200)
+            response = self.client.get(self.url)
+
+    def test_listings_change_when_a_recipe_is_added_or_deleted(self):
+        self.client.login(username="cook", password="pw")
+        for url in [reverse("recipe:home"), reverse("recipe:your_recipes")]:
+            response = self.client.get(url)
+            self.assertFalse(response.has_header("Last-Modified"))
+            self.assertEqual(self.revalidate(url, response).status_code, 304)
+
+            recipe = Recipe.objects.create(
+                title="Salad", directions="Toss.", recipe_type="lunch", user=self.user
+            )
+            response = self.client.get(url)
+            self.assertEqual(self.revalidate(url, response).status_code, 304)
+            recipe.delete()
+            self.assertEqual(self.revalidate(url, response).status_code, 200)
+
+    def test_listing_tags_do_not_query_the_recipes(self):
+        url = reverse("recipe:home")
+        response = self.client.get(url)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.revalidate(url, response).status_code, 304)
+
+    def test_your_recipes_still_requires_login(self):
+        response = self.client.get(reverse("recipe:your_recipes"))
+        self.assertEqual(response.status_code, 302)
+
+
+class PageCacheTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(username="cook", password="pw")
+        CustomUser.objects.create_user(username="admin", password="pw", is_staff=True)
+        cls.chili, cls.soup = [
+            Recipe.objects.create(
+                title=title, directions="Simmer.", recipe_type="dinner", user=cls.user
+            )
+            for title in ["Chili", "Soup"]
+        ]
+        cls.line = RecipeIngredient.objects.create(
+            ingredient=Ingredient.objects.create(name="Bean"),
+            calorie_content=10,
+            amount=1,
+            amount_type="cup",
+            cost=1,
+            supplier="Market",
+            grams=100,
+        )
+        cls.chili.recipe_ingredients.add(cls.line)
+
+    def setUp(self):
+        cache.clear()
+        patcher = patch("recipe.views.get_chart", return_value="chart")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def detail(self, recipe):
+        return self.client.get(reverse("recipe:detail", kwargs={"pk": recipe.pk}))
+
+    def test_repeat_views_are_served_from_the_cache(self):
+        self.client.get(reverse("recipe:home"))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("recipe:home"))
+        self.assertContains(response, "Chili")
+
+        self.detail(self.chili)
+        with self.assertNumQueries(1):  # the ETag and Last-Modified check
+            response = self.detail(self.chili)
+        self.assertContains(response, "Bean")
+        self.assertEqual(response.context["chart1"], "chart")
+
+        stats = cache_stats()
+        self.assertEqual(stats["home"], {"hits": 1, "misses": 1, "hit_rate": 0.5})
+        self.assertEqual(stats["detail"]["hits"], 1)
+        self.assertEqual(stats["ingredients"]["hits"], 1)
+
+    def test_changes_only_drop_the_recipes_they_touch(self):
+        self.detail(self.chili)
+        self.detail(self.soup)
+        self.line.amount = 3
+        self.line.save()
+        self.detail(self.chili)
+        self.detail(self.soup)
+        self.assertEqual(cache_stats()["detail"]["misses"], 3)
+        self.assertEqual(cache_stats()["detail"]["hits"], 1)
+
+        self.soup.title = "Winter Soup"
+        self.soup.save()
+        self.assertContains(self.detail(self.soup), "Winter Soup")
+        self.assertContains(self.client.get(reverse("recipe:home")), "Winter Soup")
+
+    def test_search_results_follow_new_recipes(self):
+        search = {"search_mode": "#2", "search": "stew"}
+        response = self.client.get(reverse("recipe:search"), search)
+        self.assertEqual(len(response.context["page_obj"]), 0)
+        self.client.get(reverse("recipe:search"), search)
+        self.assertEqual(cache_stats()["search"]["hits"], 1)
+
+        Recipe.objects.create(
+            title="Bean Stew", directions="Stew.", recipe_type="dinner", user=self.user
+        )
+        response = self.client.get(reverse("recipe:search"), search)
+        self.assertEqual([r.title for r in response.context["page_obj"]], ["Bean Stew"])
+
+    def test_stats_are_for_staff(self):
+        url = reverse("recipe:cache_stats")
+        self.client.get(reverse("recipe:home"))
+        self.client.login(username="cook", password="pw")
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+        self.client.login(username="admin", password="pw")
+        self.assertEqual(self.client.get(url).json()["home"]["misses"], 1)
+
+        out = StringIO()
+        call_command("cache_stats", reset=True, stdout=out)
+        self.assertIn("home: 0 hits, 1 misses", out.getvalue())
+        self.assertEqual(cache_stats()["home"]["misses"], 0)
+
+
+class RecipeRollupTest(IngredientCacheTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(username="cook", password="pw")
+        cls.recipe = Recipe.objects.create(
+            title="Chili",
+            directions="Simmer.",
+            recipe_type="dinner",
+            servings=4,
+            user=cls.user,
+        )
+
+    def line(self, name, calories, grams, cost):
+        return RecipeIngredient.objects.create(
+            ingredient=Ingredient.objects.get_or_create(name=name)[0],
+            calorie_content=calories,
+            amount=1,
+            amount_type="cup",
+            cost=cost,
+            supplier="Market",
+            grams=grams,
+        )
+
+    def assertRollups(self, recipe, count, calories, grams, cost, per_serving):
+        recipe = Recipe.objects.get(pk=recipe.pk)
+        self.assertEqual(
+            (
+                recipe.ingredient_count,
+                recipe.total_calories,
+                recipe.total_grams,
+                recipe.total_cost,
+                recipe.cost_per_serving,
+            ),
+            (count, Decimal(calories), Decimal(grams), Decimal(cost), per_serving),
+        )
+
+    def test_totals_follow_the_ingredient_lines(self):
+        self.assertRollups(self.recipe, 0, 0, 0, 0, Decimal("0.00"))
+        bean = self.line("Bean", 100, 200, "2.50")
+        self.recipe.recipe_ingredients.add(bean)
+        self.assertRollups(self.recipe, 1, 100, 200, "2.50", Decimal("0.63"))
+
+        RecipeIngredientIntermediary.objects.create(
+            recipe=self.recipe, recipe_ingredient=self.line("Corn", 50, 80, "1.50")
+        )
+        line = {"ingredient": "Lime", "amount_type": "each", "supplier": "Market"}
+        line.update(calorie_content=5, amount=1, cost=Decimal("0.99"), grams=30)
+        add_recipe_ingredients(self.recipe, [line])
+        self.assertRollups(self.recipe, 3, 155, 310, "4.99", Decimal("1.25"))
+
+        bean.cost = 4
+        bean.save()
+        self.assertRollups(self.recipe, 3, 155, 310, "6.49", Decimal("1.62"))
+        self.recipe.recipe_ingredients.remove(bean)
+        self.assertRollups(self.recipe, 2, 55, 110, "2.49", Decimal("0.62"))
+        RecipeIngredient.objects.get(ingredient__name="Corn").delete()
+        self.assertRollups(self.recipe, 1, 5, 30, "0.99", Decimal("0.25"))
+        self.recipe.recipe_ingredients.clear()
+        self.assertRollups(self.recipe, 0, 0, 0, 0, Decimal("0.00"))
+
+    def test_saving_a_recipe_keeps_its_totals(self):
+        stale = Recipe.objects.get(pk=self.recipe.pk)
+        self.recipe.recipe_ingredients.add(self.line("Bean", 100, 200, 9))
+        stale.servings = 2
+        stale.save()
+        self.assertRollups(self.recipe, 1, 100, 200, 9, Decimal("4.50"))
+        stale.servings = None
+        stale.save()
+        self.assertRollups(self.recipe, 1, 100, 200, 9, None)
+
+    def test_imported_recipes_have_totals(self):
+        record = {"title": "Salsa", "directions": "Chop.", "recipe_type": "snack"}
+        record["servings"] = 3
+        record["ingredients"] = [
+            {"ingredient": name, "amount_type": "cup", "calorie_content": 10}
+            | {"amount": 1, "cost": "1.25", "grams": 40}
+            for name in ["Tomato", "Onion"]
+        ]
+        RecipeImporter(self.user).run([(1, json.dumps(record))])
+        salsa = Recipe.objects.get(title="Salsa")
+        self.assertRollups(salsa, 2, 20, 80, "2.50", Decimal("0.83"))
+
+    def test_listings_sort_and_filter_on_the_totals(self):
+        for i, cost in enumerate([3, 1, 2, 5, 4]):
+            recipe = Recipe.objects.create(
+                title=f"Stew {i}",
+                directions="Stew.",
+                recipe_type="dinner",
+                servings=2,
+                user=self.user,
+            )
+            recipe.recipe_ingredients.add(self.line(f"Bean {i}", 10, 10, cost))
+
+        titles, cursor = [], ""
+        while cursor is not None:
+            response = self.client.get(
+                reverse("recipe:home"), {"sort": "cost_per_serving", "cursor": cursor}
+            )
+            titles += [recipe.title for recipe in response.context["page_obj"]]
+            cursor = response.context["page_obj"].next_cursor
+        expected = ["Chili", "Stew 1", "Stew 2", "Stew 0", "Stew 4", "Stew 3"]
+        self.assertEqual(titles, expected)
+
+        response = self.client.get(
+            reverse("recipe:api_recipes"),
+            {"sort": "total_cost", "max_cost": "3", "fields": "title,total_cost"},
+        )
+        self.assertEqual(
+            response.json()["results"],
+            [
+                {"title": "Chili", "total_cost": "0.00"},
+                {"title": "Stew 1", "total_cost": "1.00"},
+                {"title": "Stew 2", "total_cost": "2.00"},
+                {"title": "Stew 0", "total_cost": "3.00"},
+            ],
+        )
+        response = self.client.get(reverse("recipe:api_recipes"), {"max_cost": "x"})
+        self.assertEqual(response.status_code, 400)
+
+
+class RecipeScalingTest(RecipeTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.recipe = cls.create_recipe(
+            "Pancakes",
+            4,
+            [
+                recipe_line(
+                    "Flour",
+                    amount=Decimal("1.5"),
+                    amount_type="cup",
+                    calorie_content=680,
+                    grams="190.00",
+                    cost="0.75",
+                ),
+                recipe_line("Egg", amount=2, calorie_content=140, cost="0.99"),
+            ],
+            directions="Whisk and fry.",
+            recipe_type="breakfast",
+            yield_amount=12,
+        )
+        cls.url = reverse("recipe:detail", kwargs={"pk": cls.recipe.pk})
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def test_scales_every_line_and_the_totals(self):
+        recipe = with_ingredients(Recipe.objects.all()).get(pk=self.recipe.pk)
+        scaled = scale_recipe(recipe, 6)
+        self.assertEqual(
+            [
+                (line["ingredient"], line["amount"], line["grams"], line["cost"])
+                for line in scaled["lines"]
+            ],
+            [
+                ("Flour", Decimal("2.25"), Decimal("285.00"), Decimal("1.13")),
+                ("Egg", Decimal("3.00"), Decimal("150.00"), Decimal("1.49")),
+            ],
+        )
+        self.assertEqual(scaled["yield_amount"], Decimal("18.00"))
+        self.assertEqual(scaled["total_calories"], Decimal("1230.00"))
+        self.assertEqual(scaled["total_cost"], Decimal("2.62"))
+        self.assertEqual(scaled["cost_per_serving"], Decimal("0.44"))
+
+        recipe.servings = None
+        with self.assertRaises(ScalingError):
+            scale_recipe(recipe, 6)
+        for value in ("0", "two", str(MAX_SERVINGS + 1)):
+            with self.assertRaises(ScalingError):
+                parse_servings(value)
+
+    def test_detail_page_shows_the_scaled_recipe(self):
+        response = self.client.get(self.url, {"servings": 8})
+        self.assertContains(response, "Flour - 3.00 cup")
+        self.assertContains(response, "8 (scaled from 4)")
+        self.assertContains(response, "380.00")
+        self.assertEqual(response.context["totals"]["total_grams"], Decimal("580.00"))
+
+        response = self.client.get(self.url, {"servings": "lots"})
+        self.assertContains(response, "servings must be a whole number")
+        self.assertContains(response, "Flour - 1.50 cup")
+
+    def test_scaled_charts_are_cached_per_number_of_servings(self):
+        with patch("recipe.views.get_chart", return_value="chart") as get_chart:
+            self.client.get(self.url, {"servings": 8})
+            self.client.get(self.url, {"servings": 8})
+            self.assertEqual(get_chart.call_count, 3)
+            self.client.get(self.url, {"servings": 2})
+            self.client.get(self.url)
+            self.assertEqual(get_chart.call_count, 9)
+        chart_format = settings.RECIPE_CHART_FORMAT
+        key = chart_cache_key(self.recipe.pk, chart_format, servings=8)
+        self.assertIsNotNone(cache.get(key))
+
+        # Edited lines are plotted again at every scale
+        item = RecipeIngredient.objects.get(ingredient__name="Egg")
+        item.grams = 120
+        item.save()
+        with patch("recipe.views.get_chart", return_value="chart") as get_chart:
+            self.client.get(self.url, {"servings": 8})
+            self.assertEqual(get_chart.call_count, 3)
+
+    def test_api_scales_the_recipe(self):
+        url = reverse("recipe:api_recipe", kwargs={"pk": self.recipe.pk})
+        fields = "title,servings,total_cost,ingredients"
+        response = self.client.get(url, {"servings": 2, "fields": fields})
+        data = response.json()
+        self.assertEqual(data["servings"], 2)
+        self.assertEqual(data["total_cost"], "0.88")
+        self.assertEqual(
+            [(line["ingredient"], line["amount"]) for line in data["ingredients"]],
+            [("Flour", "0.75"), ("Egg", "1.00")],
+        )
+
+        response = self.client.get(url, {"servings": 0})
+        self.assertEqual(response.status_code, 400)
+        Recipe.objects.filter(pk=self.recipe.pk).update(servings=None)
+        response = self.client.get(url, {"servings": 2})
+        self.assertEqual(response.status_code, 400)
+
+
+class ShoppingListTest(RecipeTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.soup = cls.recipe(
+            "Soup",
+            4,
+            [
+                ("Milk", 1, "cup", "Market", 100, 244, "1.00"),
+                ("Onion", 2, "each", "Market", 80, 220, "1.00"),
+            ],
+        )
+        cls.pie = cls.recipe(
+            "Pie",
+            2,
+            [
+                ("milk", 2, "tablespoon", "Market", 20, 30, "0.25"),
+                ("Onion", 1, "each", "Farm", 40, 110, "0.60"),
+            ],
+        )
+        cls.salad = cls.recipe(
+            "Salad", None, [("Lettuce", 1, "each", "Market", 15, 300, "1.50")]
+        )
+        cls.url = reverse("recipe:api_shopping_list")
+
+    @classmethod
+    def recipe(cls, title, servings, lines):
+        fields = ["amount", "amount_type", "supplier", "calorie_content", "grams", "cost"]
+        lines = [recipe_line(name, **dict(zip(fields, values))) for name, *values in lines]
+        return cls.create_recipe(title, servings, lines)
+
+    def test_merges_normalized_amounts_per_ingredient_and_supplier(self):
+        entries = parse_recipe_list(f"{self.soup.pk}:8, {self.pie.pk},{self.salad.pk}")
+        with self.assertNumQueries(2):
+            shopping = build_shopping_list(entries)
+
+        self.assertEqual(
+            [(r["title"], r["servings"]) for r in shopping["recipes"]],
+            [("Soup", 8), ("Pie", 2), ("Salad", None)],
+        )
+        self.assertEqual(
+            [
+                (i["ingredient"], i["supplier"], i["amount"], i["unit"], i["cost"])
+                for i in shopping["items"]
+            ],
+            [
+                ("Lettuce", "Market", Decimal("1.00"), "each", Decimal("1.50")),
+                # A cup and two tablespoons of milk, by weight
+                ("Milk", "Market", Decimal("517.83"), "gram", Decimal("2.25")),
+                ("Onion", "Farm", Decimal("1.00"), "each", Decimal("0.60")),
+                ("Onion", "Market", Decimal("4.00"), "each", Decimal("2.00")),
+            ],
+        )
+        milk = shopping["items"][1]
+        self.assertEqual(milk["recipes"], [self.soup.pk, self.pie.pk])
+        self.assertEqual((milk["calories"], milk["grams"]), (220, 518))
+        self.assertEqual(
+            shopping["totals"],
+            {
+                "calories": Decimal("435.00"),
+                "grams": Decimal("1368.00"),
+                "cost": Decimal("6.35"),
+                "suppliers": {"Farm": Decimal("0.60"), "Market": Decimal("5.75")},
+            },
+        )
+
+    def test_query_count_does_not_grow_with_the_plan(self):
+        beef = ("Beef", 1, "pound", "Butcher", 900, 454, "6")
+        recipes = [self.recipe(f"Stew {i}", 2, [beef]) for i in range(30)]
+        recipe_list = ",".join(f"{recipe.pk}:4" for recipe in recipes)
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url, {"recipes": recipe_list})
+        [beef] = response.json()["items"]
+        self.assertEqual((beef["amount"], beef["unit"]), ("27215.54", "gram"))
+        self.assertEqual(beef["cost"], "360.00")
+
+    def test_bad_recipe_lists(self):
+        too_many = ",".join([str(self.soup.pk)] * (MAX_SHOPPING_RECIPES + 1))
+        for recipe_list in ["", "soup", f"{self.soup.pk}:0", "9999", too_many]:
+            response = self.client.get(self.url, {"recipes": recipe_list})
+            self.assertEqual(response.status_code, 400, recipe_list)
+        response = self.client.get(self.url, {"recipes": f"{self.salad.pk}:2"})
+        self.assertEqual(
+            response.json(), {"error": "Salad has no servings to scale from"}
+        )
+
+
 class RecipeFormTests(TestCase):
     def test_form_save(self):
         User = get_user_model()
         self.user = User.objects.create_user(
             username="testuser", email="testuser@example.com", password="testpassword"
         )
-        fake_image_data = (
-            b"Fake image data"  # Replace this with your actual image binary data
-        )
-        fake_base64_image = base64.b64encode(fake_image_data).decode("utf-8")
-
-        # Generate an <img> tag with the fake base64-encoded image data as the src attribute
-        fake_img_tag = (
-            f'<img src="data:image/jpeg;base64,{fake_base64_image}" width="200px">'
-        )
-
         form_data = {
             "title": "Test Recipe",
             "directions": "afraefegseg",
@@ -592,9 +2748,8 @@ class RecipeFormTests(TestCase):
             "yield_amount": 6,
             "allergens": "Dairy, Nuts",
             "small_desc": "Test description",
-            "image": None,  # Use the generated <img> tag with base64-encoded data
-            "base64_string": fake_img_tag,
-            "pic": fake_img_tag,
+            "image": None,
+            "base64_string": make_base64_image(),
         }
         # Create an instance of the form with the form data
         form = RecipeForm(data=form_data)
@@ -615,6 +2770,24 @@ class RecipeFormTests(TestCase):
         self.assertEqual(recipe.yield_amount, cleaned_data["yield_amount"])
         self.assertEqual(recipe.allergens, cleaned_data["allergens"])
         self.assertEqual(recipe.small_desc, cleaned_data["small_desc"])
+        self.assertTrue(form.image_data.startswith(b"\xff\xd8"))
+
+    def test_form_rejects_data_that_is_not_an_image(self):
+        fake_base64_image = base64.b64encode(b"Fake image data").decode("utf-8")
+        form = RecipeForm(
+            data={
+                "title": "Test Recipe",
+                "directions": "afraefegseg",
+                "cooking_time": 30,
+                "star_count": 4,
+                "recipe_type": "breakfast",
+                "servings": 4,
+                "small_desc": "Test description",
+                "base64_string": fake_base64_image,
+            }
+        )
+        self.assertFalse(form.is_valid())
+        self.assertIn("base64_string", form.errors)
 
 
 class RecipeIngredientIntermediaryFormTest(TestCase):
@@ -674,7 +2847,6 @@ class RecipeDeleteViewTest(TestCase):
             yield_amount=6,
             allergens="Dairy, Nuts",
             small_desc="Test description",
-            pic="no_picture.jpg",
             user=self.user,
         )
         self.url = reverse("recipe:delete", args=[self.recipe.pk])
@@ -714,7 +2886,6 @@ class RecipeIngredientDeleteViewTest(TestCase):
             yield_amount=6,
             allergens="Dairy, Nuts",
             small_desc="Test description",
-            pic="no_picture.jpg",
             user=self.user,
         )
 
@@ -804,7 +2975,6 @@ class RecipeEditFormTest(TestCase):
             yield_amount=6,
             allergens="Dairy, Nuts",
             small_desc="Test description",
-            pic="no_picture.jpg",
             user=self.user,
         )
 
@@ -812,7 +2982,7 @@ class RecipeEditFormTest(TestCase):
         # Populate form data with the recipe's existing data
         form_data = {
             "image": None,
-            "base64_string": "fdfxgxfgfgxfgxfgxfgxfg",
+            "base64_string": TEST_IMAGE,
             "title": self.recipe.title,
             "directions": self.recipe.directions,
             "cooking_time": self.recipe.cooking_time,
@@ -823,7 +2993,6 @@ class RecipeEditFormTest(TestCase):
             "yield_amount": self.recipe.yield_amount,
             "allergens": self.recipe.allergens,
             "small_desc": self.recipe.small_desc,
-            "pic": self.recipe.pic,
         }
 
         # Create a form instance with the above data and the recipe instance
@@ -833,7 +3002,7 @@ class RecipeEditFormTest(TestCase):
         self.assertTrue(form.is_valid())
 
         # Check if the cleaned_data['base64_string'] is equal to the submitted data
-        self.assertEqual(form.cleaned_data["base64_string"], "fdfxgxfgfgxfgxfgxfgxfg")
+        self.assertEqual(form.cleaned_data["base64_string"], TEST_IMAGE)
 
     def test_clean_base64_string_with_empty_pic(self):
         # Populate form data with the recipe's existing data, but with an empty pic
@@ -850,7 +3019,6 @@ class RecipeEditFormTest(TestCase):
             "yield_amount": self.recipe.yield_amount,
             "allergens": self.recipe.allergens,
             "small_desc": self.recipe.small_desc,
-            "pic": "",
         }
 
         # Create a form instance with the above data and the recipe instance
@@ -859,12 +3027,17 @@ class RecipeEditFormTest(TestCase):
         # Validate the form
         self.assertTrue(form.is_valid())
 
-        # Check if the cleaned_data['base64_string'] is equal to the 'pic' field
+        # An empty base64_string keeps the current picture
         self.assertEqual(form.cleaned_data["base64_string"], "")
+        self.assertIsNone(form.image_data)
 
 
 class RecipeEditViewTest(TestCase):
     def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+
         User = get_user_model()
         self.user = User.objects.create_user(
             username="testuser", email="testuser@example.com", password="testpassword"
@@ -880,7 +3053,6 @@ class RecipeEditViewTest(TestCase):
             yield_amount=6,
             allergens="Dairy, Nuts",
             small_desc="Test description",
-            pic="no_picture.jpg",
             user=self.user,
         )
         self.client.login(username="testuser", password="testpassword")
@@ -899,7 +3071,7 @@ class RecipeEditViewTest(TestCase):
             "allergens": "Gluten",
             "small_desc": "New description",
             "image": "fake.jpg",
-            "base64_string": "new_base64_data",
+            "base64_string": TEST_IMAGE,
         }
 
         url = reverse("recipe:edit", kwargs={"pk": self.recipe.pk})
@@ -914,5 +3086,132 @@ class RecipeEditViewTest(TestCase):
         self.assertEqual(updated_recipe.directions, "New directions")
         # ... Check other fields ...
 
-        # Check if the pic field is updated
-        self.assertEqual(updated_recipe.pic, "new_base64_data")
+        # Check that the picture went to the image store
+        digest = hashlib.sha256(base64.b64decode(TEST_IMAGE)).hexdigest()
+        self.assertEqual(updated_recipe.image_hash, digest)
+        for variant in IMAGE_VARIANTS:
+            self.assertTrue(default_storage.exists(image_path(digest, variant)))
+
+    def test_recipe_edit_view_keeps_picture_when_none_uploaded(self):
+        self.recipe.image_hash = store_image(base64.b64decode(TEST_IMAGE))
+        self.recipe.save()
+        form_data = {
+            "title": "New Title",
+            "directions": "New directions",
+            "cooking_time": 45,
+            "star_count": 5,
+            "recipe_type": "lunch",
+            "servings": 6,
+            "small_desc": "New description",
+            "base64_string": "",
+        }
+        url = reverse("recipe:edit", kwargs={"pk": self.recipe.pk})
+        response = self.client.post(url, form_data)
+        self.assertEqual(response.status_code, 302)
+        updated_recipe = Recipe.objects.get(pk=self.recipe.pk)
+        self.assertEqual(updated_recipe.image_hash, self.recipe.image_hash)
+
+
+class ImageStoreTest(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+
+    def test_store_image_creates_bounded_thumbnails(self):
+        digest = store_image(base64.b64decode(make_base64_image(size=(1200, 900))))
+        for variant, (width, height) in IMAGE_VARIANTS.items():
+            with default_storage.open(image_path(digest, variant)) as stored:
+                image = Image.open(stored)
+                self.assertLessEqual(image.width, width)
+                self.assertLessEqual(image.height, height)
+        with default_storage.open(image_path(digest, "row")) as stored:
+            self.assertEqual(Image.open(stored).size, (200, 150))
+
+    def test_store_image_is_content_addressed(self):
+        data = base64.b64decode(TEST_IMAGE)
+        digest = store_image(data)
+        self.assertEqual(store_image(data), digest)
+        listing = default_storage.listdir(f"recipe/images/{digest[:2]}/{digest}")[1]
+        self.assertEqual(sorted(listing), sorted(f"{v}.jpg" for v in IMAGE_VARIANTS))
+
+    def test_decode_base64_image_accepts_data_urls(self):
+        data = decode_base64_image(f"data:image/jpeg;base64,{TEST_IMAGE}")
+        self.assertEqual(data, base64.b64decode(TEST_IMAGE))
+        with self.assertRaises(ValueError):
+            decode_base64_image("not base64!")
+
+    def test_image_view_serves_cacheable_thumbnails(self):
+        digest = store_image(base64.b64decode(TEST_IMAGE))
+        url = reverse("recipe:image", kwargs={"digest": digest, "variant": "card"})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "image/jpeg")
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertTrue(b"".join(response.streaming_content).startswith(b"\xff\xd8"))
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+    def test_image_view_unknown_image(self):
+        for digest, variant in [("0" * 64, "card"), ("abc", "card"), ("0" * 64, "x")]:
+            url = reverse("recipe:image", kwargs={"digest": digest, "variant": variant})
+            self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class RecipePicMigrationTest(TransactionTestCase):
+    migrate_from = [("recipe", "0020_recipe_keyset_indexes")]
+    migrate_to = [("recipe", "0021_recipe_image_hash")]
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+
+    def tearDown(self):
+        call_command("migrate", verbosity=0)
+
+    def test_base64_pics_move_to_the_image_store(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.migrate_from)
+        apps = executor.loader.project_state(self.migrate_from).apps
+        user = CustomUser.objects.create_user(username="migrationuser")
+        OldRecipe = apps.get_model("recipe", "Recipe")
+        fields = {"directions": "d", "recipe_type": "snack", "user_id": user.pk}
+        OldRecipe.objects.create(title="With picture", pic=TEST_IMAGE, **fields)
+        OldRecipe.objects.create(title="Broken picture", pic="no_picture.jpg", **fields)
+
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(self.migrate_to)
+        apps = executor.loader.project_state(self.migrate_to).apps
+        NewRecipe = apps.get_model("recipe", "Recipe")
+
+        digest = hashlib.sha256(base64.b64decode(TEST_IMAGE)).hexdigest()
+        self.assertEqual(NewRecipe.objects.get(title="With picture").image_hash, digest)
+        self.assertEqual(NewRecipe.objects.get(title="Broken picture").image_hash, "")
+        self.assertTrue(default_storage.exists(image_path(digest, "card")))
+
+        # Rolled back, the stored pictures return as base64 and the rest empty
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.migrate_from)
+        apps = executor.loader.project_state(self.migrate_from).apps
+        OldRecipe = apps.get_model("recipe", "Recipe")
+        with default_storage.open(image_path(digest, "full")) as image:
+            pic = base64.b64encode(image.read()).decode("utf-8")
+        self.assertEqual(OldRecipe.objects.get(title="With picture").pic, pic)
+        self.assertEqual(OldRecipe.objects.get(title="Broken picture").pic, "")
+
+
+class StartupImportTest(TestCase):
+    def test_worker_start_up_skips_the_analytics_stack(self):
+        # A fresh interpreter importing the WSGI app and every view
+        startup = measure_startup()
+        self.assertEqual(startup["heavy"], [])
+        self.assertGreater(startup["wsgi_ms"], 0)
+
+    def test_command_reports_start_up_time(self):
+        out = StringIO()
+        call_command("startup_time", repeat=1, stdout=out)
+        self.assertIn("best of 1: wsgi", out.getvalue())
+        self.assertIn("heavy modules loaded at start up: none", out.getvalue())
@@ -1,4 +1,5 @@
 from django.urls import path
+from .api import RecipeDetailApiView, RecipeListApiView, ShoppingListApiView
 from .views import YourRecipesView
 from .views import RecipeDetailView
 from .views import RecipeHome
@@ -6,9 +7,14 @@ from .views import RecipeSearchView
 from .views import (
     RecipeCreateView,
     IngredientAddView,
+    IngredientBulkAddView,
     RecipeDeleteView,
     RecipeIngredientDeleteView,
     RecipeEditView,
+    RecipeExportView,
+    recipe_image,
+    autocomplete,
+    cache_stats_view,
 )
 
 app_name = "recipe"
@@ -19,10 +25,16 @@ urlpatterns = [
     path("your_recipes/", YourRecipesView.as_view(), name="your_recipes"),
     path("detail/<pk>", RecipeDetailView.as_view(), name="detail"),
     path("search/", RecipeSearchView.as_view(), name="search"),
+    path("autocomplete/", autocomplete, name="autocomplete"),
     path("create/", RecipeCreateView.as_view(), name="create"),
     path(
         "add_ingredient/<int:pk>/", IngredientAddView.as_view(), name="add_ingredient"
     ),
+    path(
+        "add_ingredients/<int:pk>/",
+        IngredientBulkAddView.as_view(),
+        name="add_ingredients",
+    ),
     path("delete/<int:pk>/", RecipeDeleteView.as_view(), name="delete"),
     path(
         "delete_ingredient/<int:pk>/<str:ingredient>/",
@@ -30,4 +42,10 @@ urlpatterns = [
         name="delete_ingredient",
     ),
     path("edit/<int:pk>/", RecipeEditView.as_view(), name="edit"),
+    path("export/", RecipeExportView.as_view(), name="export"),
+    path("api/recipes/", RecipeListApiView.as_view(), name="api_recipes"),
+    path("api/recipes/<int:pk>/", RecipeDetailApiView.as_view(), name="api_recipe"),
+    path("api/shopping-list/", ShoppingListApiView.as_view(), name="api_shopping_list"),
+    path("cache-stats/", cache_stats_view, name="cache_stats"),
+    path("images/<str:digest>/<str:variant>.jpg", recipe_image, name="image"),
 ]
@@ -1,8 +1,17 @@
-from recipe.models import Recipe  # you need to connect parameters from books model
-from io import BytesIO
-import base64
-import matplotlib.pyplot as plt
-import numpy as np
+from decimal import Decimal
+from django.db import transaction
+from ingredient.models import Ingredient, normalize_name
+from recipe.models import Recipe, touch_recipes  # you need to connect parameters from books model
+from recipeingredient.models import RecipeIngredient
+from recipeingredient.units import grams_for_lines
+from recipeingredientintermediary.models import RecipeIngredientIntermediary
+from .caching import invalidate_recipes
+from .rollups import add_lines_to_rollups
+from .charts import chart_renderer, invalidate_recipe_charts, svg_chart_renderer
+from .search import index_recipes
+from .signals import index_new_ingredients
+
+INGREDIENT_TABLE_COLUMNS = ["Ingredient", "Calorie Content", "Grams", "Cost"]
 
 
 # define a function that takes the ID
@@ -13,104 +22,135 @@ def get_recipe_from_title(val):
     return recipe_title
 
 
-def get_graph():
-    # create a BytesIO buffer for the image
-    buffer = BytesIO()
-
-    # create a plot with a bytesIO object as a file-like object. Set format to png
-    plt.savefig(buffer, format="png")
-
-    # set cursor to the beginning of the stream
-    buffer.seek(0)
-
-    # retrieve the content of the file
-    image_png = buffer.getvalue()
-
-    # encode the bytes-like object
-    graph = base64.b64encode(image_png)
-
-    # decode to get the string as output
-    graph = graph.decode("utf-8")
-
-    # free up the memory of buffer
-    buffer.close()
-
-    # return the image/graph
-    return graph
+def get_ingredient_rows(recipe):
+    # (id, name, calories, grams, cost) for each of the recipe's ingredients
+    if "recipe_ingredients" in getattr(recipe, "_prefetched_objects_cache", {}):
+        return [
+            (item.pk, item.ingredient.name, item.calorie_content, item.grams, item.cost)
+            for item in sorted(recipe.recipe_ingredients.all(), key=lambda item: item.pk)
+        ]
+    return list(
+        recipe.recipe_ingredients.order_by("pk").values_list(
+            "pk", "ingredient__name", "calorie_content", "grams", "cost"
+        )
+    )
+
+
+def get_ingredient_table(rows):
+    # Build the table column by column from the rows, with numeric costs
+    import pandas as pd  # loaded on first use to keep worker start up light
+
+    _, names, calories, grams, costs = zip(*rows)
+    return pd.DataFrame(
+        {
+            "Ingredient": names,
+            "Calorie Content": [float(value) for value in calories],
+            "Grams": [float(value) for value in grams],
+            "Cost": [float(value) for value in costs],
+        },
+        columns=INGREDIENT_TABLE_COLUMNS,
+    )
 
 
 # chart_type: user input o type of chart,
-# data: pandas dataframe
-def get_chart(chart_type, data, **kwargs):
-    # switch plot backend to AGG (Anti-Grain Geometry) - to write to file
-    # AGG is preferred solution to write PNG files
-    plt.switch_backend("AGG")
-
-    # Set the default style for the plot
-    plt.rcParams["axes.facecolor"] = "lightgray"
-    plt.rcParams["text.color"] = "#632623"
-
-    # specify figure size
-    fig = plt.figure(figsize=(12, 6), facecolor="#2ac549")
-
-    # select chart_type based   on user input from the form
-    if chart_type == "#1":
-        plt.title("Calorie Content per Ingredient", pad=26)
-        plt.bar(
-            data.index, data["Calorie Content"], label="Calorie Content"
-        )  # Add label
-        plt.xlabel("Ingredient", color="#632623")
-        plt.ylabel("Calories", color="#632623")
-        plt.legend()  # This will now show the legend with the "Calorie Content" label.
-
-    elif chart_type == "#2":
-        plt.title("Grams per Ingredient", pad=26)
-        plt.plot(data.index, data["Grams"], label="Grams")  # Add label
-        plt.xlabel("Ingredient", color="#632623")
-        plt.ylabel("Grams", color="#632623")
-        plt.legend()  # This will now show the legend with the "Grams" label.
-
-    elif chart_type == "#3":
-        plt.title("Cost per Ingredient", pad=36)
-
-        # Remove the dollar sign from the "Cost" string
-        data["Cost"] = data["Cost"].str.replace("$", "")
-
-        # Convert the "Cost" column to numeric values
-        data["Cost"] = data["Cost"].astype(float)
-
-        # Create the pie chart and store the patches (slices) and text labels
-        patches, _, _ = plt.pie(data["Cost"], labels=None, autopct="%1.1f%%")
-
-        # Add ingredient name and cost amount to each slice as text labels
-        for patch, cost, ingredient in zip(patches, data["Cost"], data.index):
-            label = (
-                f"{ingredient}\n${cost:.2f}"  # Display ingredient name and cost amount
-            )
-
-            # Calculate the angle of the slice
-            angle = (patch.theta2 - patch.theta1) / 2.0 + patch.theta1
-
-            # Calculate the position of the label outside the pie chart
-            x = patch.r * 1.4 * np.cos(np.deg2rad(angle))
-            y = patch.r * 1.2 * np.sin(np.deg2rad(angle))
-
-            plt.text(
-                x,
-                y,
-                label,
-                ha="center",
-                va="center",
-                fontsize=8,
-            )
-
-        plt.axis("equal")  # Equal aspect ratio ensures that pie is drawn as a circle
-    else:
+# data: pandas dataframe with an "Ingredient" column (see get_ingredient_table)
+# chart_format: "png" for a base64 encoded png, "svg" for inline svg markup
+def get_chart(chart_type, data, chart_format="png", **kwargs):
+    # The column each chart type plots against the ingredient names
+    columns = {"#1": "Calorie Content", "#2": "Grams", "#3": "Cost"}
+    if chart_type not in columns:
         print("unknown chart type")
-
-    # specify layout details
-    plt.tight_layout()
-
-    # render the graph to file
-    chart = get_graph()
-    return chart
+        return ""
+
+    labels = data["Ingredient"].tolist()
+    values = data[columns[chart_type]].astype(float).tolist()
+
+    if chart_format == "svg":
+        return svg_chart_renderer.render(chart_type, labels, values)
+
+    # render the graph to a base64 encoded png
+    return chart_renderer.render_base64(chart_type, labels, values)
+
+
+# Fields of an ingredient line besides the ingredient name
+INGREDIENT_LINE_FIELDS = [
+    "calorie_content",
+    "amount",
+    "amount_type",
+    "cost",
+    "supplier",
+    "grams",
+]
+
+
+def add_recipe_ingredients(recipe, lines):
+    """
+    Add ingredient lines (dicts with "ingredient" and INGREDIENT_LINE_FIELDS)
+    to a recipe in one transaction: names are resolved together and the
+    RecipeIngredient and intermediary rows are written with bulk_create.
+    """
+    lines = list(lines)
+    if not lines:
+        return []
+    with transaction.atomic():
+        recipe_ingredients = create_ingredient_lines([(recipe, line) for line in lines])
+        # bulk_create skips the signals, so refresh the totals and search row here
+        add_lines_to_rollups(recipe.pk, lines)
+        index_recipes([recipe.pk])
+        touch_recipes([recipe.pk])
+        invalidate_recipes([recipe.pk])
+    invalidate_recipe_charts(recipe.pk)
+    return recipe_ingredients
+
+
+# RecipeIngredient.grams, DecimalField(max_digits=8, decimal_places=2)
+GRAMS_LIMIT = Decimal("1000000")
+
+
+def derive_grams(lines):
+    """
+    Fill in the missing "grams" of ingredient lines (dicts with "ingredient",
+    "amount" and "amount_type") from their amount, converted with the unit
+    tables and the ingredient's density, all in one batch. Returns the lines
+    whose weight cannot be worked out, such as "each" amounts.
+    """
+    missing = [line for line in lines if line.get("grams") is None]
+    if not missing:
+        return []
+    densities = Ingredient.objects.densities_for_names(
+        line["ingredient"] for line in missing
+    )
+    grams = grams_for_lines(
+        [line["amount"] for line in missing],
+        [line["amount_type"] for line in missing],
+        [densities[normalize_name(line["ingredient"])] for line in missing],
+    )
+    failed = []
+    for line, value in zip(missing, grams):
+        if value is None or value >= GRAMS_LIMIT:
+            failed.append(line)
+        else:
+            line["grams"] = value
+    return failed
+
+
+def create_ingredient_lines(recipe_lines):
+    # Write (recipe, line) pairs with one bulk insert per table, resolving all
+    # the ingredient names together. Run inside a transaction; the search
+    # index is left to the caller.
+    ingredient_ids, created = Ingredient.objects.ids_for_names(
+        line["ingredient"] for _, line in recipe_lines
+    )
+    index_new_ingredients(created)
+    recipe_ingredients = RecipeIngredient.objects.bulk_create(
+        RecipeIngredient(
+            ingredient_id=ingredient_ids[normalize_name(line["ingredient"])],
+            **{field: line[field] for field in INGREDIENT_LINE_FIELDS},
+        )
+        for _, line in recipe_lines
+    )
+    RecipeIngredientIntermediary.objects.bulk_create(
+        RecipeIngredientIntermediary(recipe_id=recipe.pk, recipe_ingredient_id=item.pk)
+        for (recipe, _), item in zip(recipe_lines, recipe_ingredients)
+    )
+    return recipe_ingredients
@@ -1,5 +1,8 @@
 import json
-from django.views.generic import ListView, DetailView, FormView
+from urllib.parse import urlencode
+from django.db.models import Prefetch
+from django.utils.decorators import method_decorator
+from django.views.generic import ListView, DetailView, FormView, View
 from .models import Recipe
 from django.contrib.auth.mixins import LoginRequiredMixin
 from .forms import (
@@ -7,171 +10,333 @@ from .forms import (
     RecipeSearchForm,
     RecipeIngredientIntermediaryForm,
     RecipeEditForm,
+    IngredientLineFormSet,
 )
-import pandas as pd
-from .utils import get_recipe_from_title, get_chart
-from django.shortcuts import render, redirect
+from .utils import (
+    add_recipe_ingredients,
+    get_chart,
+    get_ingredient_rows,
+    get_ingredient_table,
+)
+from django.conf import settings
+from django.shortcuts import get_object_or_404, render, redirect
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, JsonResponse, StreamingHttpResponse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, etag
+from django.contrib.admin.views.decorators import staff_member_required
 from .models import Recipe
 from django.views.generic.edit import CreateView, UpdateView
 from recipeingredient.models import RecipeIngredient
 from ingredient.models import Ingredient
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.views.generic import DeleteView
-from django.core.paginator import Paginator
+from .pagination import (
+    KEYSET_SORTS,
+    SEARCH_SORTS,
+    KeysetPaginationMixin,
+    KeysetPaginator,
+)
+from .fuzzy import fuzzy_search_recipes
+from .search import search_recipes
+from .caching import (
+    CATALOG_VERSION_KEY,
+    cache_stats,
+    cached,
+    count,
+    get_versions,
+    recipe_version_key,
+)
+from .charts import (
+    get_cached_charts,
+    ingredient_fingerprint,
+    invalidate_recipe_charts,
+    set_cached_charts,
+)
+from .autocomplete import (
+    AUTOCOMPLETE_LIMIT,
+    AUTOCOMPLETE_MAX_LIMIT,
+    autocomplete_index,
+)
+from .images import DIGEST_RE, IMAGE_VARIANTS, image_path, image_url, store_image
+from .exporter import EXPORT_FORMATS, export_records
+from .scaling import (
+    MAX_SERVINGS,
+    ScalingError,
+    parse_servings,
+    scale_recipe,
+    scaled_rows,
+)
 
 
-class RecipeHome(ListView):
-    model = Recipe
-    template_name = "recipe/recipes_home.html"
-    context_object_name = (
-        "recipes"  # Optional: You can change this to the variable name in your template
+def with_ingredients(queryset):
+    # Load every recipe's ingredients and their names in two extra queries
+    return queryset.prefetch_related(
+        Prefetch(
+            "recipe_ingredients",
+            queryset=RecipeIngredient.objects.select_related("ingredient").order_by("pk"),
+        )
     )
 
-    def get_queryset(self):
-        queryset = super().get_queryset()
 
-        for recipe in queryset:
-            recipe.title = get_recipe_from_title(recipe.title)
+# Conditional GET: pages answer 304 Not Modified, without rendering or
+# plotting, while the recipes they show are unchanged. Pages carry the
+# signed in user's menu, so every user gets their own tags.
+def viewer_tag(request):
+    return request.user.pk or 0
 
-        return queryset.order_by("id")
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
+def listing_etag(request, name):
+    # The catalog version (recipe.caching) is replaced whenever any recipe or
+    # its ingredient lines change, are added or are deleted, so listings are
+    # tagged without a query. Listings send no Last-Modified.
+    [version] = get_versions([CATALOG_VERSION_KEY])
+    return f"{name}-{version}-{viewer_tag(request)}"
 
-        items_per_page = 4  # Number of items to display per page
-        paginated_queryset = self.get_queryset()
-        paginator = Paginator(paginated_queryset, items_per_page)
 
-        page_number = self.request.GET.get("page")
-        page_obj = paginator.get_page(page_number)
+def home_etag(request, *args, **kwargs):
+    return listing_etag(request, "home")
 
-        context["page_obj"] = page_obj  # Add the paginated page object to the context
 
-        return context
+def your_recipes_etag(request, *args, **kwargs):
+    if not request.user.is_authenticated:
+        return None
+    return listing_etag(request, "yours")
+
+
+def recipe_updated_at(request, pk):
+    # One query shared by the ETag and Last-Modified checks
+    if not hasattr(request, "recipe_updated_at"):
+        try:
+            request.recipe_updated_at = (
+                Recipe.objects.filter(pk=pk).values_list("updated_at", flat=True).first()
+            )
+        except ValueError:
+            request.recipe_updated_at = None
+    return request.recipe_updated_at
+
+
+def recipe_etag(request, pk):
+    updated_at = recipe_updated_at(request, pk)
+    if updated_at is None:
+        return None
+    chart_format = settings.RECIPE_CHART_FORMAT
+    return f"recipe-{pk}-{updated_at.timestamp()}-{chart_format}-{viewer_tag(request)}"
 
 
-class YourRecipesView(LoginRequiredMixin, ListView):
+@method_decorator(condition(etag_func=home_etag), name="dispatch")
+class RecipeHome(KeysetPaginationMixin, ListView):
+    model = Recipe
+    template_name = "recipe/recipes_home.html"
+    context_object_name = (
+        "recipes"  # Optional: You can change this to the variable name in your template
+    )
+    paginate_by = 4  # Number of items to display per page
+
+    def get_queryset(self):
+        # Only load the columns the home page cards display, one page at a time,
+        # and the sort key the page cursors are made from
+        sort_field, _ = KEYSET_SORTS[self.get_sort()]
+        columns = ["id", "title", "small_desc", "image_hash"]
+        if sort_field:
+            columns.append(sort_field)
+        return Recipe.objects.only(*columns).order_by("id")
+
+    def paginate_queryset(self, queryset, page_size):
+        parent = super().paginate_queryset
+        # Offset pages hold their paginator and its queryset, so only cursor
+        # pages are cached. The cards are the same for every viewer.
+        if settings.RECIPE_PAGINATION == "offset":
+            return parent(queryset, page_size)
+        parts = (self.get_sort(), self.request.GET.get(self.cursor_kwarg), page_size)
+        page_obj = cached("home", parts, lambda: parent(queryset, page_size)[1])
+        return (None, page_obj, page_obj.object_list, page_obj.has_other_pages())
+
+
+@method_decorator(condition(etag_func=your_recipes_etag), name="dispatch")
+class YourRecipesView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     model = Recipe
     template_name = "recipe/your_recipes.html"
     context_object_name = "user_recipes"  # Optional: You can change this to the variable name in your template
+    paginate_by = 3  # Number of items to display per page
 
     def get_queryset(self):
         user = self.request.user
         queryset = Recipe.objects.filter(user=user)
-        return queryset.order_by("id")
-
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-
-        items_per_page = 3  # Number of items to display per page
-        paginated_queryset = self.get_queryset()
-        paginator = Paginator(paginated_queryset, items_per_page)
-
-        page_number = self.request.GET.get("page")
-        page_obj = paginator.get_page(page_number)
-
-        context["page_obj"] = page_obj  # Add the paginated page object to the context
-
-        return context
+        return with_ingredients(queryset.order_by("id"))
 
 
 def format_cost(cost):
     return f"${cost:.2f}"
 
 
+@method_decorator(
+    condition(etag_func=recipe_etag, last_modified_func=recipe_updated_at),
+    name="dispatch",
+)
 class RecipeDetailView(DetailView):
     model = Recipe
     template_name = "recipe/recipe_detail.html"
 
+    def get_queryset(self):
+        return with_ingredients(Recipe.objects.select_related("user"))
+
+    def get_object(self, queryset=None):
+        # The recipe with its owner and ingredient lines, kept until it changes
+        parent = super().get_object
+        pk = self.kwargs.get(self.pk_url_kwarg)
+        return cached(
+            "detail",
+            (pk,),
+            lambda: parent(queryset),
+            versions=(recipe_version_key(pk),),
+        )
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        recipe = context["object"]
+        context["ingredient_lines"] = recipe.recipe_ingredients.all()
+        context["totals"] = recipe
+        context["max_servings"] = MAX_SERVINGS
 
-        # Extract ingredient names from the RecipeIngredient objects
+        # ?servings=N shows the recipe scaled from its own number of servings
+        servings = None
         try:
-            ingredients = [
-                ing.ingredient.name
-                for ing in context["object"].recipe_ingredients.all()
-            ]
-
-            # Create a dictionary with ingredient names as keys
-            ingredient_data = {ingredient: None for ingredient in ingredients}
-
-            df = pd.DataFrame.from_dict(
-                ingredient_data, orient="index", columns=["Calorie Content"]
-            )
-
-            # Set the 'Calorie Content', 'Grams' and 'Cost' for each ingredient
-            for ing in context["object"].recipe_ingredients.all():
-                df.loc[ing.ingredient.name, "Calorie Content"] = ing.calorie_content
-                df.loc[ing.ingredient.name, "Grams"] = ing.grams
-                df.loc[ing.ingredient.name, "Cost"] = format_cost(float(ing.cost))
-
-            # Convert the DataFrame to HTML
-            df_html = df.to_html(
-                classes="table table-bordered table-hover", escape=False
-            )
-
-            # Manually add the table ID to the generated HTML
-            df_html = df_html.replace("<table", '<table id="ingredient-info-table"')
-            context["recipe_dataframe"] = df_html
+            servings = parse_servings(self.request.GET.get("servings"))
+            scaled = None if servings is None else scale_recipe(recipe, servings)
+        except ScalingError as e:
+            context["servings_error"] = str(e)
+            servings = scaled = None
+        if scaled is not None:
+            context["scaled"] = scaled
+            context["ingredient_lines"] = scaled["lines"]
+            context["totals"] = scaled
+            rows = scaled_rows(scaled["lines"])
+        else:
+            # Rows come from the prefetched ingredients; rows sharing a name
+            # stay separate
+            rows = get_ingredient_rows(recipe)
+        if rows:
+            context.update(self.get_ingredient_fragments(rows, servings))
+            context["chart_format"] = settings.RECIPE_CHART_FORMAT
 
-            # Get the chart HTML using the get_chart
-            chart1 = get_chart("#1", df, x=df.index, y="Calorie Content")
-            chart2 = get_chart("#2", df, x=df.index, y="Grams")
-            chart3 = get_chart("#3", df, x=df.index, y="Cost")
+        return context
 
-            context["chart1"] = chart1
-            context["chart2"] = chart2
-            context["chart3"] = chart3
-        except Exception as e:
-            print("No ingredients: ", str(e))
+    def get_ingredient_fragments(self, rows, servings=None):
+        # Building the table and plotting dominate the page cost, so both are
+        # reused for as long as the recipe's ingredient rows stay the same,
+        # for every number of servings the recipe is shown for
+        chart_format = settings.RECIPE_CHART_FORMAT
+        fingerprint = ingredient_fingerprint(rows)
+        pk = self.object.pk
+        fragments = get_cached_charts(pk, fingerprint, chart_format, servings)
+        if fragments is not None:
+            count("ingredients", "hit")
+            return fragments
+
+        count("ingredients", "miss")
+        df = get_ingredient_table(rows)
+
+        # Convert the DataFrame to HTML
+        df_html = df.to_html(
+            classes="table table-bordered table-hover",
+            index=False,
+            formatters={
+                "Calorie Content": "{:.2f}".format,
+                "Grams": "{:.2f}".format,
+                "Cost": format_cost,
+            },
+        )
 
-        return context
+        # Manually add the table ID to the generated HTML
+        df_html = df_html.replace("<table", '<table id="ingredient-info-table"')
+
+        # Get the chart HTML using the get_chart
+        fragments = {
+            "recipe_dataframe": df_html,
+            "chart1": get_chart("#1", df, chart_format),
+            "chart2": get_chart("#2", df, chart_format),
+            "chart3": get_chart("#3", df, chart_format),
+        }
+        set_cached_charts(pk, fingerprint, fragments, chart_format, servings)
+        return fragments
 
 
 class RecipeSearchView(FormView):
     template_name = "recipe/search.html"
     form_class = RecipeSearchForm
+    paginate_by = 10
+    # Columns shown in the results table
+    result_fields = ("id", "title", "star_count", "cooking_time", "image_hash")
+
+    def get(self, request, *args, **kwargs):
+        # Result pages link back here with the search in the query string
+        if "search_mode" in request.GET:
+            form = self.form_class(request.GET)
+            if form.is_valid():
+                return self.form_valid(form)
+        return super().get(request, *args, **kwargs)
+
+    def paginate(self, queryset):
+        # Ranked results sort by relevance unless another order is picked
+        ranked = "search_rank" in queryset.query.annotations
+        paginator = KeysetPaginator(
+            queryset,
+            self.paginate_by,
+            self.request.GET.get("sort"),
+            SEARCH_SORTS if ranked else KEYSET_SORTS,
+        )
+        # Also load the sort key the page cursors are made from
+        columns = list(self.result_fields)
+        if paginator.field and paginator.field not in queryset.query.annotations:
+            columns.append(paginator.field)
+        paginator.queryset = queryset.only(*columns)
+        return paginator.page(self.request.GET.get("cursor")), ranked
+
+    def search(self, form):
+        page_obj, ranked = self.paginate(self.get_queryset(form))
+        # Nothing matched exactly, so look for titles and ingredient names
+        # close to what was typed, e.g. "tomatoe" or "jalepeno"
+        fuzzy = not page_obj and form.cleaned_data.get("search_mode") in ("#1", "#2")
+        if fuzzy:
+            page_obj, ranked = self.paginate(self.get_queryset(form, fuzzy=True))
+        return page_obj, ranked, fuzzy
 
     def form_valid(self, form):
-        queryset = self.get_queryset(form)
+        search_mode = form.cleaned_data.get("search_mode")
+        parts = (
+            search_mode,
+            form.cleaned_data.get("search"),
+            self.request.GET.get("sort"),
+            self.request.GET.get("cursor"),
+            # "My recipes" results belong to the signed in user
+            self.request.user.pk if search_mode == "#1" else None,
+        )
+        page_obj, ranked, fuzzy = cached("search", parts, lambda: self.search(form))
 
-        # Create a dictionary to store recipe titles and their absolute URLs
-        recipe_urls = {recipe.title: recipe.get_absolute_url() for recipe in queryset}
+        # The page is fetched by one query; the template renders the rows
+        # from the same list the title -> URL map is built from
+        recipe_urls = {recipe.title: recipe.get_absolute_url() for recipe in page_obj}
         # Convert the recipe_urls dictionary to a JSON string
         recipe_urls_json = json.dumps(recipe_urls)
 
-        # Convert the queryset to a DataFrame
-        data = {
-            "Recipe Title": [recipe.title for recipe in queryset],
-            "Star Count": [recipe.star_count for recipe in queryset],
-            "Cooking Time": [recipe.cooking_time for recipe in queryset],
-            "Picture": [recipe.pic for recipe in queryset],
-        }
-        df = pd.DataFrame(data)
-
-        # Modify the DataFrame to include the image as an HTML img tag
-        df["Picture"] = df["Picture"].apply(
-            lambda base64_data: f'<img src="data:image/jpeg;base64,{base64_data}" width="200px">'
-        )
-
-        # Convert the modified DataFrame to HTML
-        search_results_df = df.to_html(
-            classes="table table-bordered table-hover", index=False, escape=False
-        )
-        # Manually add the table ID to the generated HTML
-        search_results_df = search_results_df.replace(
-            "<table", '<table id="search-results-table"'
-        )
-
         context = {
-            "search_results_df": search_results_df,
+            "form": form,
             "recipe_urls_json": recipe_urls_json,
+            "page_obj": page_obj,
+            "ranked": ranked,
+            "fuzzy": fuzzy,
+            "search_query": urlencode(
+                {
+                    "search_mode": form.cleaned_data.get("search_mode"),
+                    "search": form.cleaned_data.get("search"),
+                }
+            ),
         }
 
         return render(self.request, self.template_name, context)
 
-    def get_queryset(self, form):
+    def get_queryset(self, form, fuzzy=False):
         search = form.cleaned_data.get("search")
         search_mode = form.cleaned_data.get("search_mode")
 
@@ -180,35 +345,17 @@ class RecipeSearchView(FormView):
 
         queryset = Recipe.objects.all()
 
-        if search_mode == "#1":
-            # Filter recipes by the current user's recipes only
-            queryset = Recipe.objects.filter(
-                user=self.request.user, title__icontains=search
-            )
-            if search.strip():
-                if not queryset.exists():
-                    # Filter recipes by the ingredient name
-                    queryset = Recipe.objects.filter(
-                        user=self.request.user,
-                        recipe_ingredients__ingredient__name__icontains=search,
-                    )
-            else:
-                queryset = Recipe.objects.none()
-
-        elif search_mode == "#2":
-            # Only filter if the search bar is not blank
-            if search.strip():
-                queryset = Recipe.objects.filter(title__icontains=search)
-                if not queryset.exists():
-                    # Filter recipes by the ingredient name
-                    queryset = Recipe.objects.filter(
-                        recipe_ingredients__ingredient__name__icontains=search
-                    )
+        if search_mode in ("#1", "#2"):
+            if search_mode == "#1":
+                # Filter recipes by the current user's recipes only
+                queryset = queryset.filter(user=self.request.user)
+            # Titles, descriptions, directions and ingredient names are all
+            # matched in one ranked lookup on the full text index (see
+            # recipe.search); a blank search bar matches nothing
+            if fuzzy:
+                queryset = fuzzy_search_recipes(search, queryset)
             else:
-                queryset = Recipe.objects.none()
-
-        elif search_mode == "#3":
-            queryset = Recipe.objects.all()
+                queryset = search_recipes(search, queryset)
 
         return queryset
 
@@ -221,9 +368,8 @@ class RecipeCreateView(LoginRequiredMixin, CreateView):
 
     def form_valid(self, form):
         form.instance.user = self.request.user
-        base64_string = form.cleaned_data.get("base64_string")
-        if base64_string:
-            form.instance.pic = base64_string
+        if form.image_data:
+            form.instance.image_hash = store_image(form.image_data)
         return super().form_valid(form)
 
 
@@ -247,14 +393,9 @@ class IngredientAddView(LoginRequiredMixin, CreateView):
         recipe = Recipe.objects.get(id=recipe_id)  # Get the Recipe object
         ingredient_name = form.cleaned_data["ingredient"]
 
-        try:
-            ingredient = Ingredient.objects.get(name=ingredient_name)
-        except Ingredient.DoesNotExist:
-            ingredient = Ingredient(name=ingredient_name)
-            ingredient.save()
-
         recipe_ingredient = RecipeIngredient()
-        recipe_ingredient.ingredient = ingredient
+        # Indexed, cached lookup by normalized name, creating the ingredient once
+        recipe_ingredient.ingredient_id = Ingredient.objects.id_for_name(ingredient_name)
         recipe_ingredient.calorie_content = form.cleaned_data["calorie_content"]
         recipe_ingredient.amount = form.cleaned_data["amount"]
         recipe_ingredient.amount_type = form.cleaned_data["amount_type"]
@@ -267,6 +408,7 @@ class IngredientAddView(LoginRequiredMixin, CreateView):
         recipe_ingredient_intermediary.recipe = recipe
         recipe_ingredient_intermediary.recipe_ingredient = recipe_ingredient
         recipe_ingredient_intermediary.save()
+        invalidate_recipe_charts(recipe.pk)
 
         return super().form_valid(form)
 
@@ -279,6 +421,28 @@ class IngredientAddView(LoginRequiredMixin, CreateView):
             return self.success_url
 
 
+class IngredientBulkAddView(LoginRequiredMixin, FormView):
+    # Add many ingredient lines to one of the user's recipes in a single submit
+    form_class = IngredientLineFormSet
+    template_name = "recipe/add_ingredients.html"
+    success_url = reverse_lazy("recipe:your_recipes")
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            self.recipe = get_object_or_404(Recipe, pk=kwargs["pk"], user=request.user)
+        return super().dispatch(request, *args, **kwargs)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["recipe"] = self.recipe
+        return context
+
+    def form_valid(self, form):
+        lines = [line.cleaned_data for line in form if line.has_changed()]
+        add_recipe_ingredients(self.recipe, lines)
+        return super().form_valid(form)
+
+
 class RecipeDeleteView(LoginRequiredMixin, DeleteView):
     model = Recipe
     template_name = "recipe/delete.html"
@@ -310,6 +474,7 @@ class RecipeIngredientDeleteView(LoginRequiredMixin, DeleteView):
 
         if delete_ingredient is not None:
             delete_ingredient.delete()
+            invalidate_recipe_charts(recipe.pk)
 
         return redirect(self.success_url)
 
@@ -322,7 +487,69 @@ class RecipeEditView(LoginRequiredMixin, UpdateView):
 
     def form_valid(self, form):
         form.instance.user = self.request.user
-        base64_string = form.cleaned_data.get("base64_string")
-        if base64_string:
-            form.instance.pic = base64_string
+        if form.image_data:
+            form.instance.image_hash = store_image(form.image_data)
         return super().form_valid(form)
+
+
+class RecipeExportView(LoginRequiredMixin, View):
+    # The signed in user's recipes as a JSON Lines (?format=jsonl) or CSV
+    # (?format=csv) download, streamed while the recipes are read.
+    # Pictures are linked by URL unless ?images=none.
+    def get(self, request):
+        export_format = request.GET.get("format", "jsonl")
+        if export_format not in EXPORT_FORMATS:
+            raise Http404("Unknown export format")
+
+        def full_image_url(digest):
+            return request.build_absolute_uri(image_url(digest, "full"))
+
+        image = None if request.GET.get("images") == "none" else full_image_url
+        lines, content_type = EXPORT_FORMATS[export_format]
+        records = export_records(Recipe.objects.filter(user=request.user), image=image)
+        response = StreamingHttpResponse(lines(records), content_type=content_type)
+        response["Content-Disposition"] = (
+            f'attachment; filename="recipes.{export_format}"'
+        )
+        return response
+
+
+# Hit and miss counts of the page data caches (see recipe.caching)
+@staff_member_required
+def cache_stats_view(request):
+    return JsonResponse(cache_stats())
+
+
+# Stored pictures never change for a given hash, so browsers and CDNs may keep them
+@cache_control(public=True, max_age=31536000, immutable=True)
+@etag(lambda request, digest, variant: f"{digest}-{variant}")
+def recipe_image(request, digest, variant):
+    if not DIGEST_RE.match(digest) or variant not in IMAGE_VARIANTS:
+        raise Http404("Unknown image")
+    try:
+        image = default_storage.open(image_path(digest, variant))
+    except FileNotFoundError:
+        raise Http404("Unknown image")
+    return FileResponse(image, content_type="image/jpeg")
+
+
+# Typeahead for the navbar search box and the meal plan recipe picker,
+# answered from the in-memory index; ?type=recipe leaves out ingredients
+def autocomplete(request):
+    query = request.GET.get("q", "")[:150]
+    try:
+        limit = int(request.GET.get("limit", AUTOCOMPLETE_LIMIT))
+    except ValueError:
+        limit = AUTOCOMPLETE_LIMIT
+    limit = max(0, min(limit, AUTOCOMPLETE_MAX_LIMIT))
+    wanted = request.GET.get("type")
+    if wanted not in ("recipe", "ingredient"):
+        wanted = None
+    results = []
+    for kind, pk, label in autocomplete_index.complete(query, limit, wanted):
+        result = {"type": kind, "label": label}
+        if kind == "recipe":
+            result["id"] = pk
+            result["url"] = reverse("recipe:detail", kwargs={"pk": pk})
+        results.append(result)
+    return JsonResponse({"query": query, "results": results})
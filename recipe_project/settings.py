@@ -42,6 +42,7 @@ INSTALLED_APPS = [
     "recipeingredient",
     "recipeingredientintermediary",
     "customuser",
+    "mealplan",
     "bootstrap5",
 ]
 
@@ -134,6 +135,26 @@ MEDIA_ROOT = BASE_DIR / "media"
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+# Recipe listings use cursor (keyset) pagination; set to "offset" for ?page=N links
+RECIPE_PAGINATION = os.environ.get("RECIPE_PAGINATION", "cursor")
+
+# Detail page charts: "png" (matplotlib images) or "svg" (inline vector markup)
+RECIPE_CHART_FORMAT = os.environ.get("RECIPE_CHART_FORMAT", "png")
+
+# Page data caches (recipe.caching) and rendered charts, in process memory by
+# default. With several worker processes point CACHE_BACKEND and
+# CACHE_LOCATION at a shared cache so invalidations reach every worker, e.g.
+# django.core.cache.backends.filebased.FileBasedCache and /var/tmp/recipe-cache,
+# or django.core.cache.backends.redis.RedisCache and redis://localhost:6379.
+CACHES = {
+    "default": {
+        "BACKEND": os.environ.get(
+            "CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": os.environ.get("CACHE_LOCATION", "recipe-app"),
+    }
+}
+
 # AUTH
 LOGIN_URL = "/login/"
 
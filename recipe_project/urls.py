@@ -25,6 +25,7 @@ from customuser.views import register_user, your_profile, success, about_me
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("", include("recipe.urls")),
+    path("meal-plans/", include("mealplan.urls")),
     path("login/", login_view, name="login"),
     path("logout/", logout_view, name="logout"),
     path("register/", register_user, name="register"),  # Add this URL pattern
@@ -1,7 +1,14 @@
-from decimal import Decimal
+from decimal import ROUND_HALF_UP, Decimal
 from django.test import TestCase
 from django.core.exceptions import ValidationError
 from .models import RecipeIngredient
+from .units import (
+    ConversionError,
+    convert,
+    grams_for_lines,
+    normalize,
+    to_grams,
+)
 from ingredient.models import Ingredient
 from recipe.models import Recipe
 from customuser.models import CustomUser
@@ -107,3 +114,48 @@ class RecipeIngredientModelTest(TestCase):
         recipe_ingredient.supplier = ""
         with self.assertRaises(ValidationError):
             recipe_ingredient.full_clean()
+
+
+class UnitConversionTest(TestCase):
+    def test_converts_within_a_dimension(self):
+        self.assertEqual(convert(1, "cup", "tablespoon"), 16)
+        self.assertEqual(convert(3, "teaspoon", "tablespoon"), 1)
+        self.assertEqual(convert(1, "pound", "ounce"), 16)
+        self.assertEqual(convert(Decimal("1.5"), "kilogram", "gram"), 1500)
+        self.assertEqual(convert(2, "each", "each"), 2)
+
+    def test_converts_between_volume_and_mass_with_a_density(self):
+        self.assertEqual(convert(100, "milliliter", "gram", Decimal("1.03")), 103)
+        self.assertEqual(convert(103, "gram", "milliliter", "1.03"), 100)
+        with self.assertRaises(ConversionError):
+            convert(1, "cup", "gram")
+        with self.assertRaises(ConversionError):
+            convert(1, "each", "gram", 1)
+        self.assertIsNone(to_grams(1, "other"))
+
+    def test_normalize(self):
+        self.assertEqual(normalize(2, "kilogram"), (2000, "gram"))
+        self.assertEqual(normalize(1, "liter", 1), (1000, "gram"))
+        self.assertEqual(normalize(1, "liter"), (1000, "milliliter"))
+        self.assertEqual(normalize(3, "each"), (3, "each"))
+
+    def test_batch_matches_one_at_a_time(self):
+        lines = [
+            (Decimal("1.5"), "cup", Decimal("0.53")),
+            (2, "pound", None),
+            (1, "tablespoon", None),
+            (4, "each", Decimal("1")),
+            (1, "bucket", Decimal("1")),
+            (3, "milliliter", Decimal("0")),
+            # 139.815 g exactly, just under it in floats
+            (Decimal("124.28"), "milliliter", Decimal("1.125")),
+        ]
+        amounts, units, densities = zip(*lines)
+        expected = [
+            None if grams is None else grams.quantize(Decimal("0.01"), ROUND_HALF_UP)
+            for grams in (to_grams(*line) for line in lines)
+        ]
+        self.assertEqual(grams_for_lines(amounts, units, densities), expected)
+        self.assertEqual(expected[:2], [Decimal("188.09"), Decimal("907.18")])
+        self.assertEqual(expected[2:6], [None] * 4)
+        self.assertEqual(expected[6], Decimal("139.82"))
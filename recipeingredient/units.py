@@ -0,0 +1,204 @@
+import math
+from decimal import ROUND_HALF_UP, Decimal
+
+# Conversions between the AMOUNT_TYPES units. Every unit has a dimension and
+# its size in that dimension's base unit (milliliters or grams); volume and
+# mass convert into each other through the ingredient's density in grams per
+# milliliter. "each" and "other" only convert to themselves.
+VOLUME = "volume"
+MASS = "mass"
+BASE_UNITS = {VOLUME: "milliliter", MASS: "gram"}
+
+# unit -> (dimension, size in the base unit); US customary measures
+UNITS = {
+    "teaspoon": (VOLUME, Decimal("4.92892159375")),
+    "tablespoon": (VOLUME, Decimal("14.78676478125")),
+    "fluid ounce": (VOLUME, Decimal("29.5735295625")),
+    "cup": (VOLUME, Decimal("236.5882365")),
+    "pint": (VOLUME, Decimal("473.176473")),
+    "quart": (VOLUME, Decimal("946.352946")),
+    "gallon": (VOLUME, Decimal("3785.411784")),
+    "milliliter": (VOLUME, Decimal("1")),
+    "liter": (VOLUME, Decimal("1000")),
+    "gram": (MASS, Decimal("1")),
+    "kilogram": (MASS, Decimal("1000")),
+    "ounce": (MASS, Decimal("28.349523125")),
+    "pound": (MASS, Decimal("453.59237")),
+}
+
+# Grams per milliliter of common ingredients, by normalized name, used when
+# the catalog ingredient has no density of its own
+COMMON_DENSITIES = {
+    "water": Decimal("1.00"),
+    "milk": Decimal("1.03"),
+    "cream": Decimal("1.01"),
+    "butter": Decimal("0.91"),
+    "oil": Decimal("0.92"),
+    "olive oil": Decimal("0.92"),
+    "vegetable oil": Decimal("0.92"),
+    "honey": Decimal("1.42"),
+    "maple syrup": Decimal("1.32"),
+    "flour": Decimal("0.53"),
+    "all-purpose flour": Decimal("0.53"),
+    "sugar": Decimal("0.85"),
+    "brown sugar": Decimal("0.93"),
+    "powdered sugar": Decimal("0.56"),
+    "salt": Decimal("1.22"),
+    "rice": Decimal("0.85"),
+    "oats": Decimal("0.41"),
+    "cocoa powder": Decimal("0.52"),
+}
+
+
+class ConversionError(ValueError):
+    pass
+
+
+def dimension(unit):
+    # VOLUME, MASS or None for units that do not convert
+    return UNITS[unit][0] if unit in UNITS else None
+
+
+def density_for(name, density=None):
+    # An ingredient's own density, else the common one for its name
+    if density is not None:
+        return Decimal(density)
+    return COMMON_DENSITIES.get(name)
+
+
+def convert(amount, source, target, density=None):
+    """
+    ``amount`` of ``source`` expressed in ``target`` units, as a Decimal.
+    Volume and mass convert into each other with ``density`` (g/ml).
+    """
+    amount = Decimal(amount)
+    if source == target:
+        return amount
+    source_dimension, target_dimension = dimension(source), dimension(target)
+    if source_dimension is None or target_dimension is None:
+        raise ConversionError(f"Cannot convert {source} to {target}")
+    # Through the base unit, so that e.g. 3 teaspoons come out as exactly 1
+    # tablespoon
+    base = amount * UNITS[source][1]
+    if source_dimension != target_dimension:
+        if density is None or Decimal(density) <= 0:
+            raise ConversionError(f"Converting {source} to {target} needs a density")
+        if source_dimension == VOLUME:
+            base *= Decimal(density)
+        else:
+            base /= Decimal(density)
+    return base / UNITS[target][1]
+
+
+def to_grams(amount, unit, density=None):
+    # Weight in grams, or None when it cannot be worked out
+    try:
+        return convert(amount, unit, "gram", density)
+    except ConversionError:
+        return None
+
+
+def normalize(amount, unit, density=None):
+    """
+    (quantity, unit) in the unit amounts of this kind are added up in: grams
+    for weights and for volumes with a density, milliliters for other
+    volumes, and the unit itself for everything else.
+    """
+    grams = to_grams(amount, unit, density)
+    if grams is not None:
+        return grams, "gram"
+    if dimension(unit) == VOLUME:
+        return convert(amount, unit, "milliliter"), "milliliter"
+    return Decimal(amount), unit
+
+
+# Batch results closer than this many cents to a half cent may round either
+# way in floats (e.g. 124.28 ml at 1.125 g/ml, 139.815 g)
+HALF_CENT_TOLERANCE = 1e-6
+
+
+class UnitTable:
+    """
+    The UNITS table as numpy arrays for converting whole ingredient lists at
+    once. numpy is only loaded by the first batch conversion.
+    """
+
+    def __init__(self):
+        self.index = {unit: i for i, unit in enumerate(UNITS)}
+        self.arrays = None
+
+    def load(self):
+        import numpy as np
+
+        if self.arrays is None:
+            dimensions = [UNITS[unit][0] for unit in self.index]
+            self.arrays = (
+                # Unknown units get the extra last slot, which converts to nothing
+                np.array([dim == VOLUME for dim in dimensions] + [False]),
+                np.array([dim == MASS for dim in dimensions] + [False]),
+                np.array([float(UNITS[unit][1]) for unit in self.index] + [np.nan]),
+            )
+        return np, self.arrays
+
+    def convert(self, amounts, units, target, densities=None):
+        """
+        Convert ``amounts[i]`` of ``units[i]`` to ``target`` for every i and
+        return a float array, NaN where the conversion is not possible.
+        ``densities`` holds each line's density (g/ml) or None.
+        """
+        np, (is_volume, is_mass, sizes) = self.load()
+        units = list(units)
+        unknown = len(self.index)
+        positions = np.fromiter(
+            (self.index.get(unit, unknown) for unit in units), np.intp, len(units)
+        )
+        # fromiter over floats is far quicker than numpy converting Decimals
+        amounts = np.fromiter(map(float, amounts), float, len(units))
+        if densities is None:
+            densities = np.full(len(units), np.nan)
+        else:
+            densities = np.fromiter(
+                (math.nan if d is None else float(d) for d in densities),
+                float,
+                len(units),
+            )
+        densities[densities <= 0] = np.nan
+        target_dimension = dimension(target)
+        if target_dimension is None:
+            return np.where(np.array(units) == target, amounts, np.nan)
+
+        # Unknown units have a NaN size and lines lacking a density a NaN
+        # density, so both come out as NaN
+        base = amounts * sizes[positions]
+        if target_dimension == MASS:
+            base = np.where(is_volume[positions], base * densities, base)
+        else:
+            base = np.where(is_mass[positions], base / densities, base)
+        return base / float(UNITS[target][1])
+
+
+unit_table = UnitTable()
+
+
+def grams_for_lines(amounts, units, densities=None):
+    """
+    Grams of each (amount, unit, density) line as Decimals rounded half up to
+    0.01, as to_grams(...).quantize() does for one line, None where the weight
+    cannot be worked out. One numpy pass over the list; the lines that come
+    out within float error of a half cent are worked out again in Decimal.
+    """
+    amounts, units = list(amounts), list(units)
+    densities = [None] * len(units) if densities is None else list(densities)
+    grams = unit_table.convert(amounts, units, "gram", densities)
+    results = []
+    for i, value in enumerate(grams.tolist()):
+        if math.isnan(value):
+            results.append(None)
+            continue
+        cents = value * 100
+        if abs(cents - math.floor(cents) - 0.5) < HALF_CENT_TOLERANCE:
+            value = to_grams(amounts[i], units[i], densities[i])
+            results.append(value.quantize(Decimal("0.01"), ROUND_HALF_UP))
+        else:
+            results.append(Decimal(f"{value:.2f}"))
+    return results